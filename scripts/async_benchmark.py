@@ -0,0 +1,213 @@
+"""
+Benchmarks handling new comment events one at a time on the sync path (new_comments.process_comment) against
+handling them concurrently on the async services (async_comment_service), reporting the throughput of each.
+Builds synthetic PRAW comments replying to seeded posts and comments, so nothing is requested from Reddit and nothing
+is published to RabbitMQ. Concurrent events need their own connections, so unlike comment_batch_benchmark the copies
+of users, posts and comments can't be temporary tables. They're created in a scratch schema that every connection puts
+first in its search path, and dropped at the end, so nothing is written to the real tables. The copies don't have the
+foreign keys or triggers of the real tables, so both ways come out slightly faster than in production.
+Use with -h for options.
+"""
+
+import argparse
+import asyncio
+from datetime import datetime, timezone
+import random
+import time
+
+import praw
+from praw.models.reddit.comment import Comment
+from sqlalchemy import event
+from sqlalchemy.pool import Pool
+from sqlalchemy.sql import text
+
+from data.async_session import async_unit_of_work
+from data.session import session_scope
+from feeds import new_comments
+from services import async_comment_service
+from utils.reddit import base36encode
+
+_SCHEMA = "async_benchmark"
+# Ids well above anything seeded, so every comment in the stream is new.
+_FIRST_STREAM_ID = 10**9
+
+
+class _NullRabbitService:
+    """Stands in for RabbitService, only the database work is being measured."""
+
+    def publish_comment(self, reddit_comment, comment, status: str = "new"):
+        pass
+
+
+def _set_search_path(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"SET search_path TO {_SCHEMA}, public;")
+    cursor.close()
+    # Otherwise the pool's reset on return rolls the SET back.
+    dbapi_connection.commit()
+
+
+def _seed(user_count: int, post_count: int, comment_count: int):
+    with session_scope() as session:
+        session.execute(text(f"CREATE SCHEMA {_SCHEMA};"))
+        for table in ["users", "posts", "comments"]:
+            session.execute(text(f"CREATE TABLE {_SCHEMA}.{table} (LIKE public.{table} INCLUDING ALL);"))
+
+        session.execute(
+            text(f"""
+            INSERT INTO {_SCHEMA}.users (username)
+            SELECT 'User_' || i FROM generate_series(0, :user_count - 1) AS i;
+
+            INSERT INTO {_SCHEMA}.posts (id, id36, author, title, created_time)
+            SELECT i, i::text, 'User_' || i % :user_count, 'Post ' || i, now() - interval '1 day'
+            FROM generate_series(1, :post_count) AS i;
+
+            INSERT INTO {_SCHEMA}.comments (id, id36, post_id, author, body, created_time)
+            SELECT i, i::text, 1 + i % :post_count, 'User_' || i % :user_count, 'Comment ' || i,
+                   now() - interval '1 hour'
+            FROM generate_series(1, :comment_count) AS i;
+
+            ANALYZE {_SCHEMA}.users;
+            ANALYZE {_SCHEMA}.posts;
+            ANALYZE {_SCHEMA}.comments;
+            """),
+            {"user_count": user_count, "post_count": post_count, "comment_count": comment_count},
+        )
+
+
+def _drop_schema():
+    with session_scope() as session:
+        session.execute(text(f"DROP SCHEMA IF EXISTS {_SCHEMA} CASCADE;"))
+
+
+def _build_comments(
+    reddit: praw.Reddit, first_id: int, count: int, user_count: int, post_count: int, seeded_comment_count: int
+) -> list[Comment]:
+    """
+    Builds comments like the stream delivers them, oldest first. About half are top level, the rest reply to
+    a seeded comment. None reply to each other, the async events run concurrently so their order isn't kept.
+    """
+
+    rng = random.Random(first_id)
+    now = datetime.now(timezone.utc).timestamp()
+    reddit_comments = []
+    for i in range(count):
+        comment_id = first_id + i
+        post_id = rng.randint(1, post_count)
+        if rng.random() < 0.5:
+            parent_fullname = f"t3_{base36encode(post_id)}"
+        else:
+            parent_fullname = f"t1_{base36encode(rng.randint(1, seeded_comment_count))}"
+
+        # Every attribute read while processing is set, PRAW would fetch the comment for a missing one.
+        reddit_comments.append(
+            Comment(
+                reddit,
+                _data={
+                    "id": base36encode(comment_id),
+                    "link_id": f"t3_{base36encode(post_id)}",
+                    "parent_id": parent_fullname,
+                    "author": f"User_{rng.randrange(user_count)}",
+                    "body": f"Benchmark comment {comment_id}",
+                    "score": 1,
+                    "created_utc": now - count + i,
+                    "edited": False,
+                    "distinguished": None,
+                    "banned_by": None,
+                    "removal_reason": None,
+                },
+            )
+        )
+
+    return reddit_comments
+
+
+async def _process_comment_async(reddit_comment: Comment):
+    """The async services' version of new_comments.process_comment, less the publishing."""
+
+    async with async_unit_of_work():
+        comment = await async_comment_service.get_comment_by_id(reddit_comment.id)
+        if comment:
+            await async_comment_service.update_comment(comment, reddit_comment)
+        else:
+            await async_comment_service.add_comment(reddit_comment)
+
+
+async def _process_comments_async(reddit_comments: list[Comment], concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _process(reddit_comment: Comment):
+        async with semaphore:
+            await _process_comment_async(reddit_comment)
+
+    await asyncio.gather(*(_process(reddit_comment) for reddit_comment in reddit_comments))
+
+
+async def _benchmark_async(
+    reddit: praw.Reddit,
+    first_id: int,
+    count: int,
+    concurrencies: list[int],
+    user_count: int,
+    post_count: int,
+    seeded_comment_count: int,
+):
+    for concurrency in concurrencies:
+        reddit_comments = _build_comments(reddit, first_id, count, user_count, post_count, seeded_comment_count)
+        start_time = time.perf_counter()
+        await _process_comments_async(reddit_comments, concurrency)
+        _report(f"async (x{concurrency})", time.perf_counter() - start_time, count)
+        first_id += count
+
+
+def _report(label: str, elapsed: float, count: int):
+    print(f"{label:>16}: {elapsed * 1000 / count:7.3f} ms per comment, {count / elapsed:8.0f} comments/s")
+
+
+def main(count: int, concurrencies: list[int], user_count: int, post_count: int, seeded_comment_count: int):
+    reddit = praw.Reddit(client_id="benchmark", client_secret="benchmark", user_agent="async benchmark")
+    rabbit = _NullRabbitService()
+
+    # Before anything connects, so every connection of both data layers uses the copies.
+    event.listen(Pool, "connect", _set_search_path)
+    _seed(user_count, post_count, seeded_comment_count)
+    try:
+        # Each run gets its own range of ids so they all insert the same number of new comments.
+        first_id = _FIRST_STREAM_ID
+        reddit_comments = _build_comments(reddit, first_id, count, user_count, post_count, seeded_comment_count)
+        start_time = time.perf_counter()
+        for reddit_comment in reddit_comments:
+            new_comments.process_comment(reddit_comment, reddit, rabbit)
+        _report("sync", time.perf_counter() - start_time, count)
+
+        # All in one event loop, the async pool's connections belong to the loop they were opened in.
+        asyncio.run(
+            _benchmark_async(
+                reddit, first_id + count, count, concurrencies, user_count, post_count, seeded_comment_count
+            )
+        )
+    finally:
+        _drop_schema()
+
+
+def _get_parser() -> argparse.ArgumentParser:
+    new_parser = argparse.ArgumentParser(description="Benchmark sync vs concurrent async new comment events.")
+    new_parser.add_argument("-n", "--comments", type=int, default=2000, help="Number of new comments per run.")
+    new_parser.add_argument(
+        "-c",
+        "--concurrencies",
+        type=int,
+        nargs="+",
+        default=[5, 10],
+        help="Concurrent async events to compare, keep at or below the pool size.",
+    )
+    new_parser.add_argument("--users", type=int, default=20000, help="Number of seeded users.")
+    new_parser.add_argument("--posts", type=int, default=200, help="Number of seeded posts.")
+    new_parser.add_argument("--seeded-comments", type=int, default=100000, help="Number of seeded comments.")
+    return new_parser
+
+
+if __name__ == "__main__":
+    parser = _get_parser()
+    args = parser.parse_args()
+    main(args.comments, args.concurrencies, args.users, args.posts, args.seeded_comments)
@@ -45,32 +45,26 @@ def save_comments(reddit_submission: Submission):
 
     logger.info(f"Processing comments on {post_name}")
     processed_comment_ids = []
+    ordered_comment_ids = set()
+    ordered_comments = []
     comment_list = list(reddit_submission.comments.list())
-    processed_any = False
-    # Loop through and add all top-level comments, then all of their children, etc. in order for efficiency.
+    # Order all top-level comments, then all of their children, etc. so they can be inserted in bulk.
     while comment_list:
+        processed_any = False
         for reddit_comment in comment_list:
-            if reddit_comment.is_root:
-                comment_service.add_comment(reddit_comment)
+            if reddit_comment.is_root or reddit_comment.parent_id[3:] in ordered_comment_ids:
+                ordered_comments.append(reddit_comment)
+                ordered_comment_ids.add(reddit_comment.id)
                 comment_list.remove(reddit_comment)
-                processed_comment_ids.append(reddit_comment.id)
-                if len(processed_comment_ids) % 500 == 0:
-                    logger.info(f"Completed {len(processed_comment_ids)} comments on {post_name}")
                 processed_any = True
-                continue
-            parent_id = reddit_comment.parent_id[3:]
-            if parent_id in processed_comment_ids:
-                comment_service.add_comment(reddit_comment)
-                comment_list.remove(reddit_comment)
-                processed_comment_ids.append(reddit_comment.id)
-                if len(processed_comment_ids) % 500 == 0:
-                    logger.info(f"Completed {len(processed_comment_ids)} comments on {post_name}")
-                processed_any = True
-                continue
         # There may be some odd cases that won't be handled by this process so add a check to avoid infinite looping.
         if not processed_any:
             break
 
+    new_comments = comment_service.add_comments(ordered_comments)
+    processed_comment_ids.extend(reddit_comment.id for reddit_comment in ordered_comments)
+    logger.info(f"Completed {len(processed_comment_ids)} comments on {post_name}, {len(new_comments)} new")
+
     # If there are any left, go through the slower process crawling up the tree to clean up any leftovers.
     for index, reddit_comment in enumerate(comment_list):
         comment_service.add_comment_parent_tree(reddit, reddit_comment)
@@ -154,7 +148,7 @@ def load_posts_from_dates(start_date: datetime, end_date: datetime, skip_cdf: bo
             if post:
                 if post.author is None:
                     post.author = ps_post.author
-                    if not user_service.get_user(post.author):
+                    if not user_service.user_exists(post.author):
                         user_service.add_user(post.author)
                 if post.body == "[deleted]" and getattr(ps_post, "selftext", None) not in (
                     "[deleted]",
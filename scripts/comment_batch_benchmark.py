@@ -0,0 +1,152 @@
+"""
+Benchmarks processing new comments one at a time (new_comments.process_comment) against in batches
+(new_comments.process_comments) at a few batch sizes, reporting the database time per comment.
+Builds synthetic PRAW comments replying to seeded posts and comments, so nothing is requested from Reddit and nothing
+is published to RabbitMQ. users, posts and comments are temporary copies, which shadow the real tables for the
+duration of one transaction, so nothing is written to the real ones. The copies don't have the foreign keys or
+triggers of the real tables, so both ways come out slightly faster than in production.
+Use with -h for options.
+"""
+
+import argparse
+from datetime import datetime, timezone
+import random
+import time
+
+import praw
+from praw.models.reddit.comment import Comment
+from sqlalchemy.sql import text
+
+from data.session import unit_of_work
+from feeds import new_comments
+from utils.reddit import base36encode
+
+# Ids well above anything seeded, so every comment in the stream is new.
+_FIRST_STREAM_ID = 10**9
+
+
+class _NullRabbitService:
+    """Stands in for RabbitService, only the database work is being measured."""
+
+    def publish_comment(self, reddit_comment, comment, status: str = "new"):
+        pass
+
+
+def _seed(session, user_count: int, post_count: int, comment_count: int):
+    # Temporary tables come first in the search path, so the queries below read these instead of the real tables.
+    for table in ["users", "posts", "comments"]:
+        session.execute(text(f"CREATE TEMPORARY TABLE {table} (LIKE public.{table} INCLUDING ALL) ON COMMIT DROP;"))
+
+    session.execute(
+        text("""
+        INSERT INTO users (username)
+        SELECT 'User_' || i FROM generate_series(0, :user_count - 1) AS i;
+
+        INSERT INTO posts (id, id36, author, title, created_time)
+        SELECT i, i::text, 'User_' || i % :user_count, 'Post ' || i, now() - interval '1 day'
+        FROM generate_series(1, :post_count) AS i;
+
+        INSERT INTO comments (id, id36, post_id, author, body, created_time)
+        SELECT i, i::text, 1 + i % :post_count, 'User_' || i % :user_count, 'Comment ' || i,
+               now() - interval '1 hour'
+        FROM generate_series(1, :comment_count) AS i;
+
+        ANALYZE users;
+        ANALYZE posts;
+        ANALYZE comments;
+        """),
+        {"user_count": user_count, "post_count": post_count, "comment_count": comment_count},
+    )
+
+
+def _build_comments(
+    reddit: praw.Reddit, first_id: int, count: int, user_count: int, post_count: int, seeded_comment_count: int
+) -> list[Comment]:
+    """
+    Builds comments like the stream delivers them, oldest first. About half are top level, the rest reply to
+    a seeded comment or to one earlier in the list.
+    """
+
+    rng = random.Random(first_id)
+    now = datetime.now(timezone.utc).timestamp()
+    reddit_comments = []
+    for i in range(count):
+        comment_id = first_id + i
+        parent_roll = rng.random()
+        post_id = rng.randint(1, post_count)
+        if parent_roll < 0.5:
+            parent_fullname = f"t3_{base36encode(post_id)}"
+        elif parent_roll < 0.8 or not reddit_comments:
+            parent_fullname = f"t1_{base36encode(rng.randint(1, seeded_comment_count))}"
+        else:
+            parent = rng.choice(reddit_comments)
+            parent_fullname = parent.fullname
+            post_id = int(parent.link_id[3:], 36)
+
+        # Every attribute read while processing is set, PRAW would fetch the comment for a missing one.
+        reddit_comments.append(
+            Comment(
+                reddit,
+                _data={
+                    "id": base36encode(comment_id),
+                    "link_id": f"t3_{base36encode(post_id)}",
+                    "parent_id": parent_fullname,
+                    "author": f"User_{rng.randrange(user_count)}",
+                    "body": f"Benchmark comment {comment_id}",
+                    "score": 1,
+                    "created_utc": now - count + i,
+                    "edited": False,
+                    "distinguished": None,
+                    "banned_by": None,
+                    "removal_reason": None,
+                },
+            )
+        )
+
+    return reddit_comments
+
+
+def _report(label: str, elapsed: float, count: int):
+    print(f"{label:>16}: {elapsed * 1000 / count:7.3f} ms per comment, {count / elapsed:8.0f} comments/s")
+
+
+def main(count: int, batch_sizes: list[int], user_count: int, post_count: int, seeded_comment_count: int):
+    reddit = praw.Reddit(client_id="benchmark", client_secret="benchmark", user_agent="comment batch benchmark")
+    rabbit = _NullRabbitService()
+
+    with unit_of_work() as session:
+        _seed(session, user_count, post_count, seeded_comment_count)
+
+        # Each run gets its own range of ids so they all insert the same number of new comments.
+        first_id = _FIRST_STREAM_ID
+        reddit_comments = _build_comments(reddit, first_id, count, user_count, post_count, seeded_comment_count)
+        start_time = time.perf_counter()
+        for reddit_comment in reddit_comments:
+            new_comments.process_comment(reddit_comment, reddit, rabbit)
+        _report("one at a time", time.perf_counter() - start_time, count)
+
+        for batch_size in batch_sizes:
+            first_id += count
+            reddit_comments = _build_comments(reddit, first_id, count, user_count, post_count, seeded_comment_count)
+            start_time = time.perf_counter()
+            for start in range(0, count, batch_size):
+                new_comments.process_comments(reddit_comments[start : start + batch_size], reddit, rabbit)  # noqa: E203
+            _report(f"batches of {batch_size}", time.perf_counter() - start_time, count)
+
+
+def _get_parser() -> argparse.ArgumentParser:
+    new_parser = argparse.ArgumentParser(description="Benchmark processing new comments one at a time vs. in batches.")
+    new_parser.add_argument("-n", "--comments", type=int, default=2000, help="Number of new comments per run.")
+    new_parser.add_argument(
+        "-b", "--batch-sizes", type=int, nargs="+", default=[10, 25, 50, 100], help="Batch sizes to compare."
+    )
+    new_parser.add_argument("--users", type=int, default=20000, help="Number of seeded users.")
+    new_parser.add_argument("--posts", type=int, default=200, help="Number of seeded posts.")
+    new_parser.add_argument("--seeded-comments", type=int, default=100000, help="Number of seeded comments.")
+    return new_parser
+
+
+if __name__ == "__main__":
+    parser = _get_parser()
+    args = parser.parse_args()
+    main(args.comments, args.batch_sizes, args.users, args.posts, args.seeded_comments)
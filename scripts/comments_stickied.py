@@ -10,6 +10,7 @@ from datetime import datetime, timezone, timedelta
 
 from sqlalchemy.sql import text
 
+from data.session import read_only
 from services import post_service, comment_service, mod_action_service
 from utils.logger import logger
 
@@ -215,4 +216,5 @@ def _get_parser() -> argparse.ArgumentParser:
 if __name__ == "__main__":
     parser = _get_parser()
     args = parser.parse_args()
-    main(args.start_date, args.end_date)
+    with read_only():
+        main(args.start_date, args.end_date)
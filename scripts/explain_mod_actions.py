@@ -0,0 +1,169 @@
+"""
+Checks that every ModActionData query is planned with an index scan rather than a sequential scan of mod_actions,
+and that the post status, action and target user queries use the idx_mod_actions_* index added for each of them.
+Seeds synthetic rows into a temporary copy of mod_actions with the same indexes under the same names, which shadows
+the real table for the duration of one transaction, so nothing is written to the real one. Exits with status 1 if any
+check fails, e.g. to run after migrations that touch mod_actions. Use with -h for options.
+"""
+
+import argparse
+from datetime import datetime, timedelta, timezone
+import hashlib
+import re
+import sys
+import uuid
+
+from sqlalchemy import event
+from sqlalchemy.sql import text
+
+from constants import mod_constants
+from data.mod_action_data import ModActionData
+from data.session import unit_of_work
+
+_mod_action_data = ModActionData()
+
+_ACTIONS = mod_constants.MOD_ACTIONS_POSTS + mod_constants.MOD_ACTIONS_COMMENTS + mod_constants.MOD_ACTIONS_USERS
+_POST_STATUS_ACTIONS = [action.value for action in mod_constants.ModActionEnum]
+_INDEX_NODE_TYPES = {"Index Scan", "Index Only Scan", "Bitmap Index Scan"}
+# The index each of these has to use, the other checks only need to use any index.
+_EXPECTED_INDEXES = {
+    "get_mod_actions_targeting_post": "idx_mod_actions_post_status",
+    "get_mod_actions_targeting_username": "idx_mod_actions_target_user_lower_created_time",
+    "count_mod_actions": "idx_mod_actions_action_created_time",
+}
+
+
+def _seed(session, row_count: int, days: int, post_count: int, user_count: int):
+    # Temporary tables come first in the search path, so the queries below read this one instead of the real table.
+    session.execute(
+        text(
+            "CREATE TEMPORARY TABLE mod_actions (LIKE public.mod_actions INCLUDING ALL EXCLUDING INDEXES) "
+            "ON COMMIT DROP;"
+        )
+    )
+    # LIKE would give the copied indexes generated names, they're created from the real ones instead so the plans
+    # name the same indexes as they would on the real table.
+    index_definitions = (
+        session.execute(
+            text("SELECT indexdef FROM pg_indexes WHERE schemaname = 'public' AND tablename = 'mod_actions';")
+        )
+        .scalars()
+        .all()
+    )
+    for index_definition in index_definitions:
+        session.execute(text(re.sub(r" ON (ONLY )?public\.mod_actions ", " ON pg_temp.mod_actions ", index_definition)))
+    session.execute(
+        text("""
+        INSERT INTO mod_actions (id, action, mod, created_time, target_user, target_post_id, target_comment_id)
+        SELECT md5(i::text)::uuid,
+               (CAST(:actions AS text[]))[1 + i % cardinality(CAST(:actions AS text[]))],
+               'mod_' || i % 20,
+               now() - make_interval(secs => i * :spacing_seconds),
+               'User_' || i % :user_count,
+               i % :post_count,
+               CASE WHEN i % 4 <> 0 THEN i END
+        FROM generate_series(1, :row_count) AS i;
+        """),
+        {
+            "actions": _ACTIONS,
+            "spacing_seconds": days * 86400 / row_count,
+            "user_count": user_count,
+            "post_count": post_count,
+            "row_count": row_count,
+        },
+    )
+    session.execute(text("ANALYZE mod_actions;"))
+
+
+def _get_checks(post_count: int) -> dict:
+    now = datetime.now(timezone.utc)
+    month_end = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month_start = (month_end - timedelta(days=1)).replace(day=1)
+    sample_id = str(uuid.UUID(hashlib.md5(b"1").hexdigest()))
+
+    return {
+        "get_mod_action_by_id": lambda: _mod_action_data.get_mod_action_by_id(sample_id),
+        "iter_ids_since": lambda: list(_mod_action_data.iter_ids_since(now - timedelta(days=1))),
+        "iter_range": lambda: list(_mod_action_data.iter_range(now - timedelta(days=1), now)),
+        "get_mod_actions_targeting_post": lambda: _mod_action_data.get_mod_actions_targeting_post(
+            post_count // 2, _POST_STATUS_ACTIONS, 1, "DESC"
+        ),
+        "get_mod_actions_targeting_username": lambda: _mod_action_data.get_mod_actions_targeting_username(
+            "user_1", start_date=month_start.isoformat()
+        ),
+        "count_mod_actions": lambda: _mod_action_data.count_mod_actions(
+            "removecomment", month_start.isoformat(), month_end.isoformat(), distinct_target="user"
+        ),
+    }
+
+
+def _get_scans(plan: dict) -> list[tuple[str, str]]:
+    """Returns the node type and index name of every scan on mod_actions in the plan, including bitmap index scans."""
+
+    scans = []
+    if plan.get("Relation Name") == "mod_actions" or plan["Node Type"] == "Bitmap Index Scan":
+        scans.append((plan["Node Type"], plan.get("Index Name", "")))
+
+    for child_plan in plan.get("Plans", []):
+        scans.extend(_get_scans(child_plan))
+
+    return scans
+
+
+def main(row_count: int, days: int, post_count: int, user_count: int) -> bool:
+    all_passed = True
+
+    with unit_of_work() as session:
+        _seed(session, row_count, days, post_count, user_count)
+        connection = session.connection()
+
+        statements = []
+
+        def _capture_statement(conn, cursor, statement, parameters, context, executemany):
+            if not statement.startswith("EXPLAIN"):
+                statements.append((statement, parameters))
+
+        event.listen(connection, "before_cursor_execute", _capture_statement)
+        try:
+            for name, check in _get_checks(post_count).items():
+                statements.clear()
+                check()
+
+                for statement, parameters in list(statements):
+                    plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+                    scans = _get_scans(plan[0]["Plan"])
+                    passed = any(node_type in _INDEX_NODE_TYPES for node_type, _ in scans) and not any(
+                        node_type == "Seq Scan" for node_type, _ in scans
+                    )
+                    expected_index = _EXPECTED_INDEXES.get(name)
+                    if expected_index and expected_index not in (index_name for _, index_name in scans):
+                        passed = False
+                    all_passed &= passed
+
+                    scan_descriptions = ", ".join(
+                        f"{node_type} {index_name}".strip() for node_type, index_name in scans
+                    )
+                    result = f"{'OK' if passed else 'FAIL':>4} {name}: {scan_descriptions or 'no scan of mod_actions'}"
+                    if not passed and expected_index:
+                        result += f" (expected {expected_index})"
+                    print(result)
+        finally:
+            event.remove(connection, "before_cursor_execute", _capture_statement)
+
+    return all_passed
+
+
+def _get_parser() -> argparse.ArgumentParser:
+    new_parser = argparse.ArgumentParser(description="Check that mod_actions queries use indexes.")
+    new_parser.add_argument("-n", "--rows", type=int, default=200000, help="Number of synthetic mod actions.")
+    new_parser.add_argument("-d", "--days", type=int, default=365, help="Days the mod actions are spread over.")
+    new_parser.add_argument("--posts", type=int, default=20000, help="Number of distinct target posts.")
+    new_parser.add_argument("--users", type=int, default=20000, help="Number of distinct target users.")
+    return new_parser
+
+
+if __name__ == "__main__":
+    parser = _get_parser()
+    args = parser.parse_args()
+    if not main(args.rows, args.days, args.posts, args.users):
+        sys.exit(1)
@@ -0,0 +1,116 @@
+"""
+Benchmarks the flair frequency check (PostData.get_flaired_posts_by_username) with and without the
+(lower(author), lower(flair_text), created_time) index on a realistic number of posts.
+Seeds synthetic posts into a temporary copy of posts with the same indexes, which shadows the real table for the
+duration of one transaction, so nothing is written to the real one. Use with -h for options.
+"""
+
+import argparse
+from datetime import datetime, timedelta, timezone
+import random
+import statistics
+import time
+
+from sqlalchemy.sql import text
+
+from data.post_data import PostData
+from data.session import unit_of_work
+
+_post_data = PostData()
+
+# Checked flairs first, the rest only add volume. Weighted roughly like a busy subreddit.
+_CHECKED_FLAIRS = ["Fanart", "Cosplay"]
+_FLAIRS = _CHECKED_FLAIRS + ["Clip", "Video", "Episode", "Discussion", "Misc.", "Question", "News", "Rewatch"]
+_FLAIR_WEIGHTS = [15, 5, 10, 5, 10, 20, 10, 15, 5, 5]
+
+
+def _seed(session, post_count: int, author_count: int, days: int):
+    # Temporary tables come first in the search path, so the queries below read this one instead of the real table.
+    session.execute(text("CREATE TEMPORARY TABLE posts (LIKE public.posts INCLUDING ALL) ON COMMIT DROP;"))
+    session.execute(text("SELECT setseed(0.5);"))
+    # Cubing the random number skews posts towards a small number of very active authors.
+    session.execute(
+        text("""
+        INSERT INTO posts (id, id36, author, title, flair_text, created_time)
+        SELECT i,
+               i::text,
+               'User_' || floor(power(random(), 3) * :author_count)::int,
+               'Post ' || i,
+               (CAST(:flairs AS text[]))[1 + floor(random() * cardinality(CAST(:flairs AS text[])))::int],
+               now() - make_interval(secs => i * :spacing_seconds)
+        FROM generate_series(1, :post_count) AS i;
+        """),
+        {
+            "author_count": author_count,
+            "flairs": random.Random(0).choices(_FLAIRS, _FLAIR_WEIGHTS, k=1000),
+            "spacing_seconds": days * 86400 / post_count,
+            "post_count": post_count,
+        },
+    )
+    session.execute(text("ANALYZE posts;"))
+
+
+def _get_flair_index_name(session) -> str:
+    sql = text("""
+    SELECT indexname FROM pg_indexes
+    WHERE schemaname = (SELECT nspname FROM pg_namespace WHERE oid = pg_my_temp_schema())
+    AND tablename = 'posts' AND indexdef LIKE '%lower((flair_text)::text)%';
+    """)
+
+    result = session.execute(sql).fetchone()
+    return result[0] if result else ""
+
+
+def _benchmark(label: str, usernames: list[str], repeat: int):
+    end_date = datetime.now(timezone.utc)
+    start_date = end_date - timedelta(days=7)
+
+    timings_ms = []
+    post_counts = []
+    for _ in range(repeat):
+        for username in usernames:
+            start_time = time.perf_counter()
+            posts = _post_data.get_flaired_posts_by_username(
+                username, _CHECKED_FLAIRS, exclude_reddit_ids=["0"], start_date=str(start_date), end_date=str(end_date)
+            )
+            timings_ms.append((time.perf_counter() - start_time) * 1000)
+            post_counts.append(len(posts))
+
+    timings_ms.sort()
+    print(
+        f"{label:>14}: p50 {statistics.median(timings_ms):7.3f} ms,"
+        f" p95 {timings_ms[int(len(timings_ms) * 0.95)]:7.3f} ms, max {timings_ms[-1]:7.3f} ms,"
+        f" {statistics.mean(post_counts):.1f} posts found on average"
+    )
+
+
+def main(post_count: int, author_count: int, days: int, repeat: int):
+    with unit_of_work() as session:
+        _seed(session, post_count, author_count, days)
+
+        # The most active authors are the worst case, plus a sample of everyone else.
+        usernames = [f"User_{i}" for i in range(10)] + [f"User_{i}" for i in random.sample(range(author_count), 40)]
+
+        index_name = _get_flair_index_name(session)
+        if not index_name:
+            print("No author/flair index on posts, run the migrations first. Only measuring without it.")
+        else:
+            _benchmark("with index", usernames, repeat)
+            session.execute(text(f"DROP INDEX pg_temp.{index_name};"))
+
+        _benchmark("without index", usernames, repeat)
+
+
+def _get_parser() -> argparse.ArgumentParser:
+    new_parser = argparse.ArgumentParser(description="Benchmark the flair frequency check query.")
+    new_parser.add_argument("-n", "--posts", type=int, default=500000, help="Number of synthetic posts.")
+    new_parser.add_argument("-a", "--authors", type=int, default=50000, help="Number of distinct authors.")
+    new_parser.add_argument("-d", "--days", type=int, default=5 * 365, help="Days the posts are spread over.")
+    new_parser.add_argument("-r", "--repeat", type=int, default=20, help="Times to run the check for each author.")
+    return new_parser
+
+
+if __name__ == "__main__":
+    parser = _get_parser()
+    args = parser.parse_args()
+    main(args.posts, args.authors, args.days, args.repeat)
@@ -1,7 +1,8 @@
 """
 Gathers a snapshot of the front page of a subreddit, designed to be run at the top of each hour (currently via cron).
 Saves posts and their rank in a database to provide changes from the previous hour and how long a post has been there.
-Also collects traffic for the sub provided by the API.
+Also collects traffic for the sub provided by the API, creates upcoming monthly partitions of the database and
+updates the daily rollups.
 """
 
 from collections import Counter
@@ -10,7 +11,7 @@ from datetime import datetime, timezone, timedelta
 import config_loader
 from utils import discord, reddit as reddit_utils
 from utils.logger import logger
-from services import snapshot_service, traffic_service
+from services import partition_service, rollup_service, snapshot_service, traffic_service
 
 
 def _format_line(submission, position, rank_change, total_hours):
@@ -132,3 +133,5 @@ if __name__ == "__main__":
     subreddit = reddit.subreddit(config_loader.REDDIT["subreddit"])
     check_front_page(subreddit)
     update_traffic(subreddit)
+    partition_service.create_future_partitions()
+    rollup_service.update_rollups()
@@ -24,13 +24,13 @@ _user_data = UserData()
 DB_FILE = "src/database.db"
 
 
-def migrate_posts(offset=0):
-    """Grabs posts in batches of 1000 at a time and migrates them to the new database.
-    Returns number of processed rows. If less than 1000, at end of the table."""
+def migrate_posts(after_psk=0):
+    """Grabs posts in batches of 1000 at a time, continuing after the given psk, and migrates them to the new database.
+    Returns number of processed rows and the last psk. If less than 1000 rows, at end of the table."""
     conn = sqlite3.connect(DB_FILE)
     conn.row_factory = sqlite3.Row
 
-    rows = conn.execute("SELECT * FROM posts LIMIT 1000 OFFSET ?;", (offset,)).fetchall()
+    rows = conn.execute("SELECT * FROM posts WHERE psk > ? ORDER BY psk LIMIT 1000;", (after_psk,)).fetchall()
 
     conn.close()
 
@@ -59,9 +59,10 @@ def migrate_posts(offset=0):
 
     if not row:
         logger.warning("No rows processed!")
-    else:
-        logger.info(f"Most recent migrated row: psk={row['psk']}, id={row['id']}")
-    return len(rows)
+        return 0, after_psk
+
+    logger.info(f"Most recent migrated row: psk={row['psk']}, id={row['id']}")
+    return len(rows), row["psk"]
 
 
 def migrate_snapshots(date, hour):
@@ -101,14 +102,15 @@ def migrate_snapshots(date, hour):
 
 
 def main():
-    current_offset = 0
+    total_posts = 0
+    last_psk = 0
     while True:
-        processed_posts = migrate_posts(current_offset)
-        current_offset += processed_posts
+        processed_posts, last_psk = migrate_posts(last_psk)
+        total_posts += processed_posts
         if processed_posts < 1000:
             break
-        if current_offset % 1000 == 0:
-            logger.info(f"Migrated {current_offset} posts total")
+        if total_posts % 1000 == 0:
+            logger.info(f"Migrated {total_posts} posts total")
 
     current_datetime = datetime.fromisoformat("2020-05-12 04:00:00.000")
     now = datetime.utcnow()
@@ -14,6 +14,7 @@ from io import StringIO
 import prawcore
 
 import config_loader
+from data.session import read_only
 from services import comment_service, post_service, mod_action_service
 from utils import reddit as reddit_utils
 
@@ -312,4 +313,5 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with read_only():
+        main()
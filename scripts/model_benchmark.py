@@ -0,0 +1,119 @@
+"""
+Benchmarks creating models from rows and reading their columns, compared to the previous __getattr__ based models.
+Uses an in-memory SQLite table shaped like comments so no database connection is needed. Use with -h for options.
+"""
+
+import argparse
+from datetime import datetime, timezone
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine, text
+
+from data.comment_data import CommentModel
+
+
+class _LegacyCommentModel:
+    """The previous BaseModel implementation, trimmed down to what's being measured."""
+
+    _row = None
+    _columns = CommentModel._columns
+    _modified = {}
+
+    def __init__(self, row=None):
+        self._row = row
+        self._modified = {}
+
+    def __getattr__(self, item):
+        if self._row and item in self._columns:
+            object.__setattr__(self, item, self._row[item])
+            return self._row[item]
+
+        raise AttributeError(f"Could not locate column named {item}")
+
+    def __setattr__(self, key, value):
+        if key in self._columns:
+            if self._row is None:
+                self._modified[key] = value
+            elif hasattr(self, key) and self.__getattribute__(key) != value:
+                self._modified[key] = value
+
+        object.__setattr__(self, key, value)
+
+
+def _load_rows(row_count: int) -> list:
+    engine = create_engine("sqlite://")
+    created_time = datetime.now(timezone.utc)
+
+    with engine.connect() as connection:
+        connection.execute(text(f"CREATE TABLE comments ({', '.join(CommentModel._columns)});"))
+        connection.execute(
+            text(f"INSERT INTO comments VALUES ({', '.join(f':{column}' for column in CommentModel._columns)});"),
+            [
+                {
+                    "id": i,
+                    "id36": str(i),
+                    "post_id": i // 1000,
+                    "parent_id": i - 1 if i % 10 else None,
+                    "author": f"user_{i % 5000}",
+                    "created_time": created_time,
+                    "score": i % 100,
+                    "body": "Just a regular comment about this week's episode. " * 3,
+                    "edited": None,
+                    "distinguished": False,
+                    "deleted": False,
+                    "removed": False,
+                }
+                for i in range(row_count)
+            ],
+        )
+        return connection.execute(text("SELECT * FROM comments;")).fetchall()
+
+
+def _benchmark(label: str, model_class, rows: list):
+    start_time = time.perf_counter()
+    models = [model_class(row) for row in rows]
+    create_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for model in models:
+        for column in CommentModel._columns:
+            getattr(model, column)
+    first_read_seconds = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for model in models:
+        model.score = model.score + 1
+    set_seconds = time.perf_counter() - start_time
+
+    # Memory is measured separately so tracing doesn't skew the timings above.
+    del models
+    tracemalloc.start()
+    models = [model_class(row) for row in rows]
+    for model in models:
+        for column in CommentModel._columns:
+            getattr(model, column)
+    memory_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    row_count = len(rows)
+    print(
+        f"{label:>8}: create {create_seconds / row_count * 1e6:6.2f} us/row,"
+        f" read all columns {first_read_seconds / row_count * 1e6:6.2f} us/row,"
+        f" set one column {set_seconds / row_count * 1e6:6.2f} us/row,"
+        f" memory {memory_bytes / row_count:7.1f} bytes/row"
+    )
+
+
+def _get_parser() -> argparse.ArgumentParser:
+    new_parser = argparse.ArgumentParser(description="Benchmark model creation, column access and memory use.")
+    new_parser.add_argument("-n", "--rows", type=int, default=200000, help="Number of rows to load.")
+    return new_parser
+
+
+if __name__ == "__main__":
+    parser = _get_parser()
+    args = parser.parse_args()
+    benchmark_rows = _load_rows(args.rows)
+    _benchmark("previous", _LegacyCommentModel, benchmark_rows)
+    _benchmark("current", CommentModel, benchmark_rows)
@@ -7,13 +7,14 @@ from collections import Counter
 from datetime import timedelta
 
 from data.post_data import PostModel
+from data.session import read_only
 from services import post_service, comment_service
 from utils import reddit as reddit_utils
 from utils.logger import logger
 
 
 def get_post_users(post: PostModel, max_time_after: timedelta):
-    comments = comment_service.get_comments_by_post_id(post.id36)
+    comments = comment_service.iter_comments_by_post_id(post.id36)
     usernames = set()
     for comment in comments:
         # Deleted/unknown users don't count.
@@ -91,4 +92,5 @@ if __name__ == "__main__":
     with open(args.file, "r") as post_file:
         post_url_list = [s.strip() for s in post_file.readlines()]
 
-    main(post_url_list, args.percentage, args.max_days)
+    with read_only():
+        main(post_url_list, args.percentage, args.max_days)
@@ -0,0 +1,27 @@
+"""
+Creates monthly partitions of comments and mod_actions ahead of time, also run by frontpage.py every hour.
+Only needed by hand to create partitions further ahead, or to check which ones exist. Use with -h for options.
+"""
+
+import argparse
+
+from services import partition_service
+
+
+def _get_parser() -> argparse.ArgumentParser:
+    new_parser = argparse.ArgumentParser(description="Create future monthly partitions.")
+    new_parser.add_argument("-m", "--months", type=int, default=3, help="Number of months ahead to create.")
+    new_parser.add_argument("-l", "--list", action="store_true", help="List existing partitions afterwards.")
+    return new_parser
+
+
+if __name__ == "__main__":
+    parser = _get_parser()
+    args = parser.parse_args()
+
+    created_partitions = partition_service.create_future_partitions(args.months)
+    print(f"Created {len(created_partitions)} partitions")
+
+    if args.list:
+        for table in partition_service.PARTITIONED_TABLES:
+            print(f"{table}: {', '.join(partition_service.get_partitions(table))}")
@@ -1,5 +1,5 @@
 """
-Runs various reports against the database.
+Runs various reports against the database, mostly from the daily rollups (see services.rollup_service).
 All output is via console.
 """
 
@@ -8,12 +8,16 @@ from datetime import datetime, date
 import time
 
 import config_loader
-from constants import mod_constants
-from services import comment_service, mod_action_service, post_service, traffic_service
+from data.session import read_only
+from services import rollup_service, traffic_service
 from utils import discord
 
-# Make a copy of both lists combined for easier use later.
-_bots_and_admins = mod_constants.BOTS[:] + mod_constants.ADMINS
+# Mod categories to count actions for, humans being every mod that isn't a bot or admin.
+_HUMANS = [rollup_service.MOD_CATEGORY_HUMAN]
+_BOTS = [rollup_service.MOD_CATEGORY_BOT]
+_ADMINS = [rollup_service.MOD_CATEGORY_ADMIN]
+_HUMANS_AND_BOTS = _HUMANS + _BOTS
+_HUMAN = rollup_service.AUTHOR_CATEGORY_HUMAN
 
 
 def _report_monthly(report_args: argparse.Namespace):
@@ -22,120 +26,86 @@ def _report_monthly(report_args: argparse.Namespace):
     :param report_args: argparse arguments, date contains datetime with the month to run the report for (ignores day)
     """
 
-    # Wait 10 seconds just in case there are any last second mod actions.
-    time.sleep(10)
-
     # Reports start on the first day of the month and end on the first day of the next month.
     start_date = date(year=report_args.date.year, month=report_args.date.month, day=1)
     end_month = start_date.month + 1 if start_date.month < 12 else 1
     end_year = start_date.year if start_date.month < 12 else start_date.year + 1
     end_date = date(year=end_year, month=end_month, day=1)
 
-    total_posts = post_service.count_posts(start_date, end_date)
-    total_post_authors = post_service.count_post_authors(start_date, end_date)
+    # Comments only count human authors, leaving out deleted ones as well as bots.
+    total_posts = rollup_service.count_posts(start_date, end_date)
+    total_post_authors = rollup_service.count_post_authors(start_date, end_date)
 
-    total_comments = comment_service.count_comments(start_date, end_date, mod_constants.BOTS)
-    total_comment_authors = comment_service.count_comment_authors(start_date, end_date, mod_constants.BOTS)
+    total_comments = rollup_service.count_comments(start_date, end_date, [_HUMAN])
+    total_comment_authors = rollup_service.count_comment_authors(start_date, end_date, [_HUMAN])
 
     monthly_traffic = traffic_service.get_monthly_traffic(start_date)
     total_views = monthly_traffic.total_pageviews
     unique_views = monthly_traffic.unique_pageviews
 
-    removed_posts_humans = mod_action_service.count_mod_actions(
-        "removelink", start_date, end_date, distinct=True, exclude_mod_accounts_list=_bots_and_admins
-    )
-    removed_posts_humans += mod_action_service.count_mod_actions(
-        "spamlink", start_date, end_date, distinct=True, exclude_mod_accounts_list=_bots_and_admins
-    )
+    removed_posts_humans = rollup_service.count_mod_actions("removelink", start_date, end_date, mod_categories=_HUMANS)
+    removed_posts_humans += rollup_service.count_mod_actions("spamlink", start_date, end_date, mod_categories=_HUMANS)
 
-    removed_posts_bots = mod_action_service.count_mod_actions(
-        "removelink", start_date, end_date, distinct=True, mod_accounts_list=mod_constants.BOTS
-    )
-    removed_posts_bots += mod_action_service.count_mod_actions(
-        "spamlink", start_date, end_date, distinct=True, mod_accounts_list=mod_constants.BOTS
-    )
+    removed_posts_bots = rollup_service.count_mod_actions("removelink", start_date, end_date, mod_categories=_BOTS)
+    removed_posts_bots += rollup_service.count_mod_actions("spamlink", start_date, end_date, mod_categories=_BOTS)
 
-    removed_posts_total = mod_action_service.count_mod_actions(
-        "removelink", start_date, end_date, distinct=True, exclude_mod_accounts_list=mod_constants.ADMINS
+    removed_posts_total = rollup_service.count_mod_actions(
+        "removelink", start_date, end_date, mod_categories=_HUMANS_AND_BOTS
     )
-    removed_posts_total += mod_action_service.count_mod_actions(
-        "spamlink", start_date, end_date, distinct=True, exclude_mod_accounts_list=mod_constants.ADMINS
+    removed_posts_total += rollup_service.count_mod_actions(
+        "spamlink", start_date, end_date, mod_categories=_HUMANS_AND_BOTS
     )
 
-    removed_comments_humans = mod_action_service.count_mod_actions(
-        "removecomment", start_date, end_date, distinct=True, exclude_mod_accounts_list=_bots_and_admins
+    removed_comments_humans = rollup_service.count_mod_actions(
+        "removecomment", start_date, end_date, mod_categories=_HUMANS
     )
-    removed_comments_humans += mod_action_service.count_mod_actions(
-        "spamcomment", start_date, end_date, distinct=True, exclude_mod_accounts_list=_bots_and_admins
+    removed_comments_humans += rollup_service.count_mod_actions(
+        "spamcomment", start_date, end_date, mod_categories=_HUMANS
     )
 
-    removed_comments_bots = mod_action_service.count_mod_actions(
-        "removecomment", start_date, end_date, distinct=True, mod_accounts_list=mod_constants.BOTS
-    )
-    removed_comments_bots += mod_action_service.count_mod_actions(
-        "spamcomment", start_date, end_date, distinct=True, mod_accounts_list=mod_constants.BOTS
+    removed_comments_bots = rollup_service.count_mod_actions(
+        "removecomment", start_date, end_date, mod_categories=_BOTS
     )
+    removed_comments_bots += rollup_service.count_mod_actions("spamcomment", start_date, end_date, mod_categories=_BOTS)
 
-    removed_comments_total = mod_action_service.count_mod_actions(
-        "removecomment", start_date, end_date, distinct=True, exclude_mod_accounts_list=mod_constants.ADMINS
+    removed_comments_total = rollup_service.count_mod_actions(
+        "removecomment", start_date, end_date, mod_categories=_HUMANS_AND_BOTS
     )
-    removed_comments_total += mod_action_service.count_mod_actions(
-        "spamcomment", start_date, end_date, distinct=True, exclude_mod_accounts_list=mod_constants.ADMINS
+    removed_comments_total += rollup_service.count_mod_actions(
+        "spamcomment", start_date, end_date, mod_categories=_HUMANS_AND_BOTS
     )
 
-    approved_posts = mod_action_service.count_mod_actions(
-        "approvelink", start_date, end_date, distinct=True, exclude_mod_accounts_list=_bots_and_admins
-    )
-    approved_comments = mod_action_service.count_mod_actions(
-        "approvecomment", start_date, end_date, distinct=True, exclude_mod_accounts_list=_bots_and_admins
-    )
-    distinguished_comments = mod_action_service.count_mod_actions(
-        "distinguish", start_date, end_date, distinct=True, exclude_mod_accounts_list=_bots_and_admins
+    approved_posts = rollup_service.count_mod_actions("approvelink", start_date, end_date, mod_categories=_HUMANS)
+    approved_comments = rollup_service.count_mod_actions("approvecomment", start_date, end_date, mod_categories=_HUMANS)
+    distinguished_comments = rollup_service.count_mod_actions(
+        "distinguish", start_date, end_date, mod_categories=_HUMANS
     )
 
-    banned_users = mod_action_service.count_mod_actions(
-        "banuser", start_date, end_date, distinct=True, exclude_mod_accounts_list=mod_constants.ADMINS
-    )
-    permabanned_users = mod_action_service.count_mod_actions(
-        "banuser",
-        start_date,
-        end_date,
-        distinct=True,
-        details="permanent",
-        exclude_mod_accounts_list=mod_constants.ADMINS,
+    banned_users = rollup_service.count_mod_actions("banuser", start_date, end_date, mod_categories=_HUMANS_AND_BOTS)
+    permabanned_users = rollup_service.count_mod_actions(
+        "banuser", start_date, end_date, details="permanent", mod_categories=_HUMANS_AND_BOTS
     )
-    # banned_users_bots = mod_action_service.count_mod_actions(
-    #     "banuser", start_date, end_date, distinct=True, mod_accounts_list=mod_constants.BOTS
-    # )
-    unbanned_users = mod_action_service.count_mod_actions(
-        "unbanuser", start_date, end_date, distinct=True, exclude_mod_accounts_list=_bots_and_admins
-    )
-    unbanned_users_temp = mod_action_service.count_mod_actions(
-        "unbanuser",
-        start_date,
-        end_date,
-        distinct=True,
-        description="was temporary",
-        exclude_mod_accounts_list=_bots_and_admins,
+    # banned_users_bots = rollup_service.count_mod_actions("banuser", start_date, end_date, mod_categories=_BOTS)
+    unbanned_users = rollup_service.count_mod_actions("unbanuser", start_date, end_date, mod_categories=_HUMANS)
+    unbanned_users_temp = rollup_service.count_mod_actions(
+        "unbanuser", start_date, end_date, description="was temporary", mod_categories=_HUMANS
     )
     actual_unbanned = unbanned_users - unbanned_users_temp
 
-    admin_removed_posts = mod_action_service.count_mod_actions(
-        "removelink", start_date, end_date, distinct=True, mod_accounts_list=mod_constants.ADMINS
-    )
-    admin_removed_comments = mod_action_service.count_mod_actions(
-        "removecomment", start_date, end_date, distinct=True, mod_accounts_list=mod_constants.ADMINS
+    admin_removed_posts = rollup_service.count_mod_actions("removelink", start_date, end_date, mod_categories=_ADMINS)
+    admin_removed_comments = rollup_service.count_mod_actions(
+        "removecomment", start_date, end_date, mod_categories=_ADMINS
     )
 
-    # Adjust numbers based on crowd control filter.
-    crowd_control_removed_comments = mod_action_service.count_mod_actions(
-        "removecomment", start_date, end_date, distinct=True, details="Crowd Control", mod_accounts_list=["reddit"]
+    # Adjust numbers based on crowd control filter, which is applied by the "reddit" admin account.
+    crowd_control_removed_comments = rollup_service.count_mod_actions(
+        "removecomment", start_date, end_date, details="Crowd Control", mod_categories=_ADMINS
     )
     admin_removed_comments -= crowd_control_removed_comments
     removed_comments_bots += crowd_control_removed_comments
 
-    crowd_control_removed_posts = mod_action_service.count_mod_actions(
-        "removelink", start_date, end_date, distinct=True, details="Crowd Control", mod_accounts_list=["reddit"]
+    crowd_control_removed_posts = rollup_service.count_mod_actions(
+        "removelink", start_date, end_date, details="Crowd Control", mod_categories=_ADMINS
     )
     admin_removed_posts -= crowd_control_removed_posts
     removed_posts_bots += crowd_control_removed_posts
@@ -176,4 +146,10 @@ if __name__ == "__main__":
     parser = _get_parser()
     args = parser.parse_args()
     report_func = _reports[args.name]
-    report_func(args)
+
+    # Wait 10 seconds just in case there are any last second mod actions, then roll them up with everything else.
+    time.sleep(10)
+    rollup_service.update_rollups()
+
+    with read_only():
+        report_func(args)
@@ -0,0 +1,26 @@
+"""
+Updates the daily rollups of mod actions, posts and comments, also run by frontpage.py every hour and before reports.
+Only needed by hand to recalculate older days, e.g. after loading old data with another script. Use with -h for options.
+"""
+
+import argparse
+from datetime import date
+
+from services import rollup_service
+
+
+def _get_parser() -> argparse.ArgumentParser:
+    new_parser = argparse.ArgumentParser(description="Update the daily rollups.")
+    new_parser.add_argument(
+        "-s",
+        "--since",
+        type=lambda d: date.fromisoformat(d),
+        help="Recalculate every day since this date (ISO 8601 format), defaults to the last few days rolled up.",
+    )
+    return new_parser
+
+
+if __name__ == "__main__":
+    parser = _get_parser()
+    args = parser.parse_args()
+    rollup_service.update_rollups(args.since)
@@ -0,0 +1,53 @@
+"""
+Full-text search of posts and comments, e.g. to find who said something. Reads from the analytics replica if one is
+configured. Use with -h for options.
+"""
+
+import argparse
+import time
+
+from data.session import read_only
+from services import comment_service, post_service
+
+
+def _print_posts(posts):
+    for post in posts:
+        print(f"{post.created_time:%Y-%m-%d %H:%M} /u/{post.author} https://redd.it/{post.id36} {post.title}")
+
+
+def _print_comments(comments):
+    for comment in comments:
+        body = " ".join((comment.body or "").split())
+        print(f"{comment.created_time:%Y-%m-%d %H:%M} /u/{comment.author} {comment.fullname}: {body[:200]}")
+
+
+def _get_parser() -> argparse.ArgumentParser:
+    new_parser = argparse.ArgumentParser(description="Search post and comment text.")
+    new_parser.add_argument("search_text", help='Words to search for, supports "exact phrase", or and -excluded.')
+    new_parser.add_argument("-p", "--posts", action="store_true", help="Search posts instead of comments.")
+    new_parser.add_argument("-u", "--user", help="Only search content by this user.")
+    new_parser.add_argument("-s", "--start", help="Only search content created at or after this date.")
+    new_parser.add_argument("-e", "--end", help="Only search content created before this date.")
+    new_parser.add_argument("-o", "--order", choices=["rank", "new", "old"], default="rank", help="Result order.")
+    new_parser.add_argument("-n", "--limit", type=int, default=25, help="Maximum number of results.")
+    return new_parser
+
+
+if __name__ == "__main__":
+    parser = _get_parser()
+    args = parser.parse_args()
+
+    start_time = time.perf_counter()
+    with read_only():
+        if args.posts:
+            results = post_service.search_posts(
+                args.search_text, args.user, args.start, args.end, order=args.order, limit=args.limit
+            )
+            _print_posts(results)
+        else:
+            results = comment_service.search_comments(
+                args.search_text, args.user, args.start, args.end, order=args.order, limit=args.limit
+            )
+            _print_comments(results)
+
+    print(f"{len(results)} results in {(time.perf_counter() - start_time) * 1000:.1f} ms")
@@ -0,0 +1,162 @@
+"""
+Compares B-tree and BRIN indexes on created_time for posts, comments and mod_actions: insert throughput, index sizes
+and the time taken by range scans like the ones the known id filters and rollups run.
+Each variant inserts synthetic rows in created_time order into a temporary copy of the table with all of its other
+indexes, which shadows the real table for the duration of one transaction, so nothing is written to the real one.
+Temporary copies aren't partitioned, so the numbers are those of a single partition of that size.
+Use with -h for options.
+"""
+
+import argparse
+from datetime import datetime, timedelta, timezone
+import re
+import time
+
+from sqlalchemy.sql import text
+
+from data.session import unit_of_work
+
+_TABLES = ["posts", "comments", "mod_actions"]
+_VARIANTS = {
+    "btree": ["CREATE INDEX ON {table} (created_time);"],
+    "btree+brin": [
+        "CREATE INDEX ON {table} (created_time);",
+        "CREATE INDEX ON {table} USING brin (created_time) WITH (autosummarize = on);",
+    ],
+    "brin": ["CREATE INDEX ON {table} USING brin (created_time) WITH (autosummarize = on);"],
+}
+
+# Rows i in [:first, :last], created :spacing_seconds apart in order, ending now.
+_INSERT_SQL = {
+    "posts": """
+    INSERT INTO posts (id, id36, author, title, created_time)
+    SELECT i, i::text, 'User_' || i % 5000, 'Post ' || i,
+           :end_time - make_interval(secs => (:row_count - i) * :spacing_seconds)
+    FROM generate_series(:first, :last) AS i;
+    """,
+    "comments": """
+    INSERT INTO comments (id, id36, post_id, author, body, created_time)
+    SELECT i, i::text, i / 50, 'User_' || i % 50000, repeat(md5(i::text), 1 + i % 8),
+           :end_time - make_interval(secs => (:row_count - i) * :spacing_seconds)
+    FROM generate_series(:first, :last) AS i;
+    """,
+    "mod_actions": """
+    INSERT INTO mod_actions (id, action, mod, target_user, target_post_id, created_time)
+    SELECT md5(i::text)::uuid, (ARRAY['removecomment', 'approvecomment', 'removelink', 'banuser'])[1 + i % 4],
+           'mod_' || i % 20, 'User_' || i % 50000, i / 50,
+           :end_time - make_interval(secs => (:row_count - i) * :spacing_seconds)
+    FROM generate_series(:first, :last) AS i;
+    """,
+}
+
+# Indexes on nothing but created_time, whichever kind, are replaced by each variant's.
+_TIME_INDEX_PATTERN = re.compile(r"USING (btree|brin) \(created_time\)")
+
+
+def _create_table(session, table: str, variant: str):
+    # Temporary tables come first in the search path, so the queries below read this one instead of the real table.
+    session.execute(text(f"CREATE TEMPORARY TABLE {table} (LIKE public.{table} INCLUDING ALL) ON COMMIT DROP;"))
+
+    for index_name, index_definition in _get_indexes(session, table):
+        if _TIME_INDEX_PATTERN.search(index_definition):
+            session.execute(text(f"DROP INDEX pg_temp.{index_name};"))
+
+    for index_sql in _VARIANTS[variant]:
+        session.execute(text(index_sql.format(table=table)))
+
+
+def _get_indexes(session, table: str) -> list[tuple[str, str]]:
+    sql = text("""
+    SELECT indexname, indexdef FROM pg_indexes
+    WHERE schemaname = (SELECT nspname FROM pg_namespace WHERE oid = pg_my_temp_schema())
+    AND tablename = :table
+    ORDER BY indexname;
+    """)
+
+    return [tuple(row) for row in session.execute(sql, {"table": table})]
+
+
+def _insert(session, table: str, row_count: int, batch_size: int, days: int) -> float:
+    """Inserts the rows a batch at a time like the feeds do, returns the rows inserted per second."""
+
+    params = {
+        "row_count": row_count,
+        "spacing_seconds": days * 86400 / row_count,
+        "end_time": datetime.now(timezone.utc),
+    }
+
+    start_time = time.perf_counter()
+    for first in range(1, row_count + 1, batch_size):
+        last = min(first + batch_size - 1, row_count)
+        session.execute(text(_INSERT_SQL[table]), {**params, "first": first, "last": last})
+    elapsed = time.perf_counter() - start_time
+
+    # Autovacuum never processes temporary tables, so summarize the BRIN ranges it would have by now.
+    for index_name, index_definition in _get_indexes(session, table):
+        if "USING brin" in index_definition:
+            session.execute(text("SELECT brin_summarize_new_values(CAST(:index AS regclass));"), {"index": index_name})
+    session.execute(text(f"ANALYZE {table};"))
+
+    return row_count / elapsed
+
+
+def _time_range_scans(session, table: str, repeat: int) -> dict[str, float]:
+    """Returns the median time in ms of counting the rows of the last day and the last 30 days."""
+
+    timings = {}
+    now = datetime.now(timezone.utc)
+    for label, days in [("1 day", 1), ("30 days", 30)]:
+        run_times = []
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            session.execute(
+                text(f"SELECT COUNT(*) FROM {table} WHERE created_time >= :start;"), {"start": now - timedelta(days)}
+            )
+            run_times.append((time.perf_counter() - start_time) * 1000)
+
+        timings[label] = sorted(run_times)[len(run_times) // 2]
+
+    return timings
+
+
+def _print_index_sizes(session, table: str):
+    sql = text("""
+    SELECT indexrelid::regclass::text AS index_name, pg_relation_size(indexrelid) AS size
+    FROM pg_index
+    WHERE indrelid = CAST(:table AS regclass)
+    ORDER BY index_name;
+    """)
+
+    rows = session.execute(sql, {"table": f"pg_temp.{table}"}).fetchall()
+    for row in rows:
+        print(f"    {row.index_name:<48} {row.size / 1024 ** 2:10.2f} MB")
+    print(f"    {'total':<48} {sum(row.size for row in rows) / 1024 ** 2:10.2f} MB")
+
+
+def main(tables: list[str], row_count: int, batch_size: int, days: int, repeat: int):
+    for table in tables:
+        for variant in _VARIANTS:
+            with unit_of_work() as session:
+                _create_table(session, table, variant)
+                rows_per_second = _insert(session, table, row_count, batch_size, days)
+                scan_times = _time_range_scans(session, table, repeat)
+
+                print(f"{table} with {variant} on created_time: {rows_per_second:,.0f} rows/s inserted")
+                print("    " + ", ".join(f"last {label} {ms:.2f} ms" for label, ms in scan_times.items()))
+                _print_index_sizes(session, table)
+
+
+def _get_parser() -> argparse.ArgumentParser:
+    new_parser = argparse.ArgumentParser(description="Compare B-tree and BRIN indexes on created_time.")
+    new_parser.add_argument("-t", "--tables", nargs="+", choices=_TABLES, default=_TABLES, help="Tables to compare.")
+    new_parser.add_argument("-n", "--rows", type=int, default=1000000, help="Number of synthetic rows per table.")
+    new_parser.add_argument("-b", "--batch-size", type=int, default=100, help="Rows inserted per statement.")
+    new_parser.add_argument("-d", "--days", type=int, default=365, help="Days the rows are spread over.")
+    new_parser.add_argument("-r", "--repeat", type=int, default=10, help="Times to run each range scan.")
+    return new_parser
+
+
+if __name__ == "__main__":
+    parser = _get_parser()
+    args = parser.parse_args()
+    main(args.tables, args.rows, args.batch_size, args.days, args.repeat)
@@ -9,6 +9,7 @@ https://www.reddit.com/r/anime/comments/qocky5/-/hjm4hvs/
 
 from sqlalchemy.sql import text
 
+from data.session import read_only
 from services import post_service, comment_service
 from utils.logger import logger
 from utils.reddit import base36encode, make_permalink
@@ -153,10 +154,11 @@ def main():
 
 
 if __name__ == "__main__":
-    result = _comment_data.execute(sql=text("""SELECT count(*) from comments;"""))
-    logger.info(f"Total comments in db: {result[0][0]}")
-    result = _comment_data.execute(sql=text("""SELECT count(*) from posts;"""))
-    logger.info(f"Total posts in db: {result[0][0]}")
-    result = _comment_data.execute(sql=text("""SELECT count(*) from users;"""))
-    logger.info(f"Total users in db: {result[0][0]}")
-    main()
+    with read_only():
+        result = _comment_data.execute(sql=text("""SELECT count(*) from comments;"""))
+        logger.info(f"Total comments in db: {result[0][0]}")
+        result = _comment_data.execute(sql=text("""SELECT count(*) from posts;"""))
+        logger.info(f"Total posts in db: {result[0][0]}")
+        result = _comment_data.execute(sql=text("""SELECT count(*) from users;"""))
+        logger.info(f"Total users in db: {result[0][0]}")
+        main()
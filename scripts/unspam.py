@@ -17,8 +17,8 @@ reddit = None
 
 
 def approve_user_items(username, start_date, end_date):
-    posts = post_service.get_posts_by_username(username, start_date, end_date)
-    comments = comment_service.get_comments_by_username(username, start_date, end_date)
+    posts = post_service.iter_posts_by_username(username, start_date, end_date)
+    comments = comment_service.iter_comments_by_username(username, start_date, end_date)
 
     id_list = [f"t3_{post.id36}" for post in posts if not post.removed]
     id_list.extend(f"t1_{comment.id36}" for comment in comments if not comment.removed)
@@ -25,6 +25,90 @@ DB_CONNECTION = (
     f'postgresql+psycopg2://{os.environ.get("DB_USER")}:{os.environ.get("DB_PASSWORD")}@'
     f'{os.environ.get("DB_HOST")}:{os.environ.get("DB_PORT")}/{os.environ.get("DB_NAME")}'
 )
+# Same database for the async data layer, see data.async_session.
+ASYNC_DB_CONNECTION = DB_CONNECTION.replace("postgresql+psycopg2://", "postgresql+asyncpg://", 1)
+
+DB_POOL = {
+    "size": int(os.environ.get("DB_POOL_SIZE", 5)),  # raised to fit the consolidated feed's workers if needed
+    "max_overflow": int(os.environ.get("DB_POOL_MAX_OVERFLOW", 10)),
+    "timeout": int(os.environ.get("DB_POOL_TIMEOUT", 30)),  # seconds to wait for a connection
+    "recycle": int(os.environ.get("DB_POOL_RECYCLE", -1)),  # seconds before reconnecting, -1 to never recycle
+    "pre_ping": os.environ.get("DB_POOL_PRE_PING", "True").lower() in ["true", "t", "1", "yes", "y"],  # load as bool
+    "statement_timeout_ms": int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 0)),  # 0 for no timeout
+    "application_name": os.environ.get("DB_APPLICATION_NAME", "modbot"),
+    "stats_interval": int(os.environ.get("DB_POOL_STATS_INTERVAL", 0)),  # seconds between logging stats, 0 to disable
+}
+
+# Optional read replica for long read-only queries like reports, see data.session.read_only.
+# Leave ANALYTICS_DB_HOST unset to run everything on the primary, the other connection values default to the primary's.
+ANALYTICS_DB = {
+    "connection": (
+        f'postgresql+psycopg2://{os.environ.get("ANALYTICS_DB_USER", os.environ.get("DB_USER"))}:'
+        f'{os.environ.get("ANALYTICS_DB_PASSWORD", os.environ.get("DB_PASSWORD"))}@'
+        f'{os.environ.get("ANALYTICS_DB_HOST")}:'
+        f'{os.environ.get("ANALYTICS_DB_PORT", os.environ.get("DB_PORT"))}/'
+        f'{os.environ.get("ANALYTICS_DB_NAME", os.environ.get("DB_NAME"))}'
+        if os.environ.get("ANALYTICS_DB_HOST")
+        else None
+    ),
+    "pool_size": int(os.environ.get("ANALYTICS_DB_POOL_SIZE", 2)),
+    "statement_timeout_ms": int(os.environ.get("ANALYTICS_DB_STATEMENT_TIMEOUT_MS", 0)),  # 0 for no timeout
+    "retry_interval": int(os.environ.get("ANALYTICS_DB_RETRY_INTERVAL", 60)),  # seconds on the primary after a failure
+}
+
+# Cache of posts, comments and users by id, see data.model_cache.
+MODEL_CACHE = {
+    "size": int(os.environ.get("MODEL_CACHE_SIZE", 10000)),  # max entries per table, 0 to disable
+    "ttl": int(os.environ.get("MODEL_CACHE_TTL", 60)),  # seconds before an entry is read from the database again
+    "stats_interval": int(os.environ.get("MODEL_CACHE_STATS_INTERVAL", 0)),  # seconds between logging, 0 to disable
+}
+
+# Filter of comment and mod action ids created recently, see utils.bloom_filter.KnownIds.
+KNOWN_IDS = {
+    "window_hours": int(os.environ.get("KNOWN_IDS_WINDOW_HOURS", 48)),  # how far back to load ids from at startup
+    "error_rate": float(os.environ.get("KNOWN_IDS_ERROR_RATE", 0.001)),  # target false positive rate
+    "stats_interval": int(os.environ.get("KNOWN_IDS_STATS_INTERVAL", 0)),  # seconds between logging, 0 to disable
+}
+
+# Queues between fetching feed items and processing them, see utils.pipeline.Pipeline.
+FEED_PIPELINE = {
+    "workers": int(os.environ.get("FEED_PIPELINE_WORKERS", 4)),  # processing threads per feed
+    "queue_size": int(os.environ.get("FEED_PIPELINE_QUEUE_SIZE", 100)),  # items per worker before fetching waits
+    "stats_interval": int(os.environ.get("FEED_PIPELINE_STATS_INTERVAL", 0)),  # seconds between logging, 0 to disable
+}
+
+# Processing new comments from the stream in batches, see feeds.new_comments.process_stream_in_batches.
+COMMENT_BATCH = {
+    "size": int(os.environ.get("COMMENT_BATCH_SIZE", 0)),  # most comments per batch, 0 or 1 for one at a time
+    "max_wait_ms": int(os.environ.get("COMMENT_BATCH_MAX_WAIT_MS", 500)),  # longest to keep gathering a batch for
+}
+
+# How far each feed stream has been processed, see utils.checkpoint.StreamCheckpoint.
+CHECKPOINTS = {
+    "save_interval": int(
+        os.environ.get("CHECKPOINT_SAVE_INTERVAL", 5)
+    ),  # least seconds between saves, 0 for every item
+}
+
+# Catching feeds up on what they missed while they were down, see utils.catch_up.
+CATCH_UP = {
+    "enabled": os.environ.get("CATCH_UP_ENABLED", "True").lower() in ["true", "t", "1", "yes", "y"],  # load as bool
+    "batch_size": int(os.environ.get("CATCH_UP_BATCH_SIZE", 100)),  # items saved per transaction while catching up
+}
+
+# Daily rollups, see services.rollup_service.
+ROLLUPS = {
+    "recalculate_days": int(os.environ.get("ROLLUP_RECALCULATE_DAYS", 3)),  # trailing days recalculated on each update
+}
+
+# Per statement timing, see data.query_stats.
+QUERY_STATS = {
+    "enabled": os.environ.get("QUERY_STATS_ENABLED", "True").lower() in ["true", "t", "1", "yes", "y"],  # load as bool
+    "slow_ms": int(os.environ.get("QUERY_STATS_SLOW_MS", 0)),  # log statements taking at least this long, 0 to disable
+    "explain_slow": os.environ.get("QUERY_STATS_EXPLAIN_SLOW", "False").lower() in ["true", "t", "1", "yes", "y"],
+    "top_n": int(os.environ.get("QUERY_STATS_TOP_N", 20)),  # number of statements to log
+    "stats_interval": int(os.environ.get("QUERY_STATS_INTERVAL", 0)),  # seconds between logging, 0 to disable
+}
 
 WEB_SERVER = {
     "port": int(os.environ.get("WEB_SERVER_PORT")),
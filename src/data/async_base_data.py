@@ -0,0 +1,113 @@
+from typing import Optional, Union
+
+from sqlalchemy.engine.result import Row
+from sqlalchemy.sql import text
+
+from data import model_cache
+from data.async_session import async_session_scope
+from data.base_data import BaseData, BaseModel
+
+
+class AsyncBaseData:
+    """
+    Async twin of BaseData on an asyncpg pool, with the same methods and models. Statements are built by BaseData
+    so both always send the same SQL.
+    """
+
+    async def insert(self, model: BaseModel, error_on_conflict: bool = True):
+        sql, sql_parameterized, fetch_existing = BaseData._build_insert_sql(model, error_on_conflict)
+
+        async with async_session_scope() as session:
+            result_row = (await session.execute(sql, sql_parameterized)).fetchone()
+
+            # Only if the row was inserted by another transaction while this statement was running.
+            if result_row is None and fetch_existing:
+                result_row = await self._get_existing_row(session, model)
+
+            new_model = model.__class__(result_row)
+            if result_row is not None:
+                model_cache.write_through(session.sync_session, new_model)
+
+        return new_model
+
+    async def upsert(self, model: BaseModel, protected_fields: list[str] = None) -> BaseModel:
+        """See BaseData.upsert."""
+
+        sql, sql_parameterized = BaseData._build_upsert_sql(model, protected_fields)
+
+        async with async_session_scope() as session:
+            result_row = (await session.execute(sql, sql_parameterized)).fetchone()
+
+            # Only if the row was inserted by another transaction while this statement was running.
+            if result_row is None:
+                result_row = await self._get_existing_row(session, model)
+
+            new_model = model.__class__(result_row)
+            model_cache.write_through(session.sync_session, new_model)
+
+        return new_model
+
+    @staticmethod
+    async def _get_existing_row(session, model: BaseModel):
+        return (await session.execute(*BaseData._build_existing_row_sql(model))).fetchone()
+
+    async def update(self, model: BaseModel):
+        if model.pk_field in model.modified_fields:
+            raise NotImplementedError(f"Can't update the primary key of model {model}!")
+
+        if not model.modified_fields:
+            return model
+
+        sql, sql_parameterized = BaseData._build_update_sql(model)
+
+        async with async_session_scope() as session:
+            result_row = (await session.execute(sql, sql_parameterized)).fetchone()
+            new_model = model.__class__(result_row)
+            model_cache.write_through(session.sync_session, new_model)
+
+        return new_model
+
+    async def delete(self, model: BaseModel) -> int:
+        """Deletes the model's row, returns the number of rows deleted."""
+
+        sql, sql_parameterized = BaseData._build_delete_sql(model)
+
+        model_cache.invalidate(model)
+        async with async_session_scope() as session:
+            result = await session.execute(sql, sql_parameterized)
+
+        return result.rowcount
+
+    async def execute(self, sql: Union[str, text], **kwargs) -> list[Row]:
+        if isinstance(sql, str):
+            sql = text(sql)
+
+        async with async_session_scope() as session:
+            result = (await session.execute(sql, kwargs)).fetchall()
+
+        return result
+
+    async def _get_cached(
+        self, model_class: type[BaseModel], pk, sql: Union[str, text], **kwargs
+    ) -> Optional[BaseModel]:
+        """See BaseData._get_cached, the cache is shared with the sync data layer."""
+
+        cache = model_cache.get_cache(model_class)
+        if cache is not None:
+            cached_model = cache.get(pk)
+            if cached_model is not None:
+                return cached_model
+
+        if isinstance(sql, str):
+            sql = text(sql)
+
+        async with async_session_scope() as session:
+            result_row = (await session.execute(sql, kwargs)).fetchone()
+            if result_row is None:
+                return None
+
+            model = model_class(result_row)
+            # Same as a write, only cached once committed, the row may be uncommitted inside a unit of work.
+            model_cache.write_through(session.sync_session, model)
+
+        return model
@@ -0,0 +1,128 @@
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+import json
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+import config_loader
+from data import query_stats
+from utils.logger import logger
+
+AsyncSessionMaker = None
+_async_engine = None
+
+# Session of the async unit of work currently in progress in this task, if any.
+_current_async_session = ContextVar("current_async_session", default=None)
+# Key in the unit of work session's info for callbacks to run once it's committed, see on_commit.
+_ON_COMMIT_KEY = "on_commit"
+
+
+def _create_async_session():
+    global _async_engine, AsyncSessionMaker
+
+    pool_config = config_loader.DB_POOL
+    server_settings = {"application_name": pool_config["application_name"]}
+    if pool_config["statement_timeout_ms"]:
+        server_settings["statement_timeout"] = str(pool_config["statement_timeout_ms"])
+
+    # Same pool settings as the sync engine, it's a separate pool so both count towards the connection limit.
+    _async_engine = create_async_engine(
+        config_loader.ASYNC_DB_CONNECTION,
+        pool_size=pool_config["size"],
+        max_overflow=pool_config["max_overflow"],
+        pool_timeout=pool_config["timeout"],
+        pool_recycle=pool_config["recycle"],
+        pool_pre_ping=pool_config["pre_ping"],
+        connect_args={"server_settings": server_settings},
+    )
+    event.listen(_async_engine.sync_engine, "connect", _set_type_codecs)
+    query_stats.register(_async_engine.sync_engine)
+    AsyncSessionMaker = sessionmaker(bind=_async_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def _set_type_codecs(dbapi_connection, connection_record):
+    """
+    asyncpg has no conversions for jsonb and returns uuid objects, use the same types as psycopg2 so models
+    look the same whichever data layer they came from.
+    """
+
+    dbapi_connection.run_async(
+        lambda connection: connection.set_type_codec(
+            "jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog"
+        )
+    )
+    dbapi_connection.run_async(
+        lambda connection: connection.set_type_codec("uuid", encoder=str, decoder=str, schema="pg_catalog")
+    )
+
+
+@asynccontextmanager
+async def async_session_scope():
+    """
+    Provide a transactional scope around a series of operations.
+    Joins the current async unit of work instead if there is one, leaving commit/rollback to it.
+    """
+
+    current_session = _current_async_session.get()
+    if current_session is not None:
+        yield current_session
+        return
+
+    if AsyncSessionMaker is None:
+        _create_async_session()
+    session = AsyncSessionMaker()
+    try:
+        yield session
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    finally:
+        await session.close()
+
+
+@asynccontextmanager
+async def async_unit_of_work():
+    """
+    Same as session.unit_of_work for async code, every database operation inside it is a single transaction.
+    Each task has its own unit of work, so concurrent events don't share a transaction.
+    """
+
+    if _current_async_session.get() is not None:
+        yield _current_async_session.get()
+        return
+
+    async with async_session_scope() as session:
+        token = _current_async_session.set(session)
+        try:
+            yield session
+        finally:
+            _current_async_session.reset(token)
+
+    # Same as session.unit_of_work, every callback runs even if one fails, the first error is raised afterwards.
+    first_error = None
+    for callback in session.info.pop(_ON_COMMIT_KEY, []):
+        try:
+            callback()
+        except Exception as e:
+            if first_error is None:
+                first_error = e
+            else:
+                logger.exception("Error in on commit callback")
+
+    if first_error is not None:
+        raise first_error
+
+
+def on_commit(callback: Callable[[], None]):
+    """Same as session.on_commit, for the current async unit of work."""
+
+    current_session = _current_async_session.get()
+    if current_session is None:
+        callback()
+        return
+
+    current_session.info.setdefault(_ON_COMMIT_KEY, []).append(callback)
@@ -1,5 +1,6 @@
 from copy import copy
-from typing import Union
+from itertools import groupby
+from typing import Iterator, Optional, Union
 from datetime import datetime
 from decimal import Decimal
 
@@ -8,54 +9,125 @@ import psycopg2.extras
 from sqlalchemy.sql import text
 from sqlalchemy.engine.result import Row
 
+from data import model_cache
+from data.query_builder import QueryBuilder
 from data.session import session_scope
 
 psycopg2.extensions.register_adapter(dict, psycopg2.extras.Json)  # To use a dict for a jsonb column, errors without.
 
 
-class BaseModel:
+# Marks a column that hasn't been set on a model, or wasn't part of the row it was loaded from.
+_UNSET = object()
+
+
+class _Column:
+    """
+    Descriptor for a single model column, generated by _ModelMeta.
+    Values are kept by index in the model's _values list and modifications tracked as bits in _dirty.
+    """
+
+    __slots__ = ("name", "index", "bit")
+
+    def __init__(self, name: str, index: int):
+        self.name = name
+        self.index = index
+        self.bit = 1 << index
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+
+        value = instance._values[self.index]
+        if value is _UNSET:
+            raise AttributeError(f"Could not locate column named {self.name}")
+        return value
+
+    def __set__(self, instance, value):
+        # New models always count as modified, ones from the database only if the value actually changed.
+        current_value = instance._values[self.index]
+        if not instance._from_row or current_value is _UNSET or current_value != value:
+            instance._dirty |= self.bit
+
+        instance._values[self.index] = value
+
+
+class _ModelMeta(type):
+    """
+    Generates a slotted class for each model, with a _Column descriptor per entry in _columns.
+    """
+
+    def __new__(mcs, name, bases, namespace):
+        namespace.setdefault("__slots__", ())
+
+        columns = namespace.get("_columns")
+        if columns is not None:
+            for index, column in enumerate(columns):
+                namespace[column] = _Column(column, index)
+            # Maps a result's column names to where each model column is in its rows, see _get_row_indexes.
+            namespace["_row_indexes"] = {}
+            namespace["_last_row_indexes"] = (None, None)
+
+        return super().__new__(mcs, name, bases, namespace)
+
+
+class BaseModel(metaclass=_ModelMeta):
     """
     A thin wrapper around SQLAlchemy's Row object. Tables are defined manually with alembic.
+    Columns are copied out of the row when created, with only the values and a bitset of modified columns
+    stored per model.
     """
 
-    _row = None
+    # __dict__ is only allocated if something other than a column is set on a model.
+    __slots__ = ("_values", "_dirty", "_from_row", "__dict__")
 
     _table = ""
     _pk_field = ""
+    # Column the table is partitioned on, if any. Partitioned tables need it in every unique constraint, so upsert
+    # conflicts on it along with the primary key, and updates/deletes filter on it to only search one partition.
+    _partition_field = ""
 
     _columns = []
-    # Columns that have been modified, with new values.
-    _modified = {}
+    # Columns that upsert should never overwrite once they have a value.
+    _protected_fields = []
+    # Whether lookups by primary key go through a ModelCache, see data.model_cache.
+    _cached = False
 
     def __init__(self, row: Row = None, lazy: bool = True):
-        self._row = row
-
-        # If we're not lazy loading, load all columns at once.
-        if not lazy and self._row:
-            for column in self._columns:
-                getattr(self, column)
-
-        self._modified = {}
+        # lazy is no longer used since columns are always loaded up front, kept for compatibility.
+        self._dirty = 0
+        self._from_row = row is not None
+
+        if row is None:
+            self._values = [_UNSET] * len(self._columns)
+        else:
+            row_values = tuple(row)
+            self._values = [_UNSET if index is None else row_values[index] for index in self._get_row_indexes(row)]
+
+    @classmethod
+    def _get_row_indexes(cls, row: Row) -> list:
+        """
+        Positions of each of the model's columns in the row, None for any not included. Cached per set of result
+        columns so the names only need to be looked up once per query rather than once per row.
+        """
 
-    def __getattr__(self, item):
-        # Loads column from row if it exists.
-        if self._row and item in self._columns:
-            object.__setattr__(self, item, self._row[item])
-            return self._row[item]
+        # Rows from the same result share their metadata, so the last lookup can usually be reused as-is.
+        last_metadata, last_indexes = cls._last_row_indexes
+        if row._parent is last_metadata:
+            return last_indexes
 
-        raise AttributeError(f"Could not locate column named {item}")
+        row_fields = row._fields
+        indexes = cls._row_indexes.get(row_fields)
 
-    def __setattr__(self, key, value):
-        # Only set as modified if it's a database column *and* it's changed compared to the previous value.
-        if key in self._columns:
-            # New model, not from database.
-            if self._row is None:
-                self._modified[key] = value
-            # Model from database. Column gets loaded when hasattr is called.
-            elif hasattr(self, key) and self.__getattribute__(key) != value:
-                self._modified[key] = value
+        if indexes is None:
+            # First occurrence wins for duplicate names, e.g. SELECT * on a join.
+            field_positions = {}
+            for position, field in enumerate(row_fields):
+                field_positions.setdefault(field, position)
+            indexes = [field_positions.get(column) for column in cls._columns]
+            cls._row_indexes[row_fields] = indexes
 
-        object.__setattr__(self, key, value)
+        cls._last_row_indexes = (row._parent, indexes)
+        return indexes
 
     def to_dict(self):
         """
@@ -85,27 +157,43 @@ class BaseModel:
 
     @property
     def modified_fields(self):
-        return self._modified
+        """Columns that have been modified, with new values."""
+
+        dirty = self._dirty
+        if not dirty:
+            return {}
+
+        return {column: self._values[index] for index, column in enumerate(self._columns) if dirty & (1 << index)}
 
     @property
     def pk_field(self):
         return self._pk_field
 
+    @property
+    def partition_field(self):
+        return self._partition_field
+
     @property
     def columns(self):
         return self._columns
 
+    @property
+    def protected_fields(self):
+        return self._protected_fields
+
     def load(self):
         """
-        Sets all columns as the model's attributes from the saved row.
-        Similar to passing lazy=False when creating the model.
+        Kept for compatibility, all columns are now loaded from the row when the model is created.
         """
 
-        if not self._row:
-            return
+    def _clean_copy(self) -> "BaseModel":
+        """Copy of the model's column values, without any modifications or other attributes set on it."""
 
-        for column in self._columns:
-            getattr(self, column)
+        new_model = self.__class__.__new__(self.__class__)
+        new_model._values = list(self._values)
+        new_model._dirty = 0
+        new_model._from_row = True
+        return new_model
 
 
 class BaseData:
@@ -113,6 +201,31 @@ class BaseData:
     _model_table = ""
 
     def insert(self, model: BaseModel, error_on_conflict: bool = True):
+        if not model.modified_fields:
+            raise ValueError(f"Can't insert model {model} without any fields set!")
+
+        sql, sql_parameterized, fetch_existing = self._build_insert_sql(model, error_on_conflict)
+
+        with session_scope() as session:
+            result_row = session.execute(sql, sql_parameterized).fetchone()
+
+            # Only if the row was inserted by another transaction while this statement was running.
+            if result_row is None and fetch_existing:
+                result_row = self._get_existing_row(session, model)
+
+            new_model = model.__class__(result_row)
+            if result_row is not None:
+                model_cache.write_through(session, new_model)
+
+        return new_model
+
+    @classmethod
+    def _build_insert_sql(cls, model: BaseModel, error_on_conflict: bool) -> tuple[text, dict, bool]:
+        """
+        Builds the INSERT for insert, returns the statement, its params and whether the existing row is fetched
+        by the statement on a conflict.
+        """
+
         # sql_params is a copy of modified_fields with every key replaced as ":key".
         # This avoids SQL injection attacks by forcing every set value to be sent parameterized.
         sql_params = dict(zip([f":{key}" for key in model.modified_fields.keys()], model.modified_fields.values()))
@@ -122,27 +235,229 @@ class BaseData:
         # If error_on_conflict is false, will still return existing row.
         conflict_sql = "ON CONFLICT DO NOTHING" if not error_on_conflict else ""
 
-        sql = text(f"""
+        sql_str = f"""
             INSERT INTO {model.table}
             ({sql_column_str})
             VALUES
             ({sql_param_str})
             {conflict_sql}
-            RETURNING *;
-        """)
+            RETURNING *
+        """
+        sql_parameterized = copy(model.modified_fields)
+
+        # ON CONFLICT DO NOTHING doesn't return an existing row, so fetch it in the same statement if necessary.
+        fetch_existing = not error_on_conflict and hasattr(model, model.pk_field)
+        if fetch_existing:
+            sql_str, existing_row_params = cls._with_existing_row_sql(model, sql_str)
+            sql_parameterized.update(existing_row_params)
+
+        return text(sql_str), sql_parameterized, fetch_existing
+
+    def upsert(self, model: BaseModel, protected_fields: list[str] = None) -> BaseModel:
+        """
+        Inserts the model or updates the existing row with the same primary key in a single statement.
+        Only the model's modified fields are written and the row is left untouched if none of them changed.
+
+        :param model: model with at least its primary key set
+        :param protected_fields: columns to never overwrite once set, in addition to the model's protected fields
+        :return: new model with the current row
+        """
+
+        sql, sql_parameterized = self._build_upsert_sql(model, protected_fields)
 
         with session_scope() as session:
-            result_row = session.execute(sql, model.modified_fields).fetchone()
+            result_row = session.execute(sql, sql_parameterized).fetchone()
 
-            # ON CONFLICT DO NOTHING doesn't return an existing row, so fetch it if necessary.
-            if result_row is None and not error_on_conflict and hasattr(model, model.pk_field):
-                sql = text(f"SELECT * FROM {model.table} WHERE {model.pk_field} = :pk;")
-                result_row = session.execute(sql, {"pk": getattr(model, model.pk_field)}).fetchone()
+            # Only if the row was inserted by another transaction while this statement was running.
+            if result_row is None:
+                result_row = self._get_existing_row(session, model)
 
             new_model = model.__class__(result_row)
+            model_cache.write_through(session, new_model)
 
         return new_model
 
+    @classmethod
+    def _build_upsert_sql(cls, model: BaseModel, protected_fields: list[str] = None) -> tuple[text, dict]:
+        """Builds the INSERT ... ON CONFLICT for upsert, returns the statement and its params."""
+
+        conflict_fields = [model.pk_field] + ([model.partition_field] if model.partition_field else [])
+        if any(field not in model.modified_fields for field in conflict_fields):
+            raise ValueError(f"Can't upsert model {model} without {', '.join(conflict_fields)} set!")
+
+        # sql_params is a copy of modified_fields with every key replaced as ":key".
+        # This avoids SQL injection attacks by forcing every set value to be sent parameterized.
+        sql_params = dict(zip([f":{key}" for key in model.modified_fields.keys()], model.modified_fields.values()))
+        sql_param_str = ", ".join(sql_params.keys())
+        sql_column_str = ", ".join(model.modified_fields.keys())
+
+        protected_fields = set(model.protected_fields) | set(protected_fields or [])
+        update_columns = [column for column in model.modified_fields.keys() if column not in conflict_fields]
+        current_values = [f"{model.table}.{column}" for column in update_columns]
+        # Protected columns can still be filled in if they're currently empty.
+        new_values = []
+        for column in update_columns:
+            if column in protected_fields:
+                new_values.append(f"COALESCE({model.table}.{column}, EXCLUDED.{column})")
+            else:
+                new_values.append(f"EXCLUDED.{column}")
+
+        if update_columns:
+            set_str = ", ".join(f"{column} = {value}" for column, value in zip(update_columns, new_values))
+            # Skipping unchanged rows avoids writing a new row version when nothing changed.
+            conflict_sql = f"""
+            ON CONFLICT ({", ".join(conflict_fields)}) DO UPDATE SET {set_str}
+            WHERE ({", ".join(current_values)}) IS DISTINCT FROM ({", ".join(new_values)})
+            """
+        else:
+            conflict_sql = f"ON CONFLICT ({', '.join(conflict_fields)}) DO NOTHING"
+
+        sql_str = f"""
+            INSERT INTO {model.table}
+            ({sql_column_str})
+            VALUES
+            ({sql_param_str})
+            {conflict_sql}
+            RETURNING *
+        """
+        sql_str, existing_row_params = cls._with_existing_row_sql(model, sql_str)
+
+        sql_parameterized = copy(model.modified_fields)
+        sql_parameterized.update(existing_row_params)
+
+        return text(sql_str), sql_parameterized
+
+    @classmethod
+    def _with_existing_row_sql(cls, model: BaseModel, returning_sql: str) -> tuple[str, dict]:
+        """
+        Wraps an INSERT ... RETURNING statement so the existing row is returned instead if the insert didn't return
+        anything, e.g. ON CONFLICT DO NOTHING or an update that was skipped. Returns the statement and the params
+        it adds.
+        """
+
+        existing_row_filter_sql, existing_row_params = cls._build_existing_row_filter(model)
+        sql = f"""
+            WITH written AS ({returning_sql})
+            SELECT * FROM written
+            UNION ALL
+            SELECT * FROM {model.table} WHERE {existing_row_filter_sql} AND NOT EXISTS (SELECT 1 FROM written);
+        """
+
+        return sql, existing_row_params
+
+    @classmethod
+    def _get_existing_row(cls, session, model: BaseModel):
+        return session.execute(*cls._build_existing_row_sql(model)).fetchone()
+
+    @classmethod
+    def _build_existing_row_sql(cls, model: BaseModel) -> tuple[text, dict]:
+        existing_row_filter_sql, existing_row_params = cls._build_existing_row_filter(model)
+        return text(f"SELECT * FROM {model.table} WHERE {existing_row_filter_sql};"), existing_row_params
+
+    @staticmethod
+    def _build_existing_row_filter(model: BaseModel) -> tuple[str, dict]:
+        """
+        Builds the WHERE condition matching the row an insert of the model conflicted with, returns it and its params.
+        Same as _build_pk_filter, except the partition column comes from the inserted values, since a conflicting row
+        always has the same one.
+        """
+
+        sql = f"{model.pk_field} = :pk"
+        params = {"pk": getattr(model, model.pk_field)}
+
+        partition_field = model.partition_field
+        if partition_field and partition_field in model.modified_fields:
+            sql += f" AND {partition_field} = :partition_value"
+            params["partition_value"] = model.modified_fields[partition_field]
+
+        return sql, params
+
+    def insert_many(
+        self, models: list[BaseModel], on_conflict: str = "error", return_rows: bool = False, page_size: int = 1000
+    ) -> list[BaseModel]:
+        """
+        Inserts many models with multi-row INSERT statements in a single transaction.
+
+        Consecutive models for the same table are sent together, up to page_size rows per statement, so the order
+        of models is preserved (e.g. parent comments only need to come before their children). Columns that are
+        modified on some models but not others are sent as DEFAULT for the rest, same as omitting them in insert.
+
+        :param models: models to insert, usually all of the same class
+        :param on_conflict: "error" to raise on an existing row, "nothing" to skip it
+        :param return_rows: whether to return the inserted rows, skipped rows are not included
+        :param page_size: maximum number of rows in a single statement
+        :return: list of new models if return_rows is set, otherwise an empty list
+        """
+
+        if on_conflict not in ("error", "nothing"):
+            raise ValueError(f"Unknown on_conflict value {on_conflict}")
+
+        for model in models:
+            if not model.modified_fields:
+                raise ValueError(f"Can't insert model {model} without any fields set!")
+
+        new_models = []
+
+        with session_scope() as session:
+            for _, table_group in groupby(models, key=lambda m: m.table):
+                table_models = list(table_group)
+                for start in range(0, len(table_models), page_size):
+                    page_models = table_models[start : start + page_size]  # noqa: E203
+                    sql, sql_kwargs = self._build_insert_many_sql(page_models, on_conflict, return_rows)
+                    result = session.execute(sql, sql_kwargs)
+
+                    if return_rows:
+                        model_class = page_models[0].__class__
+                        for row in result.fetchall():
+                            new_model = model_class(row)
+                            model_cache.write_through(session, new_model)
+                            new_models.append(new_model)
+                    else:
+                        for page_model in page_models:
+                            model_cache.invalidate(page_model)
+
+        return new_models
+
+    @staticmethod
+    def _build_insert_many_sql(models: list[BaseModel], on_conflict: str, return_rows: bool) -> tuple[text, dict]:
+        """Builds a single multi-row INSERT for models of the same table, returns the statement and its params."""
+
+        # Every column modified on at least one of the models, in a stable order.
+        columns = []
+        for model in models:
+            for key in model.modified_fields.keys():
+                if key not in columns:
+                    columns.append(key)
+
+        # Same as insert, every value is sent parameterized, just with the row index added to each name.
+        sql_kwargs = {}
+        value_rows = []
+        for index, model in enumerate(models):
+            row_params = []
+            for column in columns:
+                if column not in model.modified_fields:
+                    row_params.append("DEFAULT")
+                    continue
+                sql_kwargs[f"{column}_{index}"] = model.modified_fields[column]
+                row_params.append(f":{column}_{index}")
+            value_rows.append(f"({', '.join(row_params)})")
+
+        sql_column_str = ", ".join(columns)
+        sql_values_str = ", ".join(value_rows)
+        conflict_sql = "ON CONFLICT DO NOTHING" if on_conflict == "nothing" else ""
+        returning_sql = "RETURNING *" if return_rows else ""
+
+        sql = text(f"""
+            INSERT INTO {models[0].table}
+            ({sql_column_str})
+            VALUES
+            {sql_values_str}
+            {conflict_sql}
+            {returning_sql};
+        """)
+
+        return sql, sql_kwargs
+
     def update(self, model: BaseModel):
         if model.pk_field in model.modified_fields:
             raise NotImplementedError(f"Can't update the primary key of model {model}!")
@@ -150,6 +465,19 @@ class BaseData:
         if not model.modified_fields:
             return model
 
+        sql, sql_parameterized = self._build_update_sql(model)
+
+        with session_scope() as session:
+            result_row = session.execute(sql, sql_parameterized).fetchone()
+            new_model = model.__class__(result_row)
+            model_cache.write_through(session, new_model)
+
+        return new_model
+
+    @staticmethod
+    def _build_update_sql(model: BaseModel) -> tuple[text, dict]:
+        """Builds the UPDATE of the model's modified fields for update, returns the statement and its params."""
+
         # sql_params is a copy of modified_fields with every key replaced as ":key".
         # This avoids SQL injection attacks by forcing every set value to be sent parameterized.
         sql_params = dict(zip([f":{key}" for key in model.modified_fields.keys()], model.modified_fields.values()))
@@ -161,29 +489,52 @@ class BaseData:
         if len(model.modified_fields) > 1:
             sql_column_str = f"({sql_column_str})"
 
+        pk_filter_sql, pk_filter_params = BaseData._build_pk_filter(model)
         sql = text(f"""
             UPDATE {model.table} SET
             {sql_column_str}
             =
             ({sql_param_str})
-            WHERE {model.pk_field} = :pk
+            WHERE {pk_filter_sql}
             RETURNING *;
         """)
 
         sql_parameterized = copy(model.modified_fields)
-        sql_parameterized["pk"] = getattr(model, model.pk_field)
-
-        with session_scope() as session:
-            result_row = session.execute(sql, sql_parameterized).fetchone()
-            new_model = model.__class__(result_row)
+        sql_parameterized.update(pk_filter_params)
 
-        return new_model
+        return sql, sql_parameterized
 
     def delete(self, model: BaseModel):
+        sql, sql_parameterized = self._build_delete_sql(model)
+
+        model_cache.invalidate(model)
+        return self.execute(sql, **sql_parameterized)
+
+    @staticmethod
+    def _build_delete_sql(model: BaseModel) -> tuple[text, dict]:
+        pk_filter_sql, pk_filter_params = BaseData._build_pk_filter(model)
         sql = text(f"""DELETE FROM {model.table}
-            WHERE {model.pk_field} = :pk""")
+            WHERE {pk_filter_sql}""")
 
-        return self.execute(sql, pk=getattr(model, model.pk_field))
+        return sql, pk_filter_params
+
+    @staticmethod
+    def _build_pk_filter(model: BaseModel) -> tuple[str, dict]:
+        """
+        Builds the WHERE condition matching the model's row by primary key, returns it and its params.
+        On partitioned tables the partition column is included when its stored value is known,
+        so only one partition is searched instead of every partition's primary key index.
+        """
+
+        sql = f"{model.pk_field} = :pk"
+        params = {"pk": getattr(model, model.pk_field)}
+
+        partition_field = model.partition_field
+        if partition_field and partition_field not in model.modified_fields and hasattr(model, partition_field):
+            sql += f" AND {partition_field} = :partition_value"
+            params["partition_value"] = getattr(model, partition_field)
+
+        return sql, params
 
     def execute(self, sql: Union[str, text], **kwargs):
         if isinstance(sql, str):
@@ -193,3 +544,92 @@ class BaseData:
             result = session.execute(sql, kwargs).fetchall()
 
         return result
+
+    def execute_write(self, sql: Union[str, text], **kwargs) -> int:
+        """Same as execute for statements that don't return rows, returns the number of rows affected instead."""
+
+        if isinstance(sql, str):
+            sql = text(sql)
+
+        with session_scope() as session:
+            result = session.execute(sql, kwargs)
+
+        return result.rowcount
+
+    def _get_cached(self, model_class: type[BaseModel], pk, sql: Union[str, text], **kwargs) -> Optional[BaseModel]:
+        """
+        Gets a single model by primary key with the given query, checking the model's cache first if it has one.
+        """
+
+        cache = model_cache.get_cache(model_class)
+        if cache is not None:
+            cached_model = cache.get(pk)
+            if cached_model is not None:
+                return cached_model
+
+        if isinstance(sql, str):
+            sql = text(sql)
+
+        with session_scope() as session:
+            result_row = session.execute(sql, kwargs).fetchone()
+            if result_row is None:
+                return None
+
+            model = model_class(result_row)
+            # Same as a write, only cached once committed, the row may be uncommitted inside a unit of work.
+            model_cache.write_through(session, model)
+
+        return model
+
+    def iter_query(self, sql: Union[str, text], batch_size: int = 1000, **kwargs) -> Iterator[Row]:
+        """
+        Same as execute but yields rows as they're read from a server-side cursor, batch_size rows at a time,
+        so only one batch is held in memory regardless of the size of the result.
+        The transaction is kept open until the iterator is exhausted or closed.
+        """
+
+        if isinstance(sql, str):
+            sql = text(sql)
+
+        with session_scope() as session:
+            result = session.execute(sql, kwargs, execution_options={"stream_results": True})
+            while rows := result.fetchmany(batch_size):
+                yield from rows
+
+    def _iter_range(
+        self, model_class: type[BaseModel], start: datetime = None, end: datetime = None, page_size: int = 1000
+    ) -> Iterator[BaseModel]:
+        """
+        Yields every row of the model's table created in [start, end), oldest first, a page at a time.
+        Pages continue from the (created_time, id) of the last row rather than using OFFSET, so each page costs the
+        same no matter how far into the table it is, and each page is its own short query instead of holding a
+        transaction open for the whole scan.
+        """
+
+        after_time = after_id = None
+        while True:
+            query = QueryBuilder(f"SELECT * FROM {model_class._table}")
+            query.suffix("ORDER BY created_time, id LIMIT :page_size", page_size=page_size)
+
+            if start:
+                query.where("created_time >= :start", start=start)
+
+            if end:
+                query.where("created_time < :end", end=end)
+
+            # The plain comparison on created_time lets the created_time index be used for the row comparison.
+            if after_time is not None:
+                query.where(
+                    "created_time >= :after_time AND (created_time, id) > (:after_time, :after_id)",
+                    after_time=after_time,
+                    after_id=after_id,
+                )
+
+            result_rows = self.execute(query.statement, **query.params)
+            for row in result_rows:
+                yield model_class(row)
+
+            if len(result_rows) < page_size:
+                return
+
+            after_time, after_id = result_rows[-1].created_time, result_rows[-1].id
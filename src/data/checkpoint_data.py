@@ -0,0 +1,22 @@
+from typing import Optional
+
+from sqlalchemy.sql import text
+
+from data.base_data import BaseModel, BaseData
+
+
+class CheckpointModel(BaseModel):
+    _table = "stream_checkpoints"
+    _pk_field = "stream"
+    _columns = ["stream", "fullname", "created_time", "updated_time"]
+
+
+class CheckpointData(BaseData):
+    def get_checkpoint(self, stream: str) -> Optional[CheckpointModel]:
+        sql = text("""
+        SELECT * FROM stream_checkpoints
+        WHERE stream = :stream;
+        """)
+
+        result = self.execute(sql, stream=stream)
+        return CheckpointModel(result[0]) if result else None
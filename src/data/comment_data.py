@@ -1,14 +1,33 @@
-from typing import Optional
+from datetime import datetime
+from typing import Iterator, Optional
 
 from sqlalchemy.sql import text
 
+from data.async_base_data import AsyncBaseData
 from data.base_data import BaseModel, BaseData
+from data.query_builder import QueryBuilder
 from utils.reddit import base36decode
 
+# Must match the expression of idx_comments_search for the index to be used.
+_SEARCH_VECTOR = "to_tsvector('english', coalesce(body, ''))"
+_SEARCH_ORDERS = {
+    "rank": f"ORDER BY ts_rank({_SEARCH_VECTOR}, search_query) DESC, created_time DESC",
+    "new": "ORDER BY created_time DESC",
+    "old": "ORDER BY created_time ASC",
+}
+
+# The created_time from comment_ids lets only the comment's partition be scanned, rather than probing all of them.
+_COMMENT_BY_ID_SQL = text("""
+SELECT * FROM comments
+WHERE id = :comment_id
+AND created_time = (SELECT created_time FROM comment_ids WHERE id = :comment_id);
+""")
+
 
 class CommentModel(BaseModel):
     _table = "comments"
     _pk_field = "id"
+    _partition_field = "created_time"
     _columns = [
         "id",
         "id36",
@@ -23,6 +42,8 @@ class CommentModel(BaseModel):
         "deleted",
         "removed",
     ]
+    _protected_fields = ["author"]
+    _cached = True
 
     @property
     def fullname(self):
@@ -36,16 +57,47 @@ class CommentModel(BaseModel):
 
 class CommentData(BaseData):
     def get_comment_by_id(self, comment_id: int) -> Optional[CommentModel]:
+        return self._get_cached(CommentModel, comment_id, _COMMENT_BY_ID_SQL, comment_id=comment_id)
+
+    def get_comments_by_ids(
+        self, comment_ids: list[int], start: datetime = None, end: datetime = None
+    ) -> list[CommentModel]:
+        """
+        Gets every comment in the list that exists, in a single query.
+        Only searches comments created in [start, end], so other partitions aren't scanned. Either bound that isn't
+        given is looked up in comment_ids, i.e. the oldest or newest created_time of the comments.
+        """
+
+        query = QueryBuilder("SELECT * FROM comments")
+        query.where_in("id", "comment_ids", comment_ids)
+
+        if start:
+            query.where("created_time >= :start", start=start)
+        else:
+            query.where("created_time >= (SELECT min(created_time) FROM comment_ids WHERE id = ANY(:comment_ids))")
+        if end:
+            query.where("created_time <= :end", end=end)
+        else:
+            query.where("created_time <= (SELECT max(created_time) FROM comment_ids WHERE id = ANY(:comment_ids))")
+
+        result_rows = self.execute(query.statement, **query.params)
+        return [CommentModel(row) for row in result_rows]
+
+    def iter_ids_since(self, start: datetime, batch_size: int = 10000) -> Iterator[int]:
+        """Yields the id of every comment created since the given time."""
+
         sql = text("""
-        SELECT * FROM comments
-        WHERE id = :comment_id;
+        SELECT id FROM comments
+        WHERE created_time >= :start;
         """)
 
-        result_rows = self.execute(sql, comment_id=comment_id)
-        if not result_rows:
-            return None
+        for row in self.iter_query(sql, batch_size, start=start):
+            yield row.id
 
-        return CommentModel(result_rows[0])
+    def iter_range(self, start: datetime = None, end: datetime = None, page_size: int = 1000) -> Iterator[CommentModel]:
+        """Yields all comments created in [start, end), oldest first, fetching page_size at a time."""
+
+        return self._iter_range(CommentModel, start, end, page_size)
 
     def get_comments_by_post_id(self, post_id: int) -> list[CommentModel]:
         sql = text("""
@@ -56,115 +108,147 @@ class CommentData(BaseData):
         result_rows = self.execute(sql, post_id=post_id)
         return [CommentModel(row) for row in result_rows]
 
+    def iter_comments_by_post_id(self, post_id: int, batch_size: int = 1000) -> Iterator[CommentModel]:
+        sql = text("""
+            SELECT * FROM comments
+            WHERE post_id = :post_id;
+            """)
+
+        for row in self.iter_query(sql, batch_size, post_id=post_id):
+            yield CommentModel(row)
+
     def get_comments_by_username(
         self, username: str, start_date: str = None, end_date: str = None, exclude_cdf: bool = False
     ) -> list[CommentModel]:
-        where_clauses = ["lower(c.author) = :username"]
-        sql_kwargs = {"username": username.lower()}
+        query = self._build_comments_by_username_query(username, start_date, end_date, exclude_cdf)
+        result_rows = self.execute(query.statement, **query.params)
+        return [CommentModel(row) for row in result_rows]
 
-        if start_date:
-            where_clauses.append("c.created_time >= :start_date")
-            sql_kwargs["start_date"] = start_date
+    def iter_comments_by_username(
+        self,
+        username: str,
+        start_date: str = None,
+        end_date: str = None,
+        exclude_cdf: bool = False,
+        batch_size: int = 1000,
+    ) -> Iterator[CommentModel]:
+        query = self._build_comments_by_username_query(username, start_date, end_date, exclude_cdf)
+        for row in self.iter_query(query.statement, batch_size, **query.params):
+            yield CommentModel(row)
+
+    @staticmethod
+    def _build_comments_by_username_query(
+        username: str, start_date: str = None, end_date: str = None, exclude_cdf: bool = False
+    ) -> QueryBuilder:
+        if exclude_cdf:
+            query = QueryBuilder("SELECT * FROM comments c JOIN posts p ON c.post_id = p.id")
+            query.where("p.title not like 'Casual Discussion Fridays - Week of %'")
+        else:
+            query = QueryBuilder("SELECT * FROM comments c")
 
-        if end_date:
-            where_clauses.append("c.created_time < :end_date")
-            sql_kwargs["end_date"] = end_date
+        query.where("lower(c.author) = :username", username=username.lower())
 
-        where_str = " AND ".join(where_clauses)
+        if start_date:
+            query.where("c.created_time >= :start_date", start_date=start_date)
 
-        if exclude_cdf:
-            sql = text(f"""
-                SELECT * FROM comments c JOIN posts p ON c.post_id = p.id
-                WHERE {where_str} AND p.title not like 'Casual Discussion Fridays - Week of %'
-                """)
-        else:
-            sql = text(f"""
-                SELECT * FROM comments c
-                WHERE {where_str};
-                """)
+        if end_date:
+            query.where("c.created_time < :end_date", end_date=end_date)
 
-        result_rows = self.execute(sql, **sql_kwargs)
-        return [CommentModel(row) for row in result_rows]
+        return query
 
     def get_comment_count_by_username(
         self, username: str, start_date: str = None, end_date: str = None, exclude_cdf: bool = False
     ) -> int:
-        where_clauses = ["lower(c.author) = :username"]
-        sql_kwargs = {"username": username.lower()}
+        if exclude_cdf:
+            query = QueryBuilder("SELECT COUNT(*) FROM comments c JOIN posts p ON c.post_id = p.id")
+            query.where("p.title not like 'Casual Discussion Fridays - Week of %'")
+        else:
+            query = QueryBuilder("SELECT COUNT(*) FROM comments c")
+
+        query.where("lower(c.author) = :username", username=username.lower())
 
         if start_date:
-            where_clauses.append("c.created_time >= :start_date")
-            sql_kwargs["start_date"] = start_date
+            query.where("c.created_time >= :start_date", start_date=start_date)
 
         if end_date:
-            where_clauses.append("c.created_time < :end_date")
-            sql_kwargs["end_date"] = end_date
+            query.where("c.created_time < :end_date", end_date=end_date)
+
+        return self.execute(query.statement, **query.params)[0][0]
+
+    def search_comments(
+        self,
+        search_text: str,
+        username: str = None,
+        start_date: str = None,
+        end_date: str = None,
+        min_rank: float = None,
+        order: str = "rank",
+        limit: int = 100,
+    ) -> list[CommentModel]:
+        """
+        Full-text search of comment bodies, with web search syntax, e.g. "exact phrase" or -excluded.
+        order is one of "rank", "new" or "old". A date range only scans the partitions it covers.
+        """
 
-        where_str = " AND ".join(where_clauses)
+        if order not in _SEARCH_ORDERS:
+            raise ValueError(f"Unknown search order {order}, must be one of {', '.join(_SEARCH_ORDERS)}")
 
-        if exclude_cdf:
-            sql = text(f"""
-                SELECT COUNT(*) FROM comments c JOIN posts p ON c.post_id = p.id
-                WHERE {where_str} AND p.title not like 'Casual Discussion Fridays - Week of %'
-                """)
-        else:
-            sql = text(f"""
-                SELECT COUNT(*) FROM comments c
-                WHERE {where_str};
-                """)
+        query = QueryBuilder(
+            "SELECT comments.* FROM comments, websearch_to_tsquery('english', :search_text) AS search_query",
+            f"{_SEARCH_ORDERS[order]} LIMIT :limit",
+        )
+        query.where(f"{_SEARCH_VECTOR} @@ search_query", search_text=search_text, limit=limit)
+
+        if username:
+            query.where("lower(author) = :username", username=username.lower())
 
-        return self.execute(sql, **sql_kwargs)[0][0]
+        if start_date:
+            query.where("created_time >= :start_date", start_date=start_date)
+
+        if end_date:
+            query.where("created_time < :end_date", end_date=end_date)
+
+        if min_rank is not None:
+            query.where(f"ts_rank({_SEARCH_VECTOR}, search_query) >= :min_rank", min_rank=min_rank)
+
+        result_rows = self.execute(query.statement, **query.params)
+        return [CommentModel(row) for row in result_rows]
 
     def get_comment_count(self, start_date: str = None, end_date: str = None, exclude_authors: list = None) -> int:
-        where_clauses = []
-        sql_kwargs = {}
+        query = QueryBuilder("SELECT COUNT(*) FROM comments")
 
         if start_date:
-            where_clauses.append("created_time >= :start_date")
-            sql_kwargs["start_date"] = start_date
+            query.where("created_time >= :start_date", start_date=start_date)
 
         if end_date:
-            where_clauses.append("created_time < :end_date")
-            sql_kwargs["end_date"] = end_date
+            query.where("created_time < :end_date", end_date=end_date)
 
         if exclude_authors is not None:
-            where_clauses.append("author not in :exclude_authors")
-            sql_kwargs["exclude_authors"] = tuple(exclude_authors)
-
-        where_str = " AND ".join(where_clauses)
-        sql = text(f"""
-        SELECT COUNT(*) FROM comments
-        WHERE {where_str};
-        """)
+            query.where_not_in("author", "exclude_authors", exclude_authors)
 
         # Will return a list of tuples with only one item in each, e.g. [(2910,)]
-        result = self.execute(sql, **sql_kwargs)
+        result = self.execute(query.statement, **query.params)
         return result[0][0]
 
     def get_comment_author_count(
         self, start_date: str = None, end_date: str = None, exclude_authors: list = None
     ) -> int:
-        where_clauses = []
-        sql_kwargs = {}
+        query = QueryBuilder("SELECT COUNT(DISTINCT author) FROM comments")
 
         if start_date:
-            where_clauses.append("created_time >= :start_date")
-            sql_kwargs["start_date"] = start_date
+            query.where("created_time >= :start_date", start_date=start_date)
 
         if end_date:
-            where_clauses.append("created_time < :end_date")
-            sql_kwargs["end_date"] = end_date
+            query.where("created_time < :end_date", end_date=end_date)
 
         if exclude_authors is not None:
-            where_clauses.append("author not in :exclude_authors")
-            sql_kwargs["exclude_authors"] = tuple(exclude_authors)
-
-        where_str = " AND ".join(where_clauses)
-        sql = text(f"""
-        SELECT COUNT(DISTINCT author) FROM comments
-        WHERE {where_str};
-        """)
+            query.where_not_in("author", "exclude_authors", exclude_authors)
 
         # Will return a list of tuples with only one item in each, e.g. [(2910,)]
-        result = self.execute(sql, **sql_kwargs)
+        result = self.execute(query.statement, **query.params)
         return result[0][0]
+
+
+class AsyncCommentData(AsyncBaseData):
+    async def get_comment_by_id(self, comment_id: int) -> Optional[CommentModel]:
+        return await self._get_cached(CommentModel, comment_id, _COMMENT_BY_ID_SQL, comment_id=comment_id)
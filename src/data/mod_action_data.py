@@ -1,13 +1,24 @@
-from typing import Optional
+from datetime import datetime
+from typing import Iterator, Optional
 
 from sqlalchemy.sql import text
 
+from data.async_base_data import AsyncBaseData
 from data.base_data import BaseModel, BaseData
+from data.query_builder import QueryBuilder
+
+# The created_time from mod_action_ids lets only the mod action's partition be scanned, rather than probing all of them.
+_MOD_ACTION_BY_ID_SQL = text("""
+SELECT * FROM mod_actions
+WHERE id = :mod_action_id
+AND created_time = (SELECT created_time FROM mod_action_ids WHERE id = :mod_action_id);
+""")
 
 
 class ModActionModel(BaseModel):
     _table = "mod_actions"
     _pk_field = "id"
+    _partition_field = "created_time"
     _columns = [
         "id",
         "action",
@@ -23,79 +34,65 @@ class ModActionModel(BaseModel):
 
 class ModActionData(BaseData):
     def get_mod_action_by_id(self, mod_action_id: str) -> Optional[ModActionModel]:
-        sql = text("""
-        SELECT * FROM mod_actions
-        WHERE id = :mod_action_id;
-        """)
-
-        result_rows = self.execute(sql, mod_action_id=mod_action_id)
+        result_rows = self.execute(_MOD_ACTION_BY_ID_SQL, mod_action_id=mod_action_id)
         if not result_rows:
             return None
 
         return ModActionModel(result_rows[0])
 
+    def iter_ids_since(self, start: datetime, batch_size: int = 10000) -> Iterator[str]:
+        """Yields the id of every mod action created since the given time."""
+
+        sql = text("""
+        SELECT id FROM mod_actions
+        WHERE created_time >= :start;
+        """)
+
+        for row in self.iter_query(sql, batch_size, start=start):
+            yield row.id
+
+    def iter_range(
+        self, start: datetime = None, end: datetime = None, page_size: int = 1000
+    ) -> Iterator[ModActionModel]:
+        """Yields all mod actions created in [start, end), oldest first, fetching page_size at a time."""
+
+        return self._iter_range(ModActionModel, start, end, page_size)
+
     def get_mod_actions_targeting_post(
         self, post_id: int, actions: list[str] = None, limit: int = None, order: str = "DESC"
     ):
-        where_clauses = ["target_post_id = :post_id"]
-        sql_kwargs = {"post_id": post_id}
+        query = QueryBuilder("SELECT * FROM mod_actions")
+        query.where("target_post_id = :post_id", post_id=post_id)
 
         if actions:
-            action_params = [f":action{i}" for i, _ in enumerate(actions)]
-            action_param_str = ", ".join(action_params)
-            where_clauses.append(f"action in ({action_param_str})")
-            for param, action in zip(action_params, actions):
-                sql_kwargs[param.lstrip(":")] = action
+            query.where_in("action", "actions", actions)
 
+        order_str = "ORDER BY created_time DESC" if order == "DESC" else ""
         if limit:
-            limit_str = "LIMIT :limit"
-            sql_kwargs["limit"] = limit
+            query.suffix(f"{order_str} LIMIT :limit", limit=limit)
         else:
-            limit_str = ""
-
-        where_str = " AND ".join(where_clauses)
-        order_str = "ORDER BY created_time DESC" if order == "DESC" else ""
+            query.suffix(order_str)
 
-        sql = text(f"""
-            SELECT * FROM mod_actions
-            WHERE {where_str}
-            {order_str}
-            {limit_str};
-            """)
-
-        result_rows = self.execute(sql, **sql_kwargs)
+        result_rows = self.execute(query.statement, **query.params)
         result_models = [ModActionModel(row) for row in result_rows]
         return result_models
 
     def get_mod_actions_targeting_username(
         self, username: str, actions: list[str] = None, start_date: str = None, end_date: str = None
     ) -> list[ModActionModel]:
-        where_clauses = ["lower(target_user) = :username"]
-        sql_kwargs = {"username": username.lower()}
+        query = QueryBuilder("SELECT * FROM mod_actions")
+        query.where("lower(target_user) = :username", username=username.lower())
 
         if actions:
-            action_params = [f":action{i}" for i, _ in enumerate(actions)]
-            action_param_str = ", ".join(action_params)
-            where_clauses.append(f"action in ({action_param_str})")
-            for param, action in zip(action_params, actions):
-                sql_kwargs[param.lstrip(":")] = action
+            query.where_in("action", "actions", actions)
 
         if start_date:
-            where_clauses.append("created_time >= :start_date")
-            sql_kwargs["start_date"] = start_date
+            query.where("created_time >= :start_date", start_date=start_date)
 
         if end_date:
-            where_clauses.append("created_time < :end_date")
-            sql_kwargs["end_date"] = end_date
-
-        where_str = " AND ".join(where_clauses)
-
-        sql = text(f"""
-        SELECT * FROM mod_actions
-        WHERE {where_str};
-        """)
+            query.where("created_time < :end_date", end_date=end_date)
 
-        result_rows = self.execute(sql, **sql_kwargs)
+        result_rows = self.execute(query.statement, **query.params)
         return [ModActionModel(row) for row in result_rows]
 
     def count_mod_actions(
@@ -131,33 +128,33 @@ class ModActionData(BaseData):
         else:
             distinct = "*"
 
-        where_clauses = ["action = :action", "created_time >= :start_time", "created_time < :end_time"]
-        sql_kwargs = {"action": action, "start_time": start_time, "end_time": end_time}
+        query = QueryBuilder(f"SELECT COUNT({distinct}) FROM mod_actions")
+        query.where("action = :action", action=action)
+        query.where("created_time >= :start_time", start_time=start_time)
+        query.where("created_time < :end_time", end_time=end_time)
 
         if details:
-            where_clauses.append("details = :details")
-            sql_kwargs["details"] = details
+            query.where("details = :details", details=details)
 
         if description:
-            where_clauses.append("description = :description")
-            sql_kwargs["description"] = description
+            query.where("description = :description", description=description)
 
         if include_mods is not None:
-            where_clauses.append("mod in :include_mods")
-            sql_kwargs["include_mods"] = tuple(include_mods)
+            query.where_in("mod", "include_mods", include_mods)
 
         if exclude_mods is not None:
-            where_clauses.append("mod not in :exclude_mods")
-            sql_kwargs["exclude_mods"] = tuple(exclude_mods)
-
-        where_str = " AND ".join(where_clauses)
-
-        sql = text(f"""
-        SELECT COUNT({distinct}) FROM mod_actions
-        WHERE {where_str};
-        """)
+            query.where_not_in("mod", "exclude_mods", exclude_mods)
 
         # Will return a list of tuples with only one item in each, e.g. [(2910,)]
-        result = self.execute(sql, **sql_kwargs)
+        result = self.execute(query.statement, **query.params)
 
         return result[0][0]
+
+
+class AsyncModActionData(AsyncBaseData):
+    async def get_mod_action_by_id(self, mod_action_id: str) -> Optional[ModActionModel]:
+        result_rows = await self.execute(_MOD_ACTION_BY_ID_SQL, mod_action_id=mod_action_id)
+        if not result_rows:
+            return None
+
+        return ModActionModel(result_rows[0])
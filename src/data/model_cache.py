@@ -0,0 +1,164 @@
+from collections import OrderedDict
+import threading
+import time
+from typing import Any, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import config_loader
+from utils.logger import logger
+
+# One cache per table, created when first used. See get_cache.
+_caches: dict[str, "ModelCache"] = {}
+_caches_lock = threading.Lock()
+
+# Models written or read during a transaction are kept in its session's info under this key until it commits,
+# so other threads never get a row from a cache that isn't committed yet or gets rolled back.
+_SESSION_INFO_KEY = "model_cache_writes"
+
+
+class ModelCache:
+    """
+    Bounded read-through cache of models by primary key, least recently used entries are evicted once full and
+    entries expire after ttl seconds so changes made by other processes are picked up eventually.
+
+    Models are copied going in and out so changes made to a model that aren't saved never end up in the cache.
+    Only rows that exist are cached, lookups for missing rows always go to the database.
+    """
+
+    def __init__(self, table: str, max_size: int, ttl: float):
+        self.table = table
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expiry time, model)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, key: Any):
+        """Returns a copy of the cached model, or None if it isn't cached or has expired."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+
+            expiry_time, model = entry
+            if expiry_time <= time.monotonic():
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+
+        return model._clean_copy()
+
+    def put(self, model):
+        key = getattr(model, model.pk_field)
+        model = model._clean_copy()
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, model)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def invalidate(self, key: Any):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def get_cache(model_class) -> Optional[ModelCache]:
+    """Gets the cache for the model's table, None if the model isn't cached or caching is disabled."""
+
+    if not model_class._cached or config_loader.MODEL_CACHE["size"] <= 0:
+        return None
+
+    cache = _caches.get(model_class._table)
+    if cache is not None:
+        return cache
+
+    with _caches_lock:
+        if model_class._table not in _caches:
+            # Start logging stats along with the first cache, there's nothing to log before then.
+            if not _caches and config_loader.MODEL_CACHE["stats_interval"] > 0:
+                threading.Thread(
+                    target=_log_cache_stats,
+                    args=(config_loader.MODEL_CACHE["stats_interval"],),
+                    name="model_cache_stats",
+                    daemon=True,
+                ).start()
+
+            _caches[model_class._table] = ModelCache(
+                model_class._table, config_loader.MODEL_CACHE["size"], config_loader.MODEL_CACHE["ttl"]
+            )
+
+    return _caches[model_class._table]
+
+
+def write_through(session, model):
+    """
+    Caches a model that was just written or read by the given session once its transaction commits, if its table is
+    cached. Until then the cached entry for its key is dropped, so lookups go to the database, where only this
+    transaction sees the uncommitted row.
+    """
+
+    cache = get_cache(model.__class__)
+    if cache is None:
+        return
+
+    key = getattr(model, model.pk_field)
+    cache.invalidate(key)
+    session.info.setdefault(_SESSION_INFO_KEY, {})[(model.table, key)] = model._clean_copy()
+
+
+def invalidate(model):
+    """Removes the model from its table's cache, if it's cached."""
+
+    cache = get_cache(model.__class__)
+    if cache is not None and hasattr(model, model.pk_field):
+        cache.invalidate(getattr(model, model.pk_field))
+
+
+def get_cache_stats() -> dict:
+    """Returns hit/miss counters and current size of every cache, by table."""
+
+    return {table: cache.get_stats() for table, cache in list(_caches.items())}
+
+
+def _log_cache_stats(interval: int):
+    while True:
+        time.sleep(interval)
+        logger.info(f"Model cache stats: {get_cache_stats()}")
+
+
+@event.listens_for(Session, "after_commit")
+def _on_commit(session):
+    for (table, _), model in session.info.pop(_SESSION_INFO_KEY, {}).items():
+        cache = _caches.get(table)
+        if cache is not None:
+            cache.put(model)
+
+
+@event.listens_for(Session, "after_rollback")
+def _on_rollback(session):
+    # Nothing from the transaction was cached yet, and its keys were already dropped when they were written.
+    session.info.pop(_SESSION_INFO_KEY, None)
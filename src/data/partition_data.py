@@ -0,0 +1,34 @@
+import datetime
+
+from sqlalchemy.sql import text
+
+from data.base_data import BaseData
+
+
+class PartitionData(BaseData):
+    def create_monthly_partitions(self, table: str, from_date: datetime.date, to_date: datetime.date) -> list[str]:
+        """
+        Creates the table's monthly partitions between the dates (inclusive) that don't exist yet,
+        returns the names of the new partitions.
+        """
+
+        sql = text("""
+        SELECT create_monthly_partitions(:table, :from_date, :to_date);
+        """)
+
+        result_rows = self.execute(sql, table=table, from_date=from_date, to_date=to_date)
+        return [row[0] for row in result_rows]
+
+    def get_partitions(self, table: str) -> list[str]:
+        """Gets the names of the table's partitions, oldest first."""
+
+        sql = text("""
+        SELECT child.relname FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = :table
+        ORDER BY child.relname;
+        """)
+
+        result_rows = self.execute(sql, table=table)
+        return [row[0] for row in result_rows]
@@ -1,10 +1,23 @@
-from typing import Optional
+from datetime import datetime
+from typing import Iterator, Optional
 
 from sqlalchemy.sql import text
 
+from data.async_base_data import AsyncBaseData
 from data.base_data import BaseModel, BaseData
+from data.query_builder import QueryBuilder
 from utils.reddit import base36decode
 
+# Must match the expression of idx_posts_search for the index to be used. Titles weigh more than bodies when ranking.
+_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', coalesce(body, '')), 'B')"
+)
+_SEARCH_ORDERS = {
+    "rank": f"ORDER BY ts_rank({_SEARCH_VECTOR}, search_query) DESC, created_time DESC",
+    "new": "ORDER BY created_time DESC",
+    "old": "ORDER BY created_time ASC",
+}
+
 
 class PostModel(BaseModel):
     _table = "posts"
@@ -29,6 +42,9 @@ class PostModel(BaseModel):
         "sent_to_feed",
         "discord_message_id",
     ]
+    # Shouldn't change after being posted, and deleted_time should stay as when it was first seen deleted.
+    _protected_fields = ["author", "title", "url", "deleted_time"]
+    _cached = True
 
     @property
     def fullname(self):
@@ -47,54 +63,57 @@ class PostData(BaseData):
         WHERE id = :post_id;
         """)
 
-        result_rows = self.execute(sql, post_id=post_id)
-        if not result_rows:
-            return None
+        return self._get_cached(PostModel, post_id, sql, post_id=post_id)
 
-        return PostModel(result_rows[0])
+    def get_existing_post_ids(self, post_ids: list[int]) -> set[int]:
+        """Returns which of the given post ids are in the database, in a single query."""
 
-    def get_posts_by_username(self, username: str, start_date: str = None, end_date: str = None) -> list[PostModel]:
-        where_clauses = ["lower(author) = :username"]
-        sql_kwargs = {"username": username.lower()}
+        query = QueryBuilder("SELECT id FROM posts")
+        query.where_in("id", "post_ids", post_ids)
 
-        if start_date:
-            where_clauses.append("created_time >= :start_date")
-            sql_kwargs["start_date"] = start_date
+        return {row.id for row in self.execute(query.statement, **query.params)}
 
-        if end_date:
-            where_clauses.append("created_time < :end_date")
-            sql_kwargs["end_date"] = end_date
+    def iter_range(self, start: datetime = None, end: datetime = None, page_size: int = 1000) -> Iterator[PostModel]:
+        """Yields all posts created in [start, end), oldest first, fetching page_size at a time."""
 
-        where_str = " AND ".join(where_clauses)
+        return self._iter_range(PostModel, start, end, page_size)
 
-        sql = text(f"""
-        SELECT * FROM posts
-        WHERE {where_str};
-        """)
-
-        result_rows = self.execute(sql, **sql_kwargs)
+    def get_posts_by_username(self, username: str, start_date: str = None, end_date: str = None) -> list[PostModel]:
+        query = self._build_posts_by_username_query(username, start_date, end_date)
+        result_rows = self.execute(query.statement, **query.params)
         return [PostModel(row) for row in result_rows]
 
-    def get_post_count_by_username(self, username: str, start_date: str = None, end_date: str = None) -> int:
-        where_clauses = ["lower(author) = :username"]
-        sql_kwargs = {"username": username.lower()}
+    def iter_posts_by_username(
+        self, username: str, start_date: str = None, end_date: str = None, batch_size: int = 1000
+    ) -> Iterator[PostModel]:
+        query = self._build_posts_by_username_query(username, start_date, end_date)
+        for row in self.iter_query(query.statement, batch_size, **query.params):
+            yield PostModel(row)
+
+    @staticmethod
+    def _build_posts_by_username_query(username: str, start_date: str = None, end_date: str = None) -> QueryBuilder:
+        query = QueryBuilder("SELECT * FROM posts")
+        query.where("lower(author) = :username", username=username.lower())
 
         if start_date:
-            where_clauses.append("created_time >= :start_date")
-            sql_kwargs["start_date"] = start_date
+            query.where("created_time >= :start_date", start_date=start_date)
 
         if end_date:
-            where_clauses.append("created_time < :end_date")
-            sql_kwargs["end_date"] = end_date
+            query.where("created_time < :end_date", end_date=end_date)
 
-        where_str = " AND ".join(where_clauses)
+        return query
 
-        sql = text(f"""
-        SELECT COUNT(*) FROM posts
-        WHERE {where_str};
-        """)
+    def get_post_count_by_username(self, username: str, start_date: str = None, end_date: str = None) -> int:
+        query = QueryBuilder("SELECT COUNT(*) FROM posts")
+        query.where("lower(author) = :username", username=username.lower())
+
+        if start_date:
+            query.where("created_time >= :start_date", start_date=start_date)
+
+        if end_date:
+            query.where("created_time < :end_date", end_date=end_date)
 
-        return self.execute(sql, **sql_kwargs)[0][0]
+        return self.execute(query.statement, **query.params)[0][0]
 
     def get_flaired_posts_by_username(
         self,
@@ -105,84 +124,102 @@ class PostData(BaseData):
         start_date: str = None,
         end_date: str = None,
     ) -> list[PostModel]:
-        where_clauses = ["lower(author) = :username", "lower(flair_text) IN :flairs"]
-        sql_kwargs = {"username": username.lower(), "flairs": tuple([f.lower() for f in flairs])}
+        query = QueryBuilder("SELECT * FROM posts", "ORDER BY created_time ASC")
+        query.where("lower(author) = :username", username=username.lower())
+        query.where_in("lower(flair_text)", "flairs", [f.lower() for f in flairs])
 
         if exclude_reddit_ids:
-            where_clauses.append("id36 NOT IN :excluded_ids")
-            sql_kwargs["excluded_ids"] = tuple(exclude_reddit_ids)
+            query.where_not_in("id36", "excluded_ids", exclude_reddit_ids)
 
         if not include_removed:
-            where_clauses.append("removed != :removed")
-            sql_kwargs["removed"] = str(not include_removed)
+            query.where("removed != :removed", removed=str(not include_removed))
 
         if start_date:
-            where_clauses.append("created_time >= :start_date")
-            sql_kwargs["start_date"] = start_date
+            query.where("created_time >= :start_date", start_date=start_date)
 
         if end_date:
-            where_clauses.append("created_time < :end_date")
-            sql_kwargs["end_date"] = end_date
+            query.where("created_time < :end_date", end_date=end_date)
 
-        where_str = " AND ".join(where_clauses)
+        result_rows = self.execute(query.statement, **query.params)
+        return [PostModel(row) for row in result_rows]
 
-        sql = text(f"""
-        SELECT * FROM posts
-        WHERE {where_str}
-        ORDER BY created_time ASC;
-        """)
+    def search_posts(
+        self,
+        search_text: str,
+        username: str = None,
+        start_date: str = None,
+        end_date: str = None,
+        min_rank: float = None,
+        order: str = "rank",
+        limit: int = 100,
+    ) -> list[PostModel]:
+        """
+        Full-text search of post titles and bodies, with web search syntax, e.g. "exact phrase" or -excluded.
+        order is one of "rank", "new" or "old".
+        """
+
+        if order not in _SEARCH_ORDERS:
+            raise ValueError(f"Unknown search order {order}, must be one of {', '.join(_SEARCH_ORDERS)}")
 
-        result_rows = self.execute(sql, **sql_kwargs)
+        query = QueryBuilder(
+            "SELECT posts.* FROM posts, websearch_to_tsquery('english', :search_text) AS search_query",
+            f"{_SEARCH_ORDERS[order]} LIMIT :limit",
+        )
+        query.where(f"{_SEARCH_VECTOR} @@ search_query", search_text=search_text, limit=limit)
+
+        if username:
+            query.where("lower(author) = :username", username=username.lower())
+
+        if start_date:
+            query.where("created_time >= :start_date", start_date=start_date)
+
+        if end_date:
+            query.where("created_time < :end_date", end_date=end_date)
+
+        if min_rank is not None:
+            query.where(f"ts_rank({_SEARCH_VECTOR}, search_query) >= :min_rank", min_rank=min_rank)
+
+        result_rows = self.execute(query.statement, **query.params)
         return [PostModel(row) for row in result_rows]
 
     def get_post_count(self, start_date: str = None, end_date: str = None, exclude_authors: list = None) -> int:
-        where_clauses = []
-        sql_kwargs = {}
+        query = QueryBuilder("SELECT COUNT(*) FROM posts")
 
         if start_date:
-            where_clauses.append("created_time >= :start_date")
-            sql_kwargs["start_date"] = start_date
+            query.where("created_time >= :start_date", start_date=start_date)
 
         if end_date:
-            where_clauses.append("created_time < :end_date")
-            sql_kwargs["end_date"] = end_date
+            query.where("created_time < :end_date", end_date=end_date)
 
         if exclude_authors is not None:
-            where_clauses.append("author not in :exclude_authors")
-            sql_kwargs["exclude_authors"] = tuple(exclude_authors)
-
-        where_str = " AND ".join(where_clauses)
-        sql = text(f"""
-        SELECT COUNT(*) FROM posts
-        WHERE {where_str};
-        """)
+            query.where_not_in("author", "exclude_authors", exclude_authors)
 
         # Will return a list of tuples with only one item in each, e.g. [(2910,)]
-        result = self.execute(sql, **sql_kwargs)
+        result = self.execute(query.statement, **query.params)
         return result[0][0]
 
     def get_post_author_count(self, start_date: str = None, end_date: str = None, exclude_authors: list = None) -> int:
-        where_clauses = []
-        sql_kwargs = {}
+        query = QueryBuilder("SELECT COUNT(DISTINCT author) FROM posts")
 
         if start_date:
-            where_clauses.append("created_time >= :start_date")
-            sql_kwargs["start_date"] = start_date
+            query.where("created_time >= :start_date", start_date=start_date)
 
         if end_date:
-            where_clauses.append("created_time < :end_date")
-            sql_kwargs["end_date"] = end_date
+            query.where("created_time < :end_date", end_date=end_date)
 
         if exclude_authors is not None:
-            where_clauses.append("author not in :exclude_authors")
-            sql_kwargs["exclude_authors"] = tuple(exclude_authors)
-
-        where_str = " AND ".join(where_clauses)
-        sql = text(f"""
-        SELECT COUNT(DISTINCT author) FROM posts
-        WHERE {where_str};
-        """)
+            query.where_not_in("author", "exclude_authors", exclude_authors)
 
         # Will return a list of tuples with only one item in each, e.g. [(2910,)]
-        result = self.execute(sql, **sql_kwargs)
+        result = self.execute(query.statement, **query.params)
         return result[0][0]
+
+
+class AsyncPostData(AsyncBaseData):
+    async def get_post_by_id(self, post_id: int) -> Optional[PostModel]:
+        sql = text("""
+        SELECT * FROM posts
+        WHERE id = :post_id;
+        """)
+
+        return await self._get_cached(PostModel, post_id, sql, post_id=post_id)
@@ -0,0 +1,58 @@
+from typing import Iterable
+
+from sqlalchemy.sql import text
+from sqlalchemy.sql.elements import TextClause
+
+# Statements already built, by their select, where clauses and suffix. Only a handful of combinations are
+# possible for each query so this stays small.
+_statement_cache: dict[tuple, TextClause] = {}
+
+
+class QueryBuilder:
+    """
+    Builds a statement from a base SELECT and optional WHERE clauses, reusing the same text() statement every time
+    the same combination of clauses is used so it's only parsed once and SQLAlchemy's compiled cache can be used.
+
+    Clauses must be constant strings, anything that varies between calls needs to be sent as a parameter.
+    Lists are sent as a single array parameter with ANY/ALL so the statement doesn't change with the list's length.
+    """
+
+    def __init__(self, select_sql: str, suffix_sql: str = ""):
+        self.select_sql = select_sql
+        self.suffix_sql = suffix_sql
+        self.where_clauses = []
+        self.params = {}
+
+    def where(self, clause: str, **params) -> "QueryBuilder":
+        self.where_clauses.append(clause)
+        self.params.update(params)
+        return self
+
+    def where_in(self, expression: str, param: str, values: Iterable) -> "QueryBuilder":
+        """Adds "expression IN values" as a single array parameter."""
+
+        return self.where(f"{expression} = ANY(:{param})", **{param: list(values)})
+
+    def where_not_in(self, expression: str, param: str, values: Iterable) -> "QueryBuilder":
+        """Adds "expression NOT IN values" as a single array parameter."""
+
+        return self.where(f"{expression} <> ALL(:{param})", **{param: list(values)})
+
+    def suffix(self, suffix_sql: str, **params) -> "QueryBuilder":
+        """Sets what comes after the WHERE clauses, e.g. ORDER BY or LIMIT."""
+
+        self.suffix_sql = suffix_sql
+        self.params.update(params)
+        return self
+
+    @property
+    def statement(self) -> TextClause:
+        cache_key = (self.select_sql, tuple(self.where_clauses), self.suffix_sql)
+        statement = _statement_cache.get(cache_key)
+
+        if statement is None:
+            where_str = f"WHERE {' AND '.join(self.where_clauses)}" if self.where_clauses else ""
+            statement = text(f"{self.select_sql}\n{where_str}\n{self.suffix_sql};")
+            _statement_cache[cache_key] = statement
+
+        return statement
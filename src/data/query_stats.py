@@ -0,0 +1,192 @@
+"""
+Timing of every statement sent to the database, aggregated by statement, with a log of slow ones.
+Registered on the engine in data.session so everything going through BaseData is included.
+"""
+
+import re
+import sys
+import threading
+import time
+
+from sqlalchemy import event
+
+import config_loader
+from utils.logger import logger
+
+# Aggregates by normalized statement, see _record.
+_statement_stats: dict[str, dict] = {}
+_stats_lock = threading.Lock()
+
+# Normalized form of each statement seen, most statements are the same text every time so this stays small.
+_normalized_statements: dict[str, str] = {}
+_MAX_NORMALIZED_STATEMENTS = 5000
+
+# Modules that run the query on someone else's behalf, skipped when looking for who made it.
+_INTERNAL_MODULES = ("sqlalchemy.", "data.", "contextlib")
+
+_whitespace_pattern = re.compile(r"\s+")
+# Numbered bind names from multi-row statements, e.g. %(author_12)s.
+_numbered_param_pattern = re.compile(r"%\((\w+?)_\d+\)s")
+# Repeated VALUES rows from multi-row inserts, once the numbers are gone they're identical.
+_repeated_row_pattern = re.compile(r"(\([^()]*\))(?:, \1)+")
+_bind_name_pattern = re.compile(r"%\((\w+)\)s")
+
+# Held while a slow query's plan is being fetched, see _start_explain.
+_explain_lock = threading.Lock()
+
+
+def register(engine):
+    """Starts recording every statement executed through the engine, if enabled."""
+
+    if not config_loader.QUERY_STATS["enabled"]:
+        return
+
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+    if config_loader.QUERY_STATS["stats_interval"] > 0:
+        threading.Thread(
+            target=_log_stats_periodically,
+            args=(config_loader.QUERY_STATS["stats_interval"],),
+            name="query_stats",
+            daemon=True,
+        ).start()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start_time = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - context._query_start_time
+    caller = _get_caller()
+    normalized_statement = _normalize(statement)
+    _record(normalized_statement, duration, cursor.rowcount, caller)
+
+    slow_ms = config_loader.QUERY_STATS["slow_ms"]
+    if slow_ms and duration * 1000 >= slow_ms:
+        # Only bind names are logged, values could be anything from usernames to comment bodies.
+        logger.warning(
+            f"Slow query ({duration * 1000:.1f} ms, {cursor.rowcount} rows) from {caller},"
+            f" params {sorted(set(_bind_name_pattern.findall(statement)))}: {normalized_statement}"
+        )
+        if config_loader.QUERY_STATS["explain_slow"] and not executemany:
+            _start_explain(conn.engine, statement, parameters)
+
+
+def _normalize(statement: str) -> str:
+    normalized_statement = _normalized_statements.get(statement)
+    if normalized_statement is None:
+        normalized_statement = _whitespace_pattern.sub(" ", statement).strip()
+        normalized_statement = _numbered_param_pattern.sub(r"%(\1_N)s", normalized_statement)
+        normalized_statement = _repeated_row_pattern.sub(r"\1, ...", normalized_statement)
+
+        if len(_normalized_statements) >= _MAX_NORMALIZED_STATEMENTS:
+            _normalized_statements.clear()
+        _normalized_statements[statement] = normalized_statement
+
+    return normalized_statement
+
+
+def _get_caller() -> str:
+    """First function up the stack outside of SQLAlchemy and the data layer, as module.function:line."""
+
+    frame = sys._getframe(2)
+    while frame is not None:
+        module_name = frame.f_globals.get("__name__", "")
+        if not module_name.startswith(_INTERNAL_MODULES):
+            return f"{module_name}.{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+
+    return "unknown"
+
+
+def _record(normalized_statement: str, duration: float, row_count: int, caller: str):
+    with _stats_lock:
+        stats = _statement_stats.get(normalized_statement)
+        if stats is None:
+            stats = {"calls": 0, "total_seconds": 0.0, "max_seconds": 0.0, "rows": 0, "callers": {}}
+            _statement_stats[normalized_statement] = stats
+
+        stats["calls"] += 1
+        stats["total_seconds"] += duration
+        stats["max_seconds"] = max(stats["max_seconds"], duration)
+        # -1 when the driver doesn't know yet, e.g. streamed results.
+        stats["rows"] += max(row_count, 0)
+        stats["callers"][caller] = stats["callers"].get(caller, 0) + 1
+
+
+def _start_explain(engine, statement: str, parameters):
+    # EXPLAIN ANALYZE runs the statement again, never do that for anything that writes.
+    if not statement.lstrip().upper().startswith("SELECT"):
+        return
+
+    # One at a time, any more slow queries while a plan is being fetched are only logged.
+    if not _explain_lock.acquire(blocking=False):
+        return
+
+    threading.Thread(
+        target=_log_explain, args=(engine, statement, parameters), name="query_stats_explain", daemon=True
+    ).start()
+
+
+def _log_explain(engine, statement: str, parameters):
+    """
+    Runs EXPLAIN ANALYZE on a pooled connection of its own, from a thread of its own, so the caller doesn't wait for
+    the statement to run a second time and an error (e.g. a statement timeout) can't abort the caller's transaction.
+    Rows the caller hasn't committed yet aren't visible to it, which rarely changes the plan.
+    """
+
+    try:
+        # Never committed, closing the connection rolls back the transaction EXPLAIN ran in.
+        with engine.connect() as connection:
+            result = connection.exec_driver_sql(f"EXPLAIN (ANALYZE, BUFFERS) {statement}", parameters)
+            plan = "\n".join(row[0] for row in result.fetchall())
+        logger.warning(f"Plan for slow query:\n{plan}")
+    except Exception:
+        logger.exception("Failed to get the plan for a slow query")
+    finally:
+        _explain_lock.release()
+
+
+def get_top_statements(top_n: int = 20) -> list[tuple[str, dict]]:
+    """Returns the top_n statements by total time along with their aggregates, slowest first."""
+
+    with _stats_lock:
+        statements = [
+            (statement, dict(stats, callers=dict(stats["callers"]))) for statement, stats in _statement_stats.items()
+        ]
+
+    statements.sort(key=lambda item: item[1]["total_seconds"], reverse=True)
+    return statements[:top_n]
+
+
+def format_top_statements(top_n: int = 20) -> str:
+    lines = [f"Top {top_n} statements by total time:"]
+    for statement, stats in get_top_statements(top_n):
+        top_caller = max(stats["callers"], key=stats["callers"].get)
+        lines.append(
+            f"{stats['total_seconds']:9.3f} s total, {stats['calls']:7} calls,"
+            f" {stats['total_seconds'] / stats['calls'] * 1000:8.2f} ms avg, {stats['max_seconds'] * 1000:8.2f} ms max,"
+            f" {stats['rows'] / stats['calls']:8.1f} rows avg, mostly from {top_caller}: {statement[:300]}"
+        )
+    return "\n".join(lines)
+
+
+def log_top_statements(top_n: int = None):
+    logger.info(format_top_statements(top_n or config_loader.QUERY_STATS["top_n"]))
+
+
+def dump_on_signal(signum, frame):
+    """
+    Signal handler to log the top statements, e.g. signal.signal(signal.SIGUSR1, query_stats.dump_on_signal).
+    Logged from another thread since the signal could arrive while this thread holds the stats lock.
+    """
+
+    threading.Thread(target=log_top_statements, name="query_stats_dump").start()
+
+
+def _log_stats_periodically(interval: int):
+    while True:
+        time.sleep(interval)
+        log_top_statements()
@@ -0,0 +1,173 @@
+from datetime import date, datetime, time, timezone
+from typing import Optional
+
+from sqlalchemy.sql import text
+
+from data.base_data import BaseData
+from data.query_builder import QueryBuilder
+
+# Kinds of activity in activity_daily and the table each is rolled up from.
+_ACTIVITY_TABLES = {"post": "posts", "comment": "comments"}
+
+
+class RollupData(BaseData):
+    def get_last_days(self) -> tuple[Optional[date], Optional[date]]:
+        """Gets the most recent day in mod_action_daily and activity_daily, None for either if it's empty."""
+
+        sql = text("""
+        SELECT (SELECT max(day) FROM mod_action_daily), (SELECT max(day) FROM activity_daily);
+        """)
+
+        result_rows = self.execute(sql)
+        return result_rows[0][0], result_rows[0][1]
+
+    def update_mod_action_daily(
+        self,
+        start_day: Optional[date],
+        admins: list[str],
+        bots: list[str],
+        user_actions: list[str],
+        post_actions: list[str],
+        comment_actions: list[str],
+    ) -> int:
+        """
+        Recalculates mod_action_daily for every day since start_day (UTC, inclusive), or all days if None.
+        Mods are categorized as admin, bot or human, and the target of each action by the list it's in.
+        Returns the number of rows written, call within a unit of work so the days are replaced atomically.
+        """
+
+        delete_query = QueryBuilder("DELETE FROM mod_action_daily")
+        insert_query = QueryBuilder(
+            """
+            INSERT INTO mod_action_daily (day, action, mod_category, details, description, action_count, targets)
+            SELECT (created_time AT TIME ZONE 'UTC')::date,
+                   action,
+                   CASE WHEN mod = ANY(:admins) THEN 'admin' WHEN mod = ANY(:bots) THEN 'bot' ELSE 'human' END,
+                   COALESCE(details, ''),
+                   COALESCE(description, ''),
+                   count(*),
+                   COALESCE(array_agg(DISTINCT target) FILTER (WHERE target IS NOT NULL), '{}')
+            FROM mod_actions, LATERAL (
+                SELECT CASE
+                    WHEN action = ANY(:user_actions) THEN target_user
+                    WHEN action = ANY(:post_actions) THEN target_post_id::text
+                    WHEN action = ANY(:comment_actions) THEN target_comment_id::text
+                END AS target
+            ) AS mod_action_target
+            """,
+            "GROUP BY 1, 2, 3, 4, 5",
+        )
+
+        if start_day is not None:
+            delete_query.where("day >= :start_day", start_day=start_day)
+            insert_query.where(
+                "created_time >= :start_time", start_time=datetime.combine(start_day, time(), tzinfo=timezone.utc)
+            )
+
+        self.execute_write(delete_query.statement, **delete_query.params)
+        return self.execute_write(
+            insert_query.statement,
+            admins=admins,
+            bots=bots,
+            user_actions=user_actions,
+            post_actions=post_actions,
+            comment_actions=comment_actions,
+            **insert_query.params,
+        )
+
+    def update_activity_daily(self, start_day: Optional[date], bots: list[str]) -> int:
+        """
+        Recalculates activity_daily for every day since start_day (UTC, inclusive), or all days if None.
+        Authors are categorized as bot, human, or deleted if there's no author.
+        Returns the number of rows written, call within a unit of work so the days are replaced atomically.
+        """
+
+        delete_query = QueryBuilder("DELETE FROM activity_daily")
+        if start_day is not None:
+            delete_query.where("day >= :start_day", start_day=start_day)
+        self.execute_write(delete_query.statement, **delete_query.params)
+
+        row_count = 0
+        for kind, table in _ACTIVITY_TABLES.items():
+            insert_query = QueryBuilder(
+                f"""
+                INSERT INTO activity_daily (day, kind, author_category, item_count, authors)
+                SELECT (created_time AT TIME ZONE 'UTC')::date,
+                       CAST(:kind AS text),
+                       CASE WHEN author IS NULL THEN 'deleted' WHEN author = ANY(:bots) THEN 'bot' ELSE 'human' END,
+                       count(*),
+                       COALESCE(array_agg(DISTINCT author) FILTER (WHERE author IS NOT NULL), '{{}}')
+                FROM {table}
+                """,
+                "GROUP BY 1, 2, 3",
+            )
+            if start_day is not None:
+                insert_query.where(
+                    "created_time >= :start_time", start_time=datetime.combine(start_day, time(), tzinfo=timezone.utc)
+                )
+
+            row_count += self.execute_write(insert_query.statement, kind=kind, bots=bots, **insert_query.params)
+
+        return row_count
+
+    def count_mod_actions(
+        self,
+        action: str,
+        start_day: date,
+        end_day: date,
+        distinct: bool = True,
+        details: str = "",
+        description: str = "",
+        mod_categories: list[str] = None,
+    ) -> int:
+        """
+        Counts the action in [start_day, end_day), or the distinct targets of it if distinct is set.
+        Optionally only for the given mod categories and details/description.
+        """
+
+        if distinct:
+            query = QueryBuilder("SELECT COUNT(DISTINCT target) FROM mod_action_daily, unnest(targets) AS target")
+        else:
+            query = QueryBuilder("SELECT COALESCE(SUM(action_count), 0) FROM mod_action_daily")
+
+        query.where("action = :action", action=action)
+        query.where("day >= :start_day", start_day=start_day)
+        query.where("day < :end_day", end_day=end_day)
+
+        if details:
+            query.where("details = :details", details=details)
+
+        if description:
+            query.where("description = :description", description=description)
+
+        if mod_categories is not None:
+            query.where_in("mod_category", "mod_categories", mod_categories)
+
+        return self.execute(query.statement, **query.params)[0][0]
+
+    def count_activity(
+        self,
+        kind: str,
+        start_day: date,
+        end_day: date,
+        distinct_authors: bool = False,
+        author_categories: list[str] = None,
+    ) -> int:
+        """
+        Counts posts or comments (kind) in [start_day, end_day), or the distinct authors of them if distinct_authors
+        is set. Optionally only for the given author categories.
+        """
+
+        if distinct_authors:
+            query = QueryBuilder("SELECT COUNT(DISTINCT author) FROM activity_daily, unnest(authors) AS author")
+        else:
+            query = QueryBuilder("SELECT COALESCE(SUM(item_count), 0) FROM activity_daily")
+
+        query.where("kind = :kind", kind=kind)
+        query.where("day >= :start_day", start_day=start_day)
+        query.where("day < :end_day", end_day=end_day)
+
+        if author_categories is not None:
+            query.where_in("author_category", "author_categories", author_categories)
+
+        return self.execute(query.statement, **query.params)[0][0]
@@ -1,28 +1,201 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
 
 import config_loader
+from data import query_stats
+from utils.logger import logger
 
 from contextlib import contextmanager
+from contextvars import ContextVar
+import threading
+import time
+from typing import Callable
 
 Session = None
+_engine = None
+# Fewest connections the pool keeps, raised by require_pool_size for processes with many threads.
+_required_pool_size = 0
+# Held while creating either engine, so threads starting at the same time don't each create their own.
+_engine_lock = threading.Lock()
+# Same for the optional analytics read replica, see read_only.
+AnalyticsSession = None
+_analytics_engine = None
+# Monotonic time until which the analytics database is skipped after failing to connect to it.
+_analytics_retry_time = 0.0
+
+# Whether new sessions should use the analytics database, see read_only.
+_read_only = ContextVar("read_only", default=False)
+
+# Session of the unit of work currently in progress, if any.
+_current_session = ContextVar("current_session", default=None)
+# Key in the unit of work session's info for callbacks to run once it's committed, see on_commit.
+_ON_COMMIT_KEY = "on_commit"
+
+# Connection pool counters for this process, see get_pool_stats.
+_pool_stats = {
+    "checkouts": 0,
+    "connects": 0,
+    "overflows": 0,
+    "invalidations": 0,
+    "wait_seconds_total": 0.0,
+    "wait_seconds_max": 0.0,
+}
+_pool_stats_lock = threading.Lock()
 
 
 def _create_session():
-    _engine = create_engine(config_loader.DB_CONNECTION)
-    global Session
+    with _engine_lock:
+        # Another thread may have created it while this one was waiting.
+        if Session is None:
+            _create_engine()
+
+
+def _create_engine():
+    global _engine, Session
+
+    pool_config = config_loader.DB_POOL
+    connect_args = {"application_name": pool_config["application_name"]}
+    if pool_config["statement_timeout_ms"]:
+        connect_args["options"] = f"-c statement_timeout={pool_config['statement_timeout_ms']}"
+
+    pool_size = max(pool_config["size"], _required_pool_size)
+    if pool_size > pool_config["size"]:
+        logger.info(f"Raising the database pool size from {pool_config['size']} to {pool_size} for this process")
+
+    _engine = create_engine(
+        config_loader.DB_CONNECTION,
+        pool_size=pool_size,
+        max_overflow=pool_config["max_overflow"],
+        pool_timeout=pool_config["timeout"],
+        pool_recycle=pool_config["recycle"],
+        pool_pre_ping=pool_config["pre_ping"],
+        connect_args=connect_args,
+    )
+    _register_pool_events(_engine)
+    query_stats.register(_engine)
     Session = sessionmaker(bind=_engine)
 
+    if pool_config["stats_interval"] > 0:
+        threading.Thread(
+            target=_log_pool_stats, args=(pool_config["stats_interval"],), name="pool_stats", daemon=True
+        ).start()
+
+
+def require_pool_size(size: int):
+    """
+    Makes sure the pool keeps at least size connections, before any overflow, for a process with that many threads
+    which can each hold one at the same time, e.g. feed pipeline workers. Only applies to sessions created afterwards,
+    so call it before the first one.
+    """
+
+    global _required_pool_size
+
+    with _engine_lock:
+        if _engine is not None:
+            logger.warning(f"Database pool already created, can't raise its size to {size}")
+            return
+
+        _required_pool_size = max(_required_pool_size, size)
+
+
+def _create_analytics_session():
+    with _engine_lock:
+        if AnalyticsSession is None:
+            _create_analytics_engine()
+
+
+def _create_analytics_engine():
+    global _analytics_engine, AnalyticsSession
+
+    analytics_config = config_loader.ANALYTICS_DB
+    pool_config = config_loader.DB_POOL
+    connect_args = {"application_name": f"{pool_config['application_name']}-analytics"}
+    if analytics_config["statement_timeout_ms"]:
+        connect_args["options"] = f"-c statement_timeout={analytics_config['statement_timeout_ms']}"
+
+    # Pre-ping always, a replica that's gone away should send queries back to the primary rather than fail them.
+    _analytics_engine = create_engine(
+        analytics_config["connection"],
+        pool_size=analytics_config["pool_size"],
+        max_overflow=0,
+        pool_timeout=pool_config["timeout"],
+        pool_recycle=pool_config["recycle"],
+        pool_pre_ping=True,
+        connect_args=connect_args,
+    )
+    query_stats.register(_analytics_engine)
+    AnalyticsSession = sessionmaker(bind=_analytics_engine)
+
+
+def _register_pool_events(engine):
+    def _increment(key: str):
+        with _pool_stats_lock:
+            _pool_stats[key] += 1
+
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        _increment("connects")
+        # Overflow goes above 0 once more connections are open than the pool size.
+        if engine.pool.overflow() > 0:
+            _increment("overflows")
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        _increment("checkouts")
+
+    # Includes connections found to be stale by pre-ping, e.g. after a database restart.
+    @event.listens_for(engine, "invalidate")
+    def on_invalidate(dbapi_connection, connection_record, exception):
+        _increment("invalidations")
+
+    @event.listens_for(engine, "soft_invalidate")
+    def on_soft_invalidate(dbapi_connection, connection_record, exception):
+        _increment("invalidations")
+
+
+def _record_wait(wait_seconds: float):
+    with _pool_stats_lock:
+        _pool_stats["wait_seconds_total"] += wait_seconds
+        _pool_stats["wait_seconds_max"] = max(_pool_stats["wait_seconds_max"], wait_seconds)
+
+
+def _log_pool_stats(interval: int):
+    while True:
+        time.sleep(interval)
+        logger.info(f"Database pool stats: {get_pool_stats()}")
+
+
+def get_pool_stats() -> dict:
+    """
+    Returns the connection pool counters since startup along with the pool's current state.
+    Wait time is how long it took to get a connection from the pool, including connecting if necessary.
+    """
+
+    with _pool_stats_lock:
+        stats = dict(_pool_stats)
+
+    if _engine is not None:
+        stats["size"] = _engine.pool.size()
+        stats["checked_out"] = _engine.pool.checkedout()
+        stats["overflow"] = max(_engine.pool.overflow(), 0)
+
+    return stats
+
 
 @contextmanager
 def session_scope():
     """
     Provide a transactional scope around a series of operations.
+    Joins the current unit of work instead if there is one, leaving commit/rollback to it.
     """
 
-    if Session is None:
-        _create_session()
-    session = Session()
+    current_session = _current_session.get()
+    if current_session is not None:
+        yield current_session
+        return
+
+    session = _new_session()
     try:
         yield session
         session.commit()
@@ -31,3 +204,118 @@ def session_scope():
         raise
     finally:
         session.close()
+
+
+def _new_session():
+    """Returns a new session with its connection checked out, on the analytics database if inside read_only."""
+
+    if _read_only.get():
+        session = _new_analytics_session()
+        if session is not None:
+            return session
+
+    if Session is None:
+        _create_session()
+    session = Session()
+    try:
+        # Check out the connection up front to measure how long the pool takes to provide it.
+        wait_start = time.monotonic()
+        session.connection()
+        _record_wait(time.monotonic() - wait_start)
+    except Exception:
+        session.close()
+        raise
+
+    return session
+
+
+def _new_analytics_session():
+    """
+    Returns a session on the analytics database with its connection checked out,
+    or None if there isn't one configured or it can't be reached right now.
+    """
+
+    global _analytics_retry_time
+
+    if not config_loader.ANALYTICS_DB["connection"] or time.monotonic() < _analytics_retry_time:
+        return None
+
+    if AnalyticsSession is None:
+        _create_analytics_session()
+    session = AnalyticsSession()
+    try:
+        session.connection()
+    except OperationalError as e:
+        session.close()
+        retry_interval = config_loader.ANALYTICS_DB["retry_interval"]
+        _analytics_retry_time = time.monotonic() + retry_interval
+        logger.warning(f"Analytics database unavailable, using the primary for the next {retry_interval}s: {e}")
+        return None
+
+    return session
+
+
+@contextmanager
+def read_only():
+    """
+    Run the database operations inside it on the analytics read replica if one is configured, otherwise or
+    while it's unreachable they use the primary as usual. Writes inside it will fail on the replica, and results
+    may lag slightly behind the primary. Joins the current unit of work if there is one, since that's already
+    on its own session. Can also be used as a decorator, e.g. @read_only() on a report.
+    """
+
+    token = _read_only.set(True)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+@contextmanager
+def unit_of_work():
+    """
+    Run every database operation inside it as a single transaction, committed once at the end
+    or rolled back entirely on an error. Nested units of work join the outermost one.
+    Can also be used as a decorator, e.g. @unit_of_work() to handle a single feed event.
+    """
+
+    if _current_session.get() is not None:
+        yield _current_session.get()
+        return
+
+    with session_scope() as session:
+        token = _current_session.set(session)
+        try:
+            yield session
+        finally:
+            _current_session.reset(token)
+
+    # Everything's committed by now, so one failing callback (e.g. publishing to RabbitMQ) doesn't stop the rest
+    # (e.g. updating the known ids), its error is raised once they've all run.
+    first_error = None
+    for callback in session.info.pop(_ON_COMMIT_KEY, []):
+        try:
+            callback()
+        except Exception as e:
+            if first_error is None:
+                first_error = e
+            else:
+                logger.exception("Error in on commit callback")
+
+    if first_error is not None:
+        raise first_error
+
+
+def on_commit(callback: Callable[[], None]):
+    """
+    Runs the callback once the current unit of work has been committed, or right away if there isn't one
+    since everything's committed as it's written then. Nothing is run if the unit of work is rolled back.
+    Meant for anything outside the database, e.g. Discord and RabbitMQ messages, which can't be taken back.
+    """
+
+    current_session = _current_session.get()
+    if current_session is None:
+        callback()
+        return
+
+    current_session.info.setdefault(_ON_COMMIT_KEY, []).append(callback)
@@ -1,8 +1,10 @@
-from typing import Optional
+from typing import Iterator, Optional
 
 from sqlalchemy.sql import text
 
+from data.async_base_data import AsyncBaseData
 from data.base_data import BaseModel, BaseData
+from data.query_builder import QueryBuilder
 
 
 class UserModel(BaseModel):
@@ -11,6 +13,7 @@ class UserModel(BaseModel):
     _table = "users"
     _pk_field = "username"  # Case-sensitive, use lower(username) when searching.
     _columns = ["username", "moderator", "flair", "flair_class", "created_time", "suspended", "deleted", "banned_until"]
+    _cached = True
 
 
 class UserData(BaseData):
@@ -20,11 +23,25 @@ class UserData(BaseData):
         WHERE username = :username;
         """)
 
-        result_rows = self.execute(sql, username=username)
-        if not result_rows:
-            return None
+        return self._get_cached(UserModel, username, sql, username=username)
 
-        return UserModel(result_rows[0])
+    def iter_usernames(self, batch_size: int = 10000) -> Iterator[str]:
+        """Yields every username in the database."""
+
+        sql = text("""
+        SELECT username FROM users;
+        """)
+
+        for row in self.iter_query(sql, batch_size):
+            yield row.username
+
+    def get_existing_usernames(self, usernames: list[str]) -> set[str]:
+        """Returns which of the given usernames are in the database, in a single query."""
+
+        query = QueryBuilder("SELECT username FROM users")
+        query.where_in("username", "usernames", usernames)
+
+        return {row.username for row in self.execute(query.statement, **query.params)}
 
     def get_moderators(self) -> list[UserModel]:
         sql = text("""
@@ -39,3 +56,20 @@ class UserData(BaseData):
             user_list.append(UserModel(row))
 
         return user_list
+
+
+class AsyncUserData(AsyncBaseData):
+    async def get_user(self, username: str) -> Optional[UserModel]:
+        sql = text("""
+        SELECT * FROM users
+        WHERE username = :username;
+        """)
+
+        return await self._get_cached(UserModel, username, sql, username=username)
+
+    async def get_usernames(self) -> list[str]:
+        sql = text("""
+        SELECT username FROM users;
+        """)
+
+        return [row.username for row in await self.execute(sql)]
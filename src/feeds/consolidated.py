@@ -6,88 +6,219 @@ Combined new_posts, new_comments, mod_log, and spam feeds.
 """
 
 import argparse
+from functools import partial
+import signal
+import threading
 import time
+from typing import Callable, Optional
+
+from praw import Reddit
+from praw.models import Subreddit
 
 import config_loader
+from data import query_stats, session
 from feeds import mod_log, new_comments, new_posts
-from services import post_service
+from services import checkpoint_service, comment_service, mod_action_service, post_service
 from services.rabbit_service import RabbitService
 from utils import reddit as reddit_utils
+from utils.checkpoint import StreamCheckpoint
 from utils.logger import logger
+from utils.pipeline import Pipeline
+
+# Seconds a stream waits after running out of new items before checking again.
+_PAUSE_SECONDS = 3
+# Restart delays double after each consecutive error, and reset once a stream has run this long without one.
+_MIN_RESTART_DELAY = 30
+_MAX_RESTART_DELAY = 600
 
 
 def monitor_streams(posts: bool = False, comments: bool = False, log: bool = False, spam: bool = False):
     """
-    Monitor the subreddit for new events and parse them when they come in. Will restart upon encountering an error.
+    Monitor the subreddit for new events and parse them when they come in.
+    Each stream runs in its own thread with its own Reddit instance, so a quiet or failing stream doesn't hold up the
+    others. Items are processed by a pool of workers per stream, so a slow item doesn't hold up fetching the next.
+    A stream that encounters an error restarts on its own, backing off if it keeps failing.
+    Send SIGHUP to reload the known comment and mod action ids from the database.
+    Send SIGUSR1 to log the statements that have taken the most database time.
     """
 
-    submission_stream = None
-    comment_stream = None
-    mod_log_stream = None
+    signal.signal(signal.SIGHUP, _rebuild_known_ids)
+    signal.signal(signal.SIGUSR1, query_stats.dump_on_signal)
+
+    streams = {"mod_log": log, "posts": posts, "comments": comments, "spam": spam}
+    stream_functions = {
+        "mod_log": _monitor_mod_log,
+        "posts": _monitor_posts,
+        "comments": _monitor_comments,
+        "spam": _monitor_spam,
+    }
+
+    # Each stream's thread and every one of its pipeline's workers can hold a connection at the same time.
+    stream_count = sum(1 for enabled in streams.values() if enabled)
+    session.require_pool_size(stream_count * (config_loader.FEED_PIPELINE["workers"] + 1))
+
+    # Shared by every stream, publishing is serialized within it.
+    rabbit = _retry_with_backoff("RabbitMQ connection", lambda: RabbitService(config_loader.RABBITMQ))
+
+    threads = []
+    for name, enabled in streams.items():
+        if not enabled:
+            continue
+
+        thread = threading.Thread(
+            target=_retry_with_backoff,
+            args=(f"{name} stream", partial(_run_stream, stream_functions[name], rabbit)),
+            name=name,
+            daemon=True,
+        )
+        thread.start()
+        threads.append(thread)
+
+    # Signal handlers only run on the main thread, so it waits here rather than running a stream itself.
+    while any(thread.is_alive() for thread in threads):
+        time.sleep(1)
 
+
+def _retry_with_backoff(name: str, function: Callable):
+    """Calls function until it returns, waiting longer after each consecutive error."""
+
+    delay_time = _MIN_RESTART_DELAY
     while True:
+        start_time = time.monotonic()
         try:
-            logger.info("Connecting to Reddit...")
-            reddit = reddit_utils.get_reddit_instance(config_loader.REDDIT["auth"])
-            subreddit = reddit.subreddit(config_loader.REDDIT["subreddit"])
-            rabbit = RabbitService(config_loader.RABBITMQ)
-            mod_log.get_moderators()
-            logger.debug("Loading flairs...")
-            post_service.load_post_flairs(subreddit)
-            if posts:
-                logger.info("Initializing submission stream...")
-                submission_stream = subreddit.stream.submissions(skip_existing=False, pause_after=-1)
-            if comments:
-                logger.info("Initializing comment stream...")
-                comment_stream = subreddit.stream.comments(skip_existing=False, pause_after=-1)
-            if log:
-                logger.info("Initializing mod log stream...")
-                mod_log_stream = subreddit.mod.stream.log(skip_existing=False, pause_after=-1)
-
-            while True:
-                if log:
-                    logger.debug("Starting mod log stream...")
-                    for mod_action in mod_log_stream:
-                        if mod_action is None:
-                            time.sleep(3)
-                            break
-                        mod_log.parse_mod_action(mod_action, reddit, subreddit, rabbit)
-
-                if posts:
-                    logger.debug("Starting post stream...")
-                    for submission in submission_stream:
-                        if submission is None:
-                            time.sleep(3)
-                            break
-                        new_posts.process_post(submission, rabbit)
-
-                if comments:
-                    logger.debug("Starting comment stream...")
-                    for comment in comment_stream:
-                        if comment is None:
-                            time.sleep(3)
-                            break
-                        new_comments.process_comment(comment, reddit, rabbit)
-
-                if spam:
-                    logger.debug("Starting spam stream...")
-                    for item in subreddit.mod.spam():
-                        if item is None:
-                            time.sleep(3)
-                            break
-                        if item.fullname.startswith("t1_"):
-                            new_comments.process_comment(item, reddit, rabbit)
-                        elif item.fullname.startswith("t3_"):
-                            new_posts.process_post(item, rabbit)
-
+            return function()
         except Exception:
-            delay_time = 30
-            logger.exception(f"Encountered an unexpected error, restarting in {delay_time} seconds...")
+            if time.monotonic() - start_time > _MAX_RESTART_DELAY:
+                delay_time = _MIN_RESTART_DELAY
+
+            logger.exception(f"{name} encountered an unexpected error, restarting in {delay_time} seconds...")
             time.sleep(delay_time)
+            delay_time = min(delay_time * 2, _MAX_RESTART_DELAY)
+
+
+def _run_stream(stream_function: Callable[[Reddit, Subreddit, RabbitService], None], rabbit: RabbitService):
+    # PRAW isn't thread-safe, so each stream gets its own instance, shared with its pipeline's workers one request at a
+    # time. Rate limits are still shared through the account.
+    logger.info("Connecting to Reddit...")
+    reddit = reddit_utils.serialize_requests(reddit_utils.get_reddit_instance(config_loader.REDDIT["auth"]))
+    subreddit = reddit.subreddit(config_loader.REDDIT["subreddit"])
+    stream_function(reddit, subreddit, rabbit)
+
+
+def _create_pipeline(
+    name: str, process: Callable, get_key: Callable, checkpoint: Optional[StreamCheckpoint] = None
+) -> Pipeline:
+    pipeline_config = config_loader.FEED_PIPELINE
+    return Pipeline(
+        name,
+        process,
+        get_key,
+        pipeline_config["workers"],
+        pipeline_config["queue_size"],
+        pipeline_config["stats_interval"],
+        checkpoint,
+    )
+
+
+def _add_stream_items(pipeline: Pipeline, stream):
+    """
+    Adds the items of a stream created with pause_after=-1 to the pipeline. The stream yields None at the end of every
+    page and requests the next one as soon as it's asked to, so it only waits here after a page without new items.
+    """
+
+    page_has_items = False
+    for item in stream:
+        if item is not None:
+            page_has_items = True
+            pipeline.add(item)
+            continue
+
+        if not page_has_items:
+            time.sleep(_PAUSE_SECONDS)
+        page_has_items = False
+
+
+def _monitor_mod_log(reddit: Reddit, subreddit: Subreddit, rabbit: RabbitService):
+    mod_log.get_moderators()
+    checkpoint = checkpoint_service.get_stream_checkpoint("mod_log")
+    mod_log.catch_up(reddit, subreddit, rabbit, checkpoint)
+    logger.info("Initializing mod log stream...")
+    # Actions on the same post are kept in order, since they update the same Discord message.
+    with _create_pipeline(
+        "mod_log",
+        lambda mod_action: mod_log.parse_mod_action(mod_action, reddit, subreddit, rabbit),
+        lambda mod_action: reddit_utils.get_post_id36(mod_action) or mod_action.target_fullname,
+        checkpoint,
+    ) as pipeline:
+        _add_stream_items(pipeline, subreddit.mod.stream.log(skip_existing=False, pause_after=-1))
+
+
+def _monitor_posts(reddit: Reddit, subreddit: Subreddit, rabbit: RabbitService):
+    logger.debug("Loading flairs...")
+    post_service.load_post_flairs(subreddit)
+    checkpoint = checkpoint_service.get_stream_checkpoint("posts")
+    new_posts.catch_up(subreddit, rabbit, checkpoint)
+    logger.info("Initializing submission stream...")
+    with _create_pipeline(
+        "post",
+        lambda submission: new_posts.process_post(submission, rabbit),
+        lambda submission: submission.id,
+        checkpoint,
+    ) as pipeline:
+        _add_stream_items(pipeline, subreddit.stream.submissions(skip_existing=False, pause_after=-1))
+
+
+def _monitor_comments(reddit: Reddit, subreddit: Subreddit, rabbit: RabbitService):
+    if config_loader.COMMENT_BATCH["size"] > 1:
+        new_comments.process_stream_in_batches(subreddit, reddit, rabbit)
+        return
+
+    checkpoint = checkpoint_service.get_stream_checkpoint("comments")
+    new_comments.catch_up(subreddit, reddit, rabbit, checkpoint)
+    logger.info("Initializing comment stream...")
+    # Comments in the same post go to the same worker, so parents are always processed before their replies.
+    with _create_pipeline(
+        "comment",
+        lambda comment: new_comments.process_comment(comment, reddit, rabbit),
+        lambda comment: comment.link_id,
+        checkpoint,
+    ) as pipeline:
+        _add_stream_items(pipeline, subreddit.stream.comments(skip_existing=False, pause_after=-1))
+
+
+def _monitor_spam(reddit: Reddit, subreddit: Subreddit, rabbit: RabbitService):
+    logger.debug("Loading flairs...")
+    post_service.load_post_flairs(subreddit)
+    # A stream only yields items it hasn't seen yet, rather than listing the whole spam feed every time. There's no
+    # checkpoint, items come in the order they were marked as spam rather than the order they were created.
+    logger.info("Initializing spam stream...")
+    with _create_pipeline(
+        "spam",
+        lambda item: _process_spam_item(item, reddit, rabbit),
+        _get_spam_item_key,
+    ) as pipeline:
+        _add_stream_items(pipeline, subreddit.mod.stream.spam(skip_existing=False, pause_after=-1))
+
+
+def _get_spam_item_key(item) -> str:
+    # Checked by prefix, looking up a missing attribute would make PRAW fetch the item.
+    return item.link_id if item.fullname.startswith("t1_") else item.fullname
+
+
+def _process_spam_item(item, reddit: Reddit, rabbit: RabbitService):
+    if item.fullname.startswith("t1_"):
+        new_comments.process_comment(item, reddit, rabbit)
+    elif item.fullname.startswith("t3_"):
+        new_posts.process_post(item, rabbit)
+
+
+def _rebuild_known_ids(signum, frame):
+    comment_service.rebuild_known_comment_ids()
+    mod_action_service.rebuild_known_mod_action_ids()
 
 
 def _get_parser() -> argparse.ArgumentParser:
-    new_parser = argparse.ArgumentParser(description="Monitor one or more feeds in turn.")
+    new_parser = argparse.ArgumentParser(description="Monitor one or more feeds at once.")
     new_parser.add_argument("-p", "--posts", action="store_true", default=False, help="Monitor new post feed")
     new_parser.add_argument("-c", "--comments", action="store_true", default=False, help="Monitor new comment feed")
     new_parser.add_argument("-m", "--mod_log", action="store_true", default=False, help="Monitor mod log feed")
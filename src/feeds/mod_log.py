@@ -5,6 +5,8 @@ Will send a notification to Discord if the action was taken by someone not previ
 
 import argparse
 from datetime import datetime, timedelta, timezone
+from functools import partial
+import signal
 import time
 from typing import Optional
 
@@ -12,68 +14,141 @@ from praw.models.mod_action import ModAction
 
 import config_loader
 from constants import mod_constants
+from data import query_stats
 from data.mod_action_data import ModActionModel
-from services import base_data_service, comment_service, mod_action_service, post_service, user_service
+from data.post_data import PostModel
+from data.session import on_commit, unit_of_work
+from services import (
+    base_data_service,
+    checkpoint_service,
+    comment_service,
+    mod_action_service,
+    post_service,
+    user_service,
+)
 from services.rabbit_service import RabbitService
-from utils import discord, reddit as reddit_utils
+from utils import catch_up as catch_up_utils, discord, reddit as reddit_utils
+from utils.checkpoint import StreamCheckpoint
 from utils.logger import logger
 
 # Cache a list of moderator usernames so we can tell if an action is taken by admins.
 active_mods = []
 
 
-def parse_mod_action(mod_action: ModAction, reddit, subreddit, rabbit: RabbitService):
+def parse_mod_action(
+    mod_action: ModAction, reddit, subreddit, rabbit: RabbitService, deferred_notifications: Optional[list] = None
+):
     """
     Process a single PRAW ModAction. Assumes that reddit and subreddit are already instantiated by
     one of the two entry points (monitor_stream or load_archive).
+    Everything needed from Reddit is fetched first, then the database is updated in a single transaction, and
+    Discord and RabbitMQ messages are only sent once that's committed.
+    If deferred_notifications is given, the saved action is added to it instead of sending a Discord notification.
     """
 
-    def _format_action_embed_field(mod_action_model: ModActionModel = None) -> Optional[dict]:
-        """By default use the parent mod_action, use provided mod_action_model if provided."""
+    resolved = _resolve_mod_action(mod_action, reddit, subreddit)
+    if resolved is None:
+        return
 
-        if mod_action_model:
-            created_timestamp = int(mod_action_model.created_time.timestamp())
-            mod_name = mod_action_model.mod
-            details = mod_action_model.details
-            action = mod_action_model.action
-        else:
-            created_timestamp = int(mod_action.created_utc)
-            mod_name = mod_action.mod.name
-            details = mod_action.details
-            action = mod_action.action
-
-        field = {"inline": True, "value": f"<t:{created_timestamp}:t>"}
-
-        if mod_name in ("AutoModerator", "reddit"):
-            field["value"] = details
-
-        if action == mod_constants.ModActionEnum.approve_post.value:
-            field["name"] = f"Approved By {mod_name}"
-        elif action == mod_constants.ModActionEnum.remove_post.value:
-            field["name"] = f"Removed By {mod_name}"
-        elif action == mod_constants.ModActionEnum.spam_post.value:
-            field["name"] = f"Spammed By {mod_name}"
-        else:
-            return None
+    with unit_of_work():
+        post = _save_targets(resolved)
+        if post:
+            _queue_post_feed_update(mod_action, post)
 
-        return field
+        logger.debug(f"Saving mod action {resolved.mod_action_id}")
+        mod_action_db = mod_action_service.add_mod_action(mod_action)
+        if mod_action_db is None:
+            # The known ids only cover this process, another one saved it first and has sent everything for it.
+            logger.info(f"Mod action {resolved.mod_action_id} was already saved, skipping notifications")
+            return
 
-    # Check if we've already processed this mod action, do nothing if so.
-    mod_action_id = mod_action.id.replace("ModAction_", "")
-    if mod_action_service.get_mod_action_by_id(mod_action_id):
-        logger.debug(f"Already processed, skipping mod action {mod_action_id}")
+        _queue_notifications(resolved, mod_action_db, rabbit, deferred_notifications)
+
+
+def parse_mod_actions(
+    mod_actions: list[ModAction], reddit, subreddit, rabbit: RabbitService, deferred_notifications: list
+):
+    """
+    Batch version of parse_mod_action. Everything needed from Reddit is fetched for every action first, then they're
+    all saved in a single transaction with the mod actions inserted in one statement. If that fails, each action
+    of the batch is processed on its own instead, so one bad action doesn't hold back the rest.
+    Notifications are always added to deferred_notifications.
+    """
+
+    resolved_actions = [_resolve_mod_action(mod_action, reddit, subreddit) for mod_action in mod_actions]
+    resolved_actions = [resolved for resolved in resolved_actions if resolved is not None]
+    if not resolved_actions:
         return
 
+    try:
+        with unit_of_work():
+            # Only the last action on each post updates its feed message, once the whole batch is saved.
+            posts_by_id = {}
+            for resolved in resolved_actions:
+                post = _save_targets(resolved)
+                if post:
+                    posts_by_id[post.id] = (resolved.mod_action, post)
+
+            logger.debug(f"Saving {len(resolved_actions)} mod actions")
+            new_mod_actions = mod_action_service.add_mod_actions([resolved.mod_action for resolved in resolved_actions])
+
+            for mod_action, post in posts_by_id.values():
+                _queue_post_feed_update(mod_action, post)
+
+            # Ones already saved by another process were handled by it.
+            new_mod_actions_by_id = {str(mod_action_db.id): mod_action_db for mod_action_db in new_mod_actions}
+            for resolved in resolved_actions:
+                mod_action_db = new_mod_actions_by_id.get(resolved.mod_action_id)
+                if mod_action_db:
+                    _queue_notifications(resolved, mod_action_db, rabbit, deferred_notifications)
+    except Exception:
+        # Also raised by a failing on commit callback once everything's committed, the saved actions are skipped then.
+        logger.exception(f"Failed to save a batch of {len(resolved_actions)} mod actions, saving them one at a time")
+        for resolved in resolved_actions:
+            parse_mod_action(resolved.mod_action, reddit, subreddit, rabbit, deferred_notifications)
+
+
+class _ResolvedModAction:
+    """A mod action along with everything needed from the database and Reddit to save it."""
+
+    def __init__(self, mod_action: ModAction):
+        self.mod_action = mod_action
+        self.mod_action_id = mod_action.id.replace("ModAction_", "")
+        self.send_notification = False
+        self.unknown_mod = False
+        self.mod_user = None
+        self.new_mod = False
+        self.target_user = None
+        self.target_redditor = None
+        self.ban = None
+        self.reddit_post = None
+        self.reddit_comment = None
+        self.comment = None
+        self.parent_comments = []
+
+
+def _resolve_mod_action(mod_action: ModAction, reddit, subreddit) -> Optional[_ResolvedModAction]:
+    """
+    Fetches everything needed to save a mod action. Only reads, from the database or Reddit, so no transaction is
+    held open across requests to Reddit. Returns None if the mod action was already processed.
+    """
+
+    # Check if we've already processed this mod action, do nothing if so.
+    resolved = _ResolvedModAction(mod_action)
+    created_time = datetime.fromtimestamp(mod_action.created_utc, tz=timezone.utc)
+    if mod_action_service.get_recent_mod_action_by_id(resolved.mod_action_id, created_time):
+        logger.debug(f"Already processed, skipping mod action {resolved.mod_action_id}")
+        return None
+
     logger.info(
-        f"Processing mod action {mod_action_id}: {mod_action.mod.name} - "
+        f"Processing mod action {resolved.mod_action_id}: {mod_action.mod.name} - "
         f"{mod_action.action} - {mod_action.target_fullname}"
     )
 
     # If there's an action by an unknown moderator or admin, make a note of it and check to see
     # if they should be added to the mod list.
-    send_notification = False
     if mod_action.action in mod_constants.MOD_ACTIONS_ALWAYS_NOTIFY:
-        send_notification = True
+        resolved.send_notification = True
 
     if mod_action.action == "editsettings" and mod_action.details not in (
         "description",
@@ -81,13 +156,13 @@ def parse_mod_action(mod_action: ModAction, reddit, subreddit, rabbit: RabbitSer
         "upload_image",
         "header_title",
     ):
-        send_notification = True
+        resolved.send_notification = True
 
-    if mod_action.mod.name not in active_mods:
-        # Add them to the database if necessary.
-        mod_user = user_service.get_user(mod_action.mod.name)
-        if not mod_user:
-            mod_user = user_service.add_user(mod_action.mod)
+    resolved.unknown_mod = mod_action.mod.name not in active_mods
+    if resolved.unknown_mod:
+        resolved.mod_user = user_service.get_user(mod_action.mod.name)
+        if not resolved.mod_user:
+            reddit_utils.load(mod_action.mod)
 
         # We'd normally send a notification for all actions from non-mods, but temporary mutes expiring
         # always come from reddit and we don't really care about those.
@@ -100,41 +175,91 @@ def parse_mod_action(mod_action: ModAction, reddit, subreddit, rabbit: RabbitSer
                 and mod_action.details == "Crowd Control"
             )
         ):
-            send_notification = True
+            resolved.send_notification = True
 
         # For non-admin cases, check to see if they're a [new] mod of the subreddit and refresh the list if so.
         if mod_action.mod not in ("Anti-Evil Operations", "reddit"):
             logger.info(f"Unknown mod found: {mod_action.mod.name}")
-            if mod_user.username in subreddit.moderator():
-                logger.debug(f"Updating mod status for {mod_user}")
-                mod_user.moderator = True
-                base_data_service.update(mod_user)
-                get_moderators()
+            resolved.new_mod = mod_action.mod.name in subreddit.moderator()
 
     # See if the user targeted by this action exists in the system, add them if not.
     # Bans and similar user-focused actions independent of posts/comments will also have
     # a target_fullname value (t2_...) but won't be necessary to check after this.
     if mod_action.target_author:
-        user = user_service.get_user(mod_action.target_author)
+        resolved.target_user = user_service.get_user(mod_action.target_author)
+        if not resolved.target_user:
+            resolved.target_redditor = reddit.redditor(name=mod_action.target_author)
+            reddit_utils.load(resolved.target_redditor)
+
+        if mod_action.action == "banuser":
+            # Weirdly this returns a ListingGenerator so we have to iterate over it; there should only be one though.
+            # If the user isn't banned, the loop won't execute.
+            for ban_user in subreddit.banned(redditor=mod_action.target_author):
+                resolved.ban = ban_user
+                break
+
+    # See if the post targeted by this action exists in the system, it's added or updated either way.
+    if mod_action.target_fullname and mod_action.target_fullname.startswith("t3_"):
+        resolved.reddit_post = reddit.submission(id=mod_action.target_fullname.split("_")[1])
+        reddit_utils.load(resolved.reddit_post)
+        user_service.load_missing_users([resolved.reddit_post.author])
+
+    # See if the comment targeted by this action *and its post* exist in the system, add either if not.
+    if mod_action.target_fullname and mod_action.target_fullname.startswith("t1_"):
+        comment_id = mod_action.target_fullname.split("_")[1]
+        resolved.comment = comment_service.get_comment_by_id(comment_id)
+        resolved.reddit_comment = reddit.comment(id=comment_id)
+        reddit_utils.load(resolved.reddit_comment)
+
+        if not resolved.comment:
+            # Since all comments will reference a parent if it exists, parent comments are added first.
+            logger.debug(f"Loading parent comments of {comment_id}")
+            resolved.parent_comments = comment_service.get_missing_parents(reddit, [resolved.reddit_comment])
+            comment_service.load_comments(resolved.parent_comments + [resolved.reddit_comment])
+        elif resolved.comment.author is None:
+            user_service.load_missing_users([resolved.reddit_comment.author])
+
+    return resolved
+
+
+def _save_targets(resolved: _ResolvedModAction) -> Optional[PostModel]:
+    """
+    Saves the acting mod and everything targeted by a resolved mod action, within the caller's unit of work.
+    Returns the targeted post, if there is one.
+    """
+
+    mod_action = resolved.mod_action
+    if resolved.unknown_mod:
+        # Add them to the database if necessary.
+        mod_user = resolved.mod_user
+        if not mod_user:
+            mod_user = user_service.add_user(mod_action.mod)
+
+        if resolved.new_mod:
+            logger.debug(f"Updating mod status for {mod_user}")
+            mod_user.moderator = True
+            base_data_service.update(mod_user)
+            on_commit(get_moderators)
+
+    if mod_action.target_author:
+        user = resolved.target_user
         if not user:
             logger.debug(f"Saving user {mod_action.target_author}")
-            user = user_service.add_user(reddit.redditor(name=mod_action.target_author))
+            user = user_service.add_user(resolved.target_redditor)
 
         # For bans and unbans, update the user in the database.
         if mod_action.action == "banuser":
-            # Weirdly this returns a ListingGenerator so we have to iterate over it; there should only be one though.
-            # If the user isn't banned, the loop won't execute.
-            for ban_user in subreddit.banned(redditor=user.username):
+            if resolved.ban is not None:
                 # Permanent if days_left is None
-                if ban_user.days_left is None:
+                if resolved.ban.days_left is None:
                     user.banned_until = "infinity"
-                # days_left will show 0 if they were banned for 1 day a few seconds ago; it seems like it rounds down
-                # based on the time of the ban occurring, so we can safely assume that even if the ban happened
-                # a few seconds before getting to this point, we should add an extra day onto the reported number.
+                # days_left will show 0 if they were banned for 1 day a few seconds ago; it seems like it rounds
+                # down based on the time of the ban occurring, so we can safely assume that even if the ban
+                # happened a few seconds before getting to this point, we should add an extra day onto the
+                # reported number.
                 else:
                     ban_start = datetime.fromtimestamp(mod_action.created_utc, tz=timezone.utc)
-                    user.banned_until = ban_start + timedelta(days=ban_user.days_left + 1)
-                break
+                    user.banned_until = ban_start + timedelta(days=resolved.ban.days_left + 1)
             base_data_service.update(user)
         elif mod_action.action == "unbanuser":
             user.banned_until = None
@@ -143,78 +268,27 @@ def parse_mod_action(mod_action: ModAction, reddit, subreddit, rabbit: RabbitSer
             logger.debug(f"Updating mod status for {user}")
             user.moderator = False
             base_data_service.update(user)
-            get_moderators()
-
-    # See if the post targeted by this action exists in the system, add it if not.
-    if mod_action.target_fullname and mod_action.target_fullname.startswith("t3_"):
-        post_id = mod_action.target_fullname.split("_")[1]
-        post = post_service.get_post_by_id(post_id)
-        reddit_post = reddit.submission(id=post_id)
+            on_commit(get_moderators)
 
+    post = None
+    if resolved.reddit_post:
         # Add or update post as necessary.
-        if not post:
-            logger.debug(f"Saving post {post_id}")
-            post = post_service.add_post(reddit_post)
-        else:
-            post = post_service.update_post(post, reddit_post)
-
-        # Send post to the feed if it hasn't been yet or if it needs an update.
-        if (
-            mod_action.action in mod_constants.MOD_ACTIONS_POST_FEED_UPDATE and post.discord_message_id
-        ) or not post.sent_to_feed:
-            discord_embed = post_service.format_post_embed(post)
-
-            # For cases where this action isn't removing/approving we want to grab the last action that *was*
-            # to appropriately show in the feed.
-            action_list = [
-                mod_constants.ModActionEnum.approve_post.value,
-                mod_constants.ModActionEnum.remove_post.value,
-                mod_constants.ModActionEnum.spam_post.value,
-            ]
-            if mod_action.action in action_list:
-                previous_action = None
-            else:
-                previous_action = mod_action_service.get_most_recent_approve_remove_by_post(post)
-
-            action_field = _format_action_embed_field(previous_action)
-            if action_field:
-                discord_embed["fields"].append(action_field)
-
-            if not post.sent_to_feed:
-                discord_message_id = discord.send_webhook_message(
-                    config_loader.DISCORD["post_webhook_url"], {"embeds": [discord_embed]}, return_message_id=True
-                )
-                if discord_message_id:
-                    post.sent_to_feed = True
-                    post.discord_message_id = discord_message_id
-            else:
-                discord.update_webhook_message(
-                    config_loader.DISCORD["post_webhook_url"], post.discord_message_id, {"embeds": [discord_embed]}
-                )
+        logger.debug(f"Saving post {resolved.reddit_post.id}")
+        post = post_service.add_post(resolved.reddit_post)
 
         # If the user deleted their text post, the mod action still has the post body that we can save in place.
         if post.deleted and post.body == "[deleted]" and post.body != mod_action.target_body:
             post.body = mod_action.target_body
 
-        base_data_service.update(post)
-
-    # See if the comment targeted by this action *and its post* exist in the system, add either if not.
-    if mod_action.target_fullname and mod_action.target_fullname.startswith("t1_"):
-        comment_id = mod_action.target_fullname.split("_")[1]
-        comment = comment_service.get_comment_by_id(comment_id)
-        reddit_comment = reddit.comment(id=comment_id)
+        post = base_data_service.update(post)
 
+    if resolved.reddit_comment:
+        reddit_comment = resolved.reddit_comment
+        comment = resolved.comment
         if not comment:
-            # Post needs to exist before we can add a comment for it, start with that.
-            post = post_service.get_post_by_id(reddit_comment.submission.id)
-
-            if not post:
-                post_service.add_post(reddit_comment.submission)
-
-            # Since all comments will reference a parent if it exists, add all parent comments first.
-            logger.debug(f"Saving parent comments of {comment_id}")
-            comment_service.add_comment_parent_tree(reddit, reddit_comment)
-            logger.debug(f"Saving comment {comment_id}")
+            logger.debug(f"Saving comment {reddit_comment.id} and {len(resolved.parent_comments)} parents")
+            if resolved.parent_comments:
+                comment_service.add_comments(resolved.parent_comments)
             comment = comment_service.add_comment(reddit_comment)
         else:
             # Update our record of the comment if necessary.
@@ -225,12 +299,126 @@ def parse_mod_action(mod_action: ModAction, reddit, subreddit, rabbit: RabbitSer
             comment.body = mod_action.target_body
             base_data_service.update(comment)
 
-    logger.debug(f"Saving mod action {mod_action_id}")
-    mod_action_db = mod_action_service.add_mod_action(mod_action)
-    rabbit.publish_mod_action(mod_action, mod_action_db)
+    return post
+
+
+def _queue_post_feed_update(mod_action: ModAction, post: PostModel):
+    """Sends the post to the feed once committed, if it hasn't been yet or if the action needs it updated."""
+
+    if (
+        not (mod_action.action in mod_constants.MOD_ACTIONS_POST_FEED_UPDATE and post.discord_message_id)
+        and post.sent_to_feed
+    ):
+        return
+
+    discord_embed = post_service.format_post_embed(post)
+
+    # For cases where this action isn't removing/approving we want to grab the last action that *was*
+    # to appropriately show in the feed.
+    action_list = [
+        mod_constants.ModActionEnum.approve_post.value,
+        mod_constants.ModActionEnum.remove_post.value,
+        mod_constants.ModActionEnum.spam_post.value,
+    ]
+    if mod_action.action in action_list:
+        previous_action = None
+    else:
+        previous_action = mod_action_service.get_most_recent_approve_remove_by_post(post)
+
+    action_field = _format_action_embed_field(mod_action, previous_action)
+    if action_field:
+        discord_embed["fields"].append(action_field)
+
+    on_commit(partial(_send_post_to_feed, post, discord_embed))
+
+
+def _format_action_embed_field(mod_action: ModAction, mod_action_model: ModActionModel = None) -> Optional[dict]:
+    """By default use the PRAW mod_action, use provided mod_action_model if provided."""
+
+    if mod_action_model:
+        created_timestamp = int(mod_action_model.created_time.timestamp())
+        mod_name = mod_action_model.mod
+        details = mod_action_model.details
+        action = mod_action_model.action
+    else:
+        created_timestamp = int(mod_action.created_utc)
+        mod_name = mod_action.mod.name
+        details = mod_action.details
+        action = mod_action.action
+
+    field = {"inline": True, "value": f"<t:{created_timestamp}:t>"}
+
+    if mod_name in ("AutoModerator", "reddit"):
+        field["value"] = details
+
+    if action == mod_constants.ModActionEnum.approve_post.value:
+        field["name"] = f"Approved By {mod_name}"
+    elif action == mod_constants.ModActionEnum.remove_post.value:
+        field["name"] = f"Removed By {mod_name}"
+    elif action == mod_constants.ModActionEnum.spam_post.value:
+        field["name"] = f"Spammed By {mod_name}"
+    else:
+        return None
+
+    return field
 
-    if send_notification:
-        send_discord_message(mod_action_db)
+
+def _queue_notifications(
+    resolved: _ResolvedModAction,
+    mod_action_db: ModActionModel,
+    rabbit: RabbitService,
+    deferred_notifications: Optional[list],
+):
+    """Publishes a newly saved mod action and sends its Discord notification if it needs one, once committed."""
+
+    on_commit(partial(rabbit.publish_mod_action, resolved.mod_action, mod_action_db))
+
+    if resolved.send_notification:
+        if deferred_notifications is not None:
+            on_commit(partial(deferred_notifications.append, mod_action_db))
+        else:
+            on_commit(partial(send_discord_message, mod_action_db))
+
+
+def _send_post_to_feed(post: PostModel, discord_embed: dict):
+    """Sends the post to the post feed, or updates its message there if it's been sent already."""
+
+    if post.sent_to_feed:
+        discord.update_webhook_message(
+            config_loader.DISCORD["post_webhook_url"], post.discord_message_id, {"embeds": [discord_embed]}
+        )
+        return
+
+    discord_message_id = discord.send_webhook_message(
+        config_loader.DISCORD["post_webhook_url"], {"embeds": [discord_embed]}, return_message_id=True
+    )
+    if discord_message_id:
+        post.sent_to_feed = True
+        post.discord_message_id = discord_message_id
+        # Saved on its own right away, nothing after sending it can roll this back and get the post sent twice.
+        base_data_service.update(post)
+
+
+def catch_up(reddit, subreddit, rabbit: RabbitService, checkpoint: StreamCheckpoint):
+    """
+    Saves the mod actions taken while the stream was down that it won't get itself, Discord notifications are sent
+    once they're all saved. See utils.catch_up.
+    """
+
+    if not config_loader.CATCH_UP["enabled"]:
+        return
+
+    def _ingest(mod_actions: list[ModAction]) -> list[ModActionModel]:
+        # One transaction per batch, with everything fetched from Reddit before it starts. Post feed updates and
+        # RabbitMQ messages go out once it's committed, only notifications wait.
+        deferred_notifications = []
+        parse_mod_actions(mod_actions, reddit, subreddit, rabbit, deferred_notifications)
+        return deferred_notifications
+
+    gap = catch_up_utils.find_gap("mod_log", subreddit.mod.log(limit=None), checkpoint)
+    catch_up_utils.catch_up(
+        "mod_log", gap, checkpoint, _ingest, config_loader.CATCH_UP["batch_size"], send_discord_message
+    )
 
 
 def send_discord_message(mod_action: ModActionModel):
@@ -276,8 +464,13 @@ def send_discord_message(mod_action: ModActionModel):
 def monitor_stream():
     """
     Monitor the subreddit for new actions and parse them when they come in. Will restart upon encountering an error.
+    Send SIGHUP to reload the known mod action ids from the database, e.g. after mod actions were added by a script.
+    Send SIGUSR1 to log the statements that have taken the most database time.
     """
 
+    signal.signal(signal.SIGHUP, lambda signum, frame: mod_action_service.rebuild_known_mod_action_ids())
+    signal.signal(signal.SIGUSR1, query_stats.dump_on_signal)
+
     while True:
         try:
             logger.info("Connecting to Reddit...")
@@ -287,9 +480,18 @@ def monitor_stream():
             get_moderators()
             logger.info("Loading flairs...")
             post_service.load_post_flairs(subreddit)
+            checkpoint = checkpoint_service.get_stream_checkpoint("mod_log")
+            catch_up(reddit, subreddit, rabbit, checkpoint)
             logger.info("Starting mod log stream...")
-            for mod_action in subreddit.mod.stream.log():
-                parse_mod_action(mod_action, reddit, subreddit, rabbit)
+            try:
+                for mod_action in subreddit.mod.stream.log():
+                    if checkpoint.is_processed(mod_action):
+                        continue
+                    checkpoint.start(mod_action)
+                    parse_mod_action(mod_action, reddit, subreddit, rabbit)
+                    checkpoint.finish(mod_action)
+            finally:
+                checkpoint.flush()
         except Exception:
             delay_time = 30
             logger.exception(f"Encountered an unexpected error, restarting in {delay_time} seconds...")
@@ -373,13 +575,9 @@ def load_archive(archive_args: argparse.Namespace):
 def get_moderators():
     """Initializes the list of currently active moderators."""
 
-    # Clear out the previous list in case something changed.
+    # Replaces the previous list in case something changed, all at once since other streams may be reading it.
     global active_mods
-    active_mods = []
-
-    mod_list = user_service.get_moderators()
-    for mod in mod_list:
-        active_mods.append(mod.username)
+    active_mods = [mod.username for mod in user_service.get_moderators()]
 
 
 def _get_parser() -> argparse.ArgumentParser:
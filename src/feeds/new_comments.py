@@ -2,15 +2,27 @@
 Monitors a subreddit for new comments and saves them to a database.
 """
 
+from datetime import datetime, timezone
+from functools import partial
+import signal
 import time
+from typing import Iterator, Optional
 
 from praw.models.reddit.comment import Comment
 
 import config_loader
-from services import post_service, comment_service
+from data import query_stats
+from data.session import on_commit, unit_of_work
+from services import checkpoint_service, comment_service, user_service
 from services.rabbit_service import RabbitService
-from utils import reddit as reddit_utils
+from utils import catch_up as catch_up_utils, reddit as reddit_utils
+from utils.checkpoint import StreamCheckpoint
 from utils.logger import logger
+from utils.reddit import base36decode
+from utils.pipeline import Pipeline
+
+# Seconds to wait after reaching the newest comment before requesting more, when processing in batches.
+_PAUSE_SECONDS = 3
 
 
 def process_comment(reddit_comment: Comment, reddit, rabbit: RabbitService):
@@ -19,11 +31,15 @@ def process_comment(reddit_comment: Comment, reddit, rabbit: RabbitService):
     and the thread it belongs to.
     """
 
-    comment = comment_service.get_comment_by_id(reddit_comment.id)
+    created_time = datetime.fromtimestamp(reddit_comment.created_utc, tz=timezone.utc)
+    comment = comment_service.get_recent_comment_by_id(reddit_comment.id, created_time)
 
     if comment:
         # Update our record of the comment if necessary.
-        comment_service.update_comment(comment, reddit_comment)
+        if comment.author is None:
+            user_service.load_missing_users([reddit_comment.author])
+        with unit_of_work():
+            comment_service.update_comment(comment, reddit_comment)
         # updated_comment = comment_service.update_comment(comment, reddit_comment)
         # rabbit.publish_comment(reddit_comment, updated_comment, "update")
         return
@@ -31,36 +47,203 @@ def process_comment(reddit_comment: Comment, reddit, rabbit: RabbitService):
     author_name = reddit_comment.author.name if reddit_comment.author is not None else "[deleted]"
     logger.info(f"Processing comment {reddit_comment.id} - /u/{author_name} (post {reddit_comment.submission.id})")
 
-    # Post needs to exist before we can add a comment for it, start with that.
-    post = post_service.get_post_by_id(reddit_comment.submission.id)
+    # Everything missing is fetched from Reddit first, so the transaction isn't held open across requests.
+    logger.debug(f"Loading parent comments of {reddit_comment.id}")
+    parent_comments = comment_service.get_missing_parents(reddit, [reddit_comment])
+    comment_service.load_comments(parent_comments + [reddit_comment])
+
+    with unit_of_work():
+        # Since all comments will reference a parent if it exists, add all parent comments first. The post and
+        # authors are added along with them if necessary.
+        logger.debug(f"Saving comment {reddit_comment.id} and {len(parent_comments)} parents")
+        new_comments = comment_service.add_comments(parent_comments + [reddit_comment])
+        comment = next((comment for comment in new_comments if comment.id36 == reddit_comment.id), None)
+        if comment is None:
+            # The known ids only cover this process, another one saved it first and has published it.
+            logger.info(f"Comment {reddit_comment.id} was already saved, skipping publishing")
+            return
 
-    if not post:
-        post_service.add_post(reddit_comment.submission)
+        on_commit(partial(rabbit.publish_comment, reddit_comment, comment))
 
-    # Since all comments will reference a parent if it exists, add all parent comments first.
-    logger.debug(f"Saving parent comments of {reddit_comment.id}")
-    comment_service.add_comment_parent_tree(reddit, reddit_comment)
-    logger.debug(f"Saving comment {reddit_comment.id}")
-    comment = comment_service.add_comment(reddit_comment)
+    logger.debug(f"Finished processing {reddit_comment.id}")
 
-    rabbit.publish_comment(reddit_comment, comment)
-    logger.debug(f"Finished processing {comment.id36}")
+
+def process_comments(reddit_comments: list[Comment], reddit, rabbit: RabbitService):
+    """
+    Batch version of process_comment. Checks which comments already exist, then adds the missing posts, authors and
+    parent comments of the rest with a query or two each, and inserts the new comments in a single statement.
+    """
+
+    created_times = {
+        reddit_comment.id: datetime.fromtimestamp(reddit_comment.created_utc, tz=timezone.utc)
+        for reddit_comment in reddit_comments
+    }
+    existing_comments = comment_service.get_recent_comments_by_ids(created_times)
+
+    updated_reddit_comments = []
+    new_reddit_comments = []
+    for reddit_comment in reddit_comments:
+        comment = existing_comments.get(base36decode(reddit_comment.id))
+        if comment:
+            updated_reddit_comments.append((comment, reddit_comment))
+        else:
+            new_reddit_comments.append(reddit_comment)
+
+    # Everything missing is fetched from Reddit first, so the transaction isn't held open across requests.
+    parent_comments = comment_service.get_missing_parents(reddit, new_reddit_comments) if new_reddit_comments else []
+    user_service.load_missing_users(
+        [reddit_comment.author for comment, reddit_comment in updated_reddit_comments if comment.author is None]
+    )
+    comment_service.load_comments(parent_comments + new_reddit_comments)
+
+    with unit_of_work():
+        for comment, reddit_comment in updated_reddit_comments:
+            comment_service.update_comment(comment, reddit_comment)
+
+        if not new_reddit_comments:
+            return
+
+        logger.info(f"Processing {len(new_reddit_comments)} comments ({len(existing_comments)} already saved)")
+        # Parents are inserted before their replies in the same statement.
+        new_comments = {
+            comment.id: comment for comment in comment_service.add_comments(parent_comments + new_reddit_comments)
+        }
+
+        for reddit_comment in new_reddit_comments:
+            comment = new_comments.get(base36decode(reddit_comment.id))
+            if comment:
+                on_commit(partial(rabbit.publish_comment, reddit_comment, comment))
+
+    logger.debug(f"Finished processing {len(new_reddit_comments)} comments")
+
+
+def iter_batches(comment_stream, batch_size: int, max_wait_ms: int) -> Iterator[list[Comment]]:
+    """
+    Groups comments from a stream created with pause_after=-1 into batches of up to batch_size. At the end of each
+    page of results, a batch that has been gathering for max_wait_ms (or would have by the time the next page comes)
+    is yielded as it is, so at quiet times comments aren't held back waiting for more.
+    With pause_after=-1 the stream requests the next page as soon as it's asked to, so it only waits here after a page
+    without any new comments, same as the stream does by itself.
+    """
+
+    batch = []
+    batch_start_time = 0.0
+    page_has_comments = False
+    for comment in comment_stream:
+        if comment is not None:
+            page_has_comments = True
+            if not batch:
+                batch_start_time = time.monotonic()
+            batch.append(comment)
+
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+            continue
+
+        pause_seconds = 0 if page_has_comments else _PAUSE_SECONDS
+        page_has_comments = False
+        if batch and time.monotonic() + pause_seconds - batch_start_time >= max_wait_ms / 1000:
+            yield batch
+            batch = []
+        if pause_seconds:
+            time.sleep(pause_seconds)
+
+
+def catch_up(subreddit, reddit, rabbit: RabbitService, checkpoint: StreamCheckpoint):
+    """
+    Saves the comments made while the stream was down that it won't get itself, in batches like
+    process_stream_in_batches. See utils.catch_up.
+    """
+
+    if not config_loader.CATCH_UP["enabled"]:
+        return
+
+    gap = catch_up_utils.find_gap("comments", subreddit.comments(limit=None), checkpoint)
+    catch_up_utils.catch_up(
+        "comments",
+        gap,
+        checkpoint,
+        lambda reddit_comments: process_comments(reddit_comments, reddit, rabbit),
+        config_loader.CATCH_UP["batch_size"],
+    )
+
+
+def process_stream_in_batches(subreddit, reddit, rabbit: RabbitService):
+    """
+    Processes new comments from the stream in batches, see COMMENT_BATCH in the config. A single worker processes
+    them, in order, while the next batch is gathered.
+    """
+
+    batch_size = config_loader.COMMENT_BATCH["size"]
+    checkpoint = checkpoint_service.get_stream_checkpoint("comments")
+    catch_up(subreddit, reddit, rabbit, checkpoint)
+
+    def _process_batch(batch: list[Comment]):
+        process_comments(batch, reddit, rabbit)
+        for reddit_comment in batch:
+            checkpoint.finish(reddit_comment)
+
+    def _skip_processed(comment_stream) -> Iterator[Optional[Comment]]:
+        for comment in comment_stream:
+            if comment is not None:
+                if checkpoint.is_processed(comment):
+                    continue
+                checkpoint.start(comment)
+            yield comment
+
+    logger.info(f"Starting comment stream, processing in batches of up to {batch_size}...")
+    try:
+        with Pipeline(
+            "comment_batch",
+            _process_batch,
+            lambda batch: None,
+            1,
+            max(config_loader.FEED_PIPELINE["queue_size"] // batch_size, 1),
+            config_loader.FEED_PIPELINE["stats_interval"],
+        ) as pipeline:
+            comment_stream = _skip_processed(subreddit.stream.comments(skip_existing=False, pause_after=-1))
+            for batch in iter_batches(comment_stream, batch_size, config_loader.COMMENT_BATCH["max_wait_ms"]):
+                pipeline.add(batch)
+    finally:
+        checkpoint.flush()
 
 
 def monitor_stream():
     """
     Monitor the subreddit for new comments and parse them when they come in. Will restart upon encountering an error.
+    Send SIGHUP to reload the known comment ids from the database, e.g. after comments were added by a script.
+    Send SIGUSR1 to log the statements that have taken the most database time.
     """
 
+    signal.signal(signal.SIGHUP, lambda signum, frame: comment_service.rebuild_known_comment_ids())
+    signal.signal(signal.SIGUSR1, query_stats.dump_on_signal)
+
     while True:
         try:
             logger.info("Connecting to Reddit...")
-            reddit = reddit_utils.get_reddit_instance(config_loader.REDDIT["auth"])
+            reddit = reddit_utils.serialize_requests(reddit_utils.get_reddit_instance(config_loader.REDDIT["auth"]))
             subreddit = reddit.subreddit(config_loader.REDDIT["subreddit"])
             rabbit = RabbitService(config_loader.RABBITMQ)
+            if config_loader.COMMENT_BATCH["size"] > 1:
+                process_stream_in_batches(subreddit, reddit, rabbit)
+                continue
+
+            checkpoint = checkpoint_service.get_stream_checkpoint("comments")
+            catch_up(subreddit, reddit, rabbit, checkpoint)
             logger.info("Starting comment stream...")
-            for comment in subreddit.stream.comments(skip_existing=False):
-                process_comment(comment, reddit, rabbit)
+            # Comments in the same post go to the same worker, so parents are always processed before their replies.
+            with Pipeline(
+                "comment",
+                lambda comment: process_comment(comment, reddit, rabbit),
+                lambda comment: comment.link_id,
+                config_loader.FEED_PIPELINE["workers"],
+                config_loader.FEED_PIPELINE["queue_size"],
+                config_loader.FEED_PIPELINE["stats_interval"],
+                checkpoint,
+            ) as pipeline:
+                for comment in subreddit.stream.comments(skip_existing=False):
+                    pipeline.add(comment)
         except Exception:
             delay_time = 30
             logger.exception(f"Encountered an unexpected error, restarting in {delay_time} seconds...")
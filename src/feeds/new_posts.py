@@ -2,14 +2,20 @@
 Monitors a subreddit, saves every new submission, and relays them to a Discord channel via webhook.
 """
 
+from functools import partial
+import signal
 import time
 
 from praw.models.reddit.submission import Submission
 
 import config_loader
-from services import post_service, base_data_service
+from data import query_stats
+from data.post_data import PostModel
+from data.session import on_commit, unit_of_work
+from services import checkpoint_service, post_service, base_data_service, user_service
 from services.rabbit_service import RabbitService
-from utils import discord, reddit as reddit_utils
+from utils import catch_up as catch_up_utils, discord, reddit as reddit_utils
+from utils.checkpoint import StreamCheckpoint
 from utils.logger import logger
 
 
@@ -27,10 +33,20 @@ def process_post(submission: Submission, rabbit: RabbitService):
     author_name = submission.author.name if submission.author is not None else "[deleted]"
     logger.info(f"Processing post {submission.id} - /u/{author_name} - {submission.link_flair_text}")
 
-    if post:
-        post = post_service.update_post(post, submission)
-    else:
-        post = post_service.add_post(submission)
+    # The author is fetched from Reddit first if necessary, so the transaction isn't held open across requests.
+    user_service.load_missing_users([submission.author])
+
+    with unit_of_work():
+        if post:
+            post = post_service.update_post(post, submission)
+        else:
+            post = post_service.add_post(submission)
+
+        on_commit(partial(_send_post, submission, post, rabbit))
+
+
+def _send_post(submission: Submission, post: PostModel, rabbit: RabbitService):
+    """Sends a saved post to Discord and RabbitMQ, once it's committed."""
 
     discord_embed = post_service.format_post_embed(post)
     # Add extra info if it was removed by the spam filter.
@@ -43,18 +59,51 @@ def process_post(submission: Submission, rabbit: RabbitService):
     if discord_message_id:
         post.sent_to_feed = True
         post.discord_message_id = discord_message_id
+        # Saved on its own right away, nothing after sending it can roll this back and get the post sent twice.
+        post = base_data_service.update(post)
 
-    post = base_data_service.update(post)
     rabbit.publish_post(submission, post)
 
     logger.debug(f"Finished processing {post.id36}")
 
 
+def catch_up(subreddit, rabbit: RabbitService, checkpoint: StreamCheckpoint):
+    """
+    Saves the posts made while the stream was down that it won't get itself, a batch per transaction, then sends
+    them to Discord and RabbitMQ once they're all saved. See utils.catch_up.
+    """
+
+    if not config_loader.CATCH_UP["enabled"]:
+        return
+
+    def _ingest(submissions: list[Submission]) -> list[Submission]:
+        # Authors are fetched from Reddit first, so the transaction isn't held open across requests.
+        user_service.load_missing_users([submission.author for submission in submissions])
+        post_service.load_missing_posts(submissions)
+        with unit_of_work():
+            user_service.add_missing_users([submission.author for submission in submissions])
+            post_service.add_missing_posts(submissions)
+        return submissions
+
+    gap = catch_up_utils.find_gap("posts", subreddit.new(limit=None), checkpoint)
+    catch_up_utils.catch_up(
+        "posts",
+        gap,
+        checkpoint,
+        _ingest,
+        config_loader.CATCH_UP["batch_size"],
+        lambda submission: process_post(submission, rabbit),
+    )
+
+
 def monitor_stream():
     """
     Monitor the subreddit for new posts and parse them when they come in. Will restart upon encountering an error.
+    Send SIGUSR1 to log the statements that have taken the most database time.
     """
 
+    signal.signal(signal.SIGUSR1, query_stats.dump_on_signal)
+
     while True:
         try:
             logger.info("Connecting to Reddit...")
@@ -63,9 +112,18 @@ def monitor_stream():
             rabbit = RabbitService(config_loader.RABBITMQ)
             logger.info("Loading flairs...")
             post_service.load_post_flairs(subreddit)
+            checkpoint = checkpoint_service.get_stream_checkpoint("posts")
+            catch_up(subreddit, rabbit, checkpoint)
             logger.info("Starting submission stream...")
-            for submission in subreddit.stream.submissions(skip_existing=False):
-                process_post(submission, rabbit)
+            try:
+                for submission in subreddit.stream.submissions(skip_existing=False):
+                    if checkpoint.is_processed(submission):
+                        continue
+                    checkpoint.start(submission)
+                    process_post(submission, rabbit)
+                    checkpoint.finish(submission)
+            finally:
+                checkpoint.flush()
         except Exception:
             delay_time = 30
             logger.exception(f"Encountered an unexpected error, restarting in {delay_time} seconds...")
@@ -0,0 +1,105 @@
+"""
+Async versions of the comment_service entry points, on the async data layer.
+Anything that may fetch from Reddit is run in a thread so it doesn't block the event loop.
+"""
+
+import asyncio
+from typing import Optional, Union
+
+from praw import Reddit
+from praw.models.reddit.comment import Comment
+
+from data.comment_data import AsyncCommentData, CommentModel
+from services import async_post_service, async_user_service, comment_service
+from utils.reddit import base36decode
+
+_comment_data = AsyncCommentData()
+
+
+async def get_comment_by_id(comment_id: Union[str, int]) -> Optional[CommentModel]:
+    """
+    Gets a single comment from the database. comment_id is either base 10 (int) or base 36 (str)
+    """
+
+    if isinstance(comment_id, str):
+        comment_id = base36decode(comment_id)
+
+    return await _comment_data.get_comment_by_id(comment_id)
+
+
+async def add_comment(reddit_comment: Comment) -> CommentModel:
+    """
+    Parses some basic information for a comment and adds it to the database, or updates it if it already exists.
+    Creates author and post if necessary.
+    This also assumes its parent comment is already created, call
+    add_comment_parent_tree first if necessary.
+    """
+
+    comment = await asyncio.to_thread(comment_service._create_comment_model, reddit_comment)
+
+    # Insert the author into the database if they don't exist yet.
+    if reddit_comment.author is not None and not await async_user_service.user_exists(reddit_comment.author):
+        await async_user_service.add_user(reddit_comment.author)
+
+    # Insert post into the database if it doesn't exist yet (and we have it available).
+    if isinstance(reddit_comment, Comment) and not await async_post_service.get_post_by_id(
+        reddit_comment.submission.id
+    ):
+        await async_post_service.add_post(reddit_comment.submission)
+
+    protected_fields = ["body"] if comment_service._is_body_removed(reddit_comment) else []
+    new_comment = await _comment_data.upsert(comment, protected_fields=protected_fields)
+    # Same known ids as the sync service, so either sees what the other added.
+    comment_service._known_comment_ids.add(new_comment.id)
+    return new_comment
+
+
+async def update_comment(existing_comment: CommentModel, reddit_comment: Comment) -> CommentModel:
+    """
+    For the provided comment, update fields to the current state and save to the database if necessary.
+    """
+
+    # Insert the author into the database if they don't exist yet.
+    if (
+        existing_comment.author is None
+        and reddit_comment.author is not None
+        and not await async_user_service.user_exists(reddit_comment.author)
+    ):
+        await async_user_service.add_user(reddit_comment.author)
+
+    await asyncio.to_thread(comment_service._apply_comment_changes, existing_comment, reddit_comment)
+    return await _comment_data.update(existing_comment)
+
+
+async def add_comment_parent_tree(reddit: Reddit, reddit_comment: Comment):
+    """
+    Same as comment_service.add_comment_parent_tree, starting with the parent of the specified comment, crawl up the
+    tree and add all of them to the database until reaching one that already exists or the root.
+    """
+
+    # Comments are inserted root first since the parent_id of each needs to already exist.
+    comment_stack = []
+
+    while not reddit_comment.parent_id.startswith("t3_"):
+        parent_id = reddit_comment.parent_id[3:]
+
+        # Once we reach a child where the parent already exists, we can stop adding new comments up the chain.
+        if await get_comment_by_id(parent_id):
+            break
+
+        # Parent now becomes the base comment, creating the model is what loads it from Reddit.
+        reddit_comment = reddit.comment(id=parent_id)
+        comment = await asyncio.to_thread(comment_service._create_comment_model, reddit_comment)
+        comment_stack.append(comment)
+
+        # Insert the author into the database if they don't exist yet.
+        if reddit_comment.author is not None and not await async_user_service.user_exists(reddit_comment.author):
+            await async_user_service.add_user(reddit_comment.author)
+
+        # Insert post into the database if it doesn't exist yet.
+        if not await async_post_service.get_post_by_id(reddit_comment.submission.id):
+            await async_post_service.add_post(reddit_comment.submission)
+
+    for comment in comment_stack[::-1]:
+        await _comment_data.insert(comment, error_on_conflict=False)
+        comment_service._known_comment_ids.add(comment.id)
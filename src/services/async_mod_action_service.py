@@ -0,0 +1,34 @@
+"""
+Async versions of the mod_action_service entry points, on the async data layer.
+"""
+
+from typing import Optional
+
+from praw.models.mod_action import ModAction
+
+from data.mod_action_data import AsyncModActionData, ModActionModel
+from services import mod_action_service
+
+_mod_action_data = AsyncModActionData()
+
+
+async def get_mod_action_by_id(mod_action_id: str) -> Optional[ModActionModel]:
+    """
+    Gets a single mod action from the database. mod_action_id is the UUID without the ModAction_ prefix.
+    """
+
+    return await _mod_action_data.get_mod_action_by_id(mod_action_id)
+
+
+async def add_mod_action(reddit_mod_action: ModAction) -> ModActionModel:
+    """
+    Parses some basic information for a mod action and adds it to the database.
+    Assumes acting mod and target user/post/comment are already created if necessary,
+    may raise an error on database integrity (foreign key relationship) if not.
+    """
+
+    mod_action = mod_action_service._create_mod_action_model(reddit_mod_action)
+    new_mod_action = await _mod_action_data.insert(mod_action, error_on_conflict=False)
+    # Same known ids as the sync service, so either sees what the other added.
+    mod_action_service._known_mod_action_ids.add(mod_action.id)
+    return new_mod_action
@@ -0,0 +1,52 @@
+"""
+Async versions of the post_service entry points, on the async data layer.
+Anything that may fetch from Reddit is run in a thread so it doesn't block the event loop.
+"""
+
+import asyncio
+from typing import Optional, Union
+
+from praw.models.reddit.submission import Submission
+
+from data.post_data import AsyncPostData, PostModel
+from services import async_user_service, post_service
+from utils import reddit
+
+_post_data = AsyncPostData()
+
+
+async def get_post_by_id(post_id: Union[str, int]) -> Optional[PostModel]:
+    """
+    Gets a single post from the database. post_id is either base 10 (int) or base 36 (str)
+    """
+
+    if isinstance(post_id, str):
+        post_id = reddit.base36decode(post_id)
+
+    return await _post_data.get_post_by_id(post_id)
+
+
+async def add_post(reddit_post: Submission) -> PostModel:
+    """
+    Parses some basic information for a post and adds it to the database, or updates it if it already exists.
+    Creates post author if necessary.
+    """
+
+    # Submissions only have an id until one of their attributes is read, e.g. the submission of a comment.
+    post = await asyncio.to_thread(post_service._create_post_model, reddit_post)
+
+    # And insert the author into the database if they don't exist yet.
+    if reddit_post.author is not None and not await async_user_service.user_exists(reddit_post.author):
+        await async_user_service.add_user(reddit_post.author)
+
+    protected_fields = ["body"] if post_service._is_body_removed(reddit_post) else []
+    return await _post_data.upsert(post, protected_fields=protected_fields)
+
+
+async def update_post(existing_post: PostModel, reddit_post: Submission) -> PostModel:
+    """
+    For the provided post, update fields to the current state and save to the database if necessary.
+    """
+
+    await asyncio.to_thread(post_service._apply_post_changes, existing_post, reddit_post)
+    return await _post_data.update(existing_post)
@@ -0,0 +1,88 @@
+"""
+Async versions of the user_service entry points, on the async data layer.
+Anything that may fetch from Reddit is run in a thread so it doesn't block the event loop.
+"""
+
+import asyncio
+from typing import Optional, Union
+
+from praw.models.reddit.redditor import Redditor
+
+from data.async_session import on_commit
+from data.user_data import AsyncUserData, UserModel
+from services import user_service
+from utils.logger import logger
+
+_user_data = AsyncUserData()
+
+# Only keeps concurrent tasks from loading the known usernames twice, they're shared with user_service.
+_load_known_usernames_lock = asyncio.Lock()
+
+
+async def get_user(username: Union[Redditor, str]) -> Optional[UserModel]:
+    """Gets a single user from the database, None if they don't exist."""
+
+    if isinstance(username, Redditor):
+        username = username.name
+
+    return await _user_data.get_user(username)
+
+
+async def user_exists(username: Union[Redditor, str]) -> bool:
+    """See user_service.user_exists."""
+
+    if isinstance(username, Redditor):
+        username = username.name
+
+    known_usernames = await _get_known_usernames()
+    if username in known_usernames:
+        return True
+
+    if await _user_data.get_user(username) is None:
+        return False
+
+    # Could have been inserted by the current unit of work, so same as in _save_user.
+    on_commit(lambda: known_usernames.add(username))
+    return True
+
+
+async def _get_known_usernames() -> set[str]:
+    """Same known usernames as user_service, loaded through the async data layer if it hasn't loaded them yet."""
+
+    async with _load_known_usernames_lock:
+        if user_service._known_usernames is None:
+            usernames = set(await _user_data.get_usernames())
+            with user_service._known_usernames_lock:
+                if user_service._known_usernames is None:
+                    user_service._known_usernames = usernames
+                    logger.info(f"Loaded {len(usernames)} known usernames")
+
+    return user_service._known_usernames
+
+
+async def _save_user(user: UserModel) -> UserModel:
+    new_user = await _user_data.upsert(user)
+
+    # Only once it's committed, anything referencing a user that was rolled back would fail to insert.
+    known_usernames = user_service._known_usernames
+    if known_usernames is not None:
+        on_commit(lambda: known_usernames.add(new_user.username))
+
+    return new_user
+
+
+async def add_user(reddit_user: Union[Redditor, str]) -> UserModel:
+    """Parses some basic information for the user and adds them to the database, or updates them if they exist."""
+
+    user = await asyncio.to_thread(user_service._create_user_model, reddit_user)
+    return await _save_user(user)
+
+
+async def update_user(existing_user: UserModel, reddit_user: Redditor) -> UserModel:
+    """
+    For the provided user, update fields to the current state and save to the database if necessary.
+    For the moment, the only things that can change overall are whether the user is deleted or suspended.
+    """
+
+    await asyncio.to_thread(user_service._apply_user_changes, existing_user, reddit_user)
+    return await _user_data.update(existing_user)
@@ -11,6 +11,14 @@ def insert(model: BaseModel) -> BaseModel:
     return _base_data.insert(model)
 
 
+def insert_many(models: list[BaseModel], on_conflict: str = "error", return_rows: bool = False) -> list[BaseModel]:
+    return _base_data.insert_many(models, on_conflict=on_conflict, return_rows=return_rows)
+
+
+def upsert(model: BaseModel, protected_fields: list[str] = None) -> BaseModel:
+    return _base_data.upsert(model, protected_fields=protected_fields)
+
+
 def update(model: BaseModel) -> BaseModel:
     return _base_data.update(model)
 
@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from praw.models import Comment, ModAction, Submission
+
+import config_loader
+from data.checkpoint_data import CheckpointData, CheckpointModel
+from services import comment_service, mod_action_service
+from utils.checkpoint import StreamCheckpoint, get_position
+
+_checkpoint_data = CheckpointData()
+
+
+def get_checkpoint(stream: str) -> Optional[CheckpointModel]:
+    """Gets the saved checkpoint of a feed stream, None if it doesn't have one yet."""
+
+    return _checkpoint_data.get_checkpoint(stream)
+
+
+def save_checkpoint(stream: str, fullname: str, created_time: datetime) -> CheckpointModel:
+    """Saves the newest item of a feed stream that it and everything before it have been processed."""
+
+    checkpoint = CheckpointModel()
+    checkpoint.stream = stream
+    checkpoint.fullname = fullname
+    checkpoint.created_time = created_time
+    checkpoint.updated_time = datetime.now(timezone.utc)
+    return _checkpoint_data.upsert(checkpoint)
+
+
+def get_stream_checkpoint(stream: str) -> StreamCheckpoint:
+    """
+    Loads the saved checkpoint of a feed stream to skip what it already processed, and to track its progress from.
+    One per stream at a time, create a new one whenever the stream is restarted.
+    """
+
+    checkpoint = get_checkpoint(stream)
+    return StreamCheckpoint(
+        stream,
+        (checkpoint.fullname, checkpoint.created_time) if checkpoint else None,
+        lambda fullname, created_time: save_checkpoint(stream, fullname, created_time),
+        _is_saved,
+        config_loader.CHECKPOINTS["save_interval"],
+    )
+
+
+def _is_saved(item: Any) -> bool:
+    """
+    Whether a feed stream's item at or before the checkpoint was saved, checked against the known ids so items the
+    stream yields again after a restart are skipped without querying. Late items are approvals out of the spam filter
+    or the AutoModerator queue, which the mod log saves and sends to the feed as well, so a rare wrong True is harmless.
+    """
+
+    _, created_time = get_position(item)
+    if isinstance(item, Comment):
+        return comment_service.is_recent_comment_saved(item.id, created_time)
+    if isinstance(item, ModAction):
+        return mod_action_service.is_recent_mod_action_saved(item.id, created_time)
+    if isinstance(item, Submission):
+        # Posts have no known ids, and checking each of them would mean a query per post, so the checkpoint is trusted.
+        return True
+
+    raise TypeError(f"Can't check whether {item} is saved")
@@ -1,14 +1,23 @@
-from datetime import date, datetime, timezone
-from typing import Union, Optional
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterator, Union, Optional
 
 from praw.models.reddit.comment import Comment
 from praw import Reddit
 
+import config_loader
 from data.comment_data import CommentData, CommentModel
 from services import user_service, post_service
-from utils.reddit import base36decode
+from utils.bloom_filter import KnownIds
+from utils.reddit import base36decode, base36encode
 
 _comment_data = CommentData()
+_known_comment_ids = KnownIds(
+    "comment",
+    _comment_data.iter_ids_since,
+    timedelta(hours=config_loader.KNOWN_IDS["window_hours"]),
+    config_loader.KNOWN_IDS["error_rate"],
+    config_loader.KNOWN_IDS["stats_interval"],
+)
 
 
 def get_comment_by_id(comment_id: Union[str, int]) -> Optional[CommentModel]:
@@ -22,6 +31,75 @@ def get_comment_by_id(comment_id: Union[str, int]) -> Optional[CommentModel]:
     return _comment_data.get_comment_by_id(comment_id)
 
 
+def get_recent_comment_by_id(comment_id: Union[str, int], created_time: datetime) -> Optional[CommentModel]:
+    """
+    Same as get_comment_by_id, but skips the database entirely if the comment is recent enough to be tracked
+    by the known comment ids and isn't one of them. Meant for checking new comments from the stream.
+    """
+
+    if isinstance(comment_id, str):
+        comment_id = base36decode(comment_id)
+
+    if not _known_comment_ids.may_exist(comment_id, created_time):
+        return None
+
+    comment = _comment_data.get_comment_by_id(comment_id)
+    if comment is None:
+        _known_comment_ids.record_false_positive(created_time)
+    return comment
+
+
+def is_recent_comment_saved(comment_id: Union[str, int], created_time: datetime) -> bool:
+    """
+    Whether a comment is in the database, trusting the known comment ids rather than querying if it's recent enough
+    to be tracked by them, so it may rarely be wrongly True. Meant for skipping comments the stream yields again.
+    """
+
+    if isinstance(comment_id, str):
+        comment_id = base36decode(comment_id)
+
+    known = _known_comment_ids.contains(comment_id, created_time)
+    if known is not None:
+        return known
+
+    return _comment_data.get_comment_by_id(comment_id) is not None
+
+
+def get_recent_comments_by_ids(created_times: dict[Union[str, int], datetime]) -> dict[int, CommentModel]:
+    """
+    Batch version of get_recent_comment_by_id, takes the created time of each comment id and looks up every one
+    that may exist with a single query. Returns the comments found by their base 10 id.
+    """
+
+    candidate_times = {}
+    for comment_id, created_time in created_times.items():
+        if isinstance(comment_id, str):
+            comment_id = base36decode(comment_id)
+        if _known_comment_ids.may_exist(comment_id, created_time):
+            candidate_times[comment_id] = created_time
+
+    if not candidate_times:
+        return {}
+
+    comments = _comment_data.get_comments_by_ids(list(candidate_times), start=min(candidate_times.values()))
+    comments_by_id = {comment.id: comment for comment in comments}
+    for comment_id, created_time in candidate_times.items():
+        if comment_id not in comments_by_id:
+            _known_comment_ids.record_false_positive(created_time)
+
+    return comments_by_id
+
+
+def rebuild_known_comment_ids():
+    """Reloads the known comment ids from the database before the next check. Safe to call from a signal handler."""
+
+    _known_comment_ids.request_rebuild()
+
+
+def get_known_comment_id_stats() -> dict:
+    return _known_comment_ids.get_stats()
+
+
 def get_comments_by_post_id(post_id: Union[str, int]) -> list[CommentModel]:
     """
     Get all comments on the specified post. post_id is either base 10 (int) or base 36 (str)
@@ -33,6 +111,17 @@ def get_comments_by_post_id(post_id: Union[str, int]) -> list[CommentModel]:
     return _comment_data.get_comments_by_post_id(post_id)
 
 
+def iter_comments_by_post_id(post_id: Union[str, int]) -> Iterator[CommentModel]:
+    """
+    Same as get_comments_by_post_id, but streams comments from the database rather than loading them all at once.
+    """
+
+    if isinstance(post_id, str):
+        post_id = base36decode(post_id)
+
+    return _comment_data.iter_comments_by_post_id(post_id)
+
+
 def get_comments_by_username(
     username: str, start_date: str = None, end_date: str = None, exclude_cdf: bool = False
 ) -> list[CommentModel]:
@@ -43,6 +132,16 @@ def get_comments_by_username(
     return _comment_data.get_comments_by_username(username, start_date, end_date, exclude_cdf)
 
 
+def iter_comments_by_username(
+    username: str, start_date: str = None, end_date: str = None, exclude_cdf: bool = False
+) -> Iterator[CommentModel]:
+    """
+    Same as get_comments_by_username, but streams comments from the database rather than loading them all at once.
+    """
+
+    return _comment_data.iter_comments_by_username(username, start_date, end_date, exclude_cdf)
+
+
 def get_comment_count_by_username(
     username: str, start_date: str = None, end_date: str = None, exclude_cdf: bool = False
 ) -> int:
@@ -53,6 +152,24 @@ def get_comment_count_by_username(
     return _comment_data.get_comment_count_by_username(username, start_date, end_date, exclude_cdf)
 
 
+def search_comments(
+    search_text: str,
+    username: str = None,
+    start_date: str = None,
+    end_date: str = None,
+    min_rank: float = None,
+    order: str = "rank",
+    limit: int = 100,
+) -> list[CommentModel]:
+    """
+    Searches comment bodies, optionally by a user, within a specified time frame or above a minimum rank.
+    Supports web search syntax, e.g. "exact phrase", "this or that", -excluded.
+    Ordered by rank (best matches first), "new" or "old".
+    """
+
+    return _comment_data.search_comments(search_text, username, start_date, end_date, min_rank, order, limit)
+
+
 def count_comments(start_date: date = None, end_date: date = None, exclude_authors: list = None) -> int:
     """
     Gets number of comments made in the given date range.
@@ -69,7 +186,7 @@ def count_comment_authors(start_date: date = None, end_date: date = None, exclud
 
 def add_comment(reddit_comment: Comment) -> CommentModel:
     """
-    Parses some basic information for a comment and adds it to the database.
+    Parses some basic information for a comment and adds it to the database, or updates it if it already exists.
     Creates author and post if necessary.
     This also assumes its parent comment is already created, call
     add_comment_parent_tree first if necessary.
@@ -78,38 +195,69 @@ def add_comment(reddit_comment: Comment) -> CommentModel:
     comment = _create_comment_model(reddit_comment)
 
     # Insert the author into the database if they don't exist yet.
-    if reddit_comment.author is not None and not user_service.get_user(reddit_comment.author):
+    if reddit_comment.author is not None and not user_service.user_exists(reddit_comment.author):
         user_service.add_user(reddit_comment.author)
 
     # Insert post into the database if it doesn't exist yet (and we have it available).
     if isinstance(reddit_comment, Comment) and not post_service.get_post_by_id(reddit_comment.submission.id):
         post_service.add_post(reddit_comment.submission)
 
-    new_comment = _comment_data.insert(comment, error_on_conflict=False)
+    protected_fields = ["body"] if _is_body_removed(reddit_comment) else []
+    new_comment = _comment_data.upsert(comment, protected_fields=protected_fields)
+    _known_comment_ids.add(new_comment.id)
     return new_comment
 
 
+def add_comments(reddit_comments: list[Comment]) -> list[CommentModel]:
+    """
+    Adds many comments to the database at once, skipping any that already exist.
+    Creates authors and posts if necessary. Same as add_comment, parent comments must either already exist
+    or be in the list, they're inserted before their replies.
+    Returns only the comments that were actually inserted.
+    """
+
+    reddit_comments = _order_parents_first(reddit_comments)
+    comments = [_create_comment_model(reddit_comment) for reddit_comment in reddit_comments]
+
+    # Checks every distinct author and post with one query each rather than once per comment.
+    user_service.add_missing_users([reddit_comment.author for reddit_comment in reddit_comments])
+    post_service.add_missing_posts(
+        [reddit_comment.submission for reddit_comment in reddit_comments if isinstance(reddit_comment, Comment)]
+    )
+
+    new_comments = _comment_data.insert_many(comments, on_conflict="nothing", return_rows=True)
+    for new_comment in new_comments:
+        _known_comment_ids.add(new_comment.id)
+    return new_comments
+
+
 def update_comment(existing_comment: CommentModel, reddit_comment: Comment) -> CommentModel:
     """
     For the provided comment, update fields to the current state and save to the database if necessary.
     """
 
-    new_comment = _create_comment_model(reddit_comment)
-
     # Insert the author into the database if they don't exist yet.
     if (
         existing_comment.author is None
         and reddit_comment.author is not None
-        and not user_service.get_user(reddit_comment.author)
+        and not user_service.user_exists(reddit_comment.author)
     ):
         user_service.add_user(reddit_comment.author)
 
+    _apply_comment_changes(existing_comment, reddit_comment)
+    updated_comment = _comment_data.update(existing_comment)
+    return updated_comment
+
+
+def _apply_comment_changes(existing_comment: CommentModel, reddit_comment: Comment):
+    """Sets every field of the existing comment that can change to its current value, without saving it."""
+
+    new_comment = _create_comment_model(reddit_comment)
+
     # Fields that shouldn't be updated since they won't change.
     non_update_fields = ["author"] if existing_comment.author else []
 
-    # If a user has deleted their post or admins took it down we don't want to overwrite the original text.
-    # Removals by "anti_evil_ops" or "moderator" are fine since those don't change the body.
-    if getattr(reddit_comment, "removal_reason", None) in ("legal",) or reddit_comment.author is None:
+    if _is_body_removed(reddit_comment):
         non_update_fields.append("body")
 
     for field in new_comment.columns:
@@ -118,9 +266,6 @@ def update_comment(existing_comment: CommentModel, reddit_comment: Comment) -> C
         if hasattr(new_comment, field):
             setattr(existing_comment, field, getattr(new_comment, field))
 
-    updated_comment = _comment_data.update(existing_comment)
-    return updated_comment
-
 
 def add_comment_parent_tree(reddit: Reddit, reddit_comment: Comment):
     """
@@ -153,7 +298,7 @@ def add_comment_parent_tree(reddit: Reddit, reddit_comment: Comment):
         comment_stack.append(comment)
 
         # Insert the author into the database if they don't exist yet.
-        if reddit_comment.author is not None and not user_service.get_user(reddit_comment.author.name):
+        if reddit_comment.author is not None and not user_service.user_exists(reddit_comment.author):
             user_service.add_user(reddit_comment.author)
 
         # Insert post into the database if it doesn't exist yet.
@@ -165,6 +310,103 @@ def add_comment_parent_tree(reddit: Reddit, reddit_comment: Comment):
         _comment_data.insert(comment, error_on_conflict=False)
 
 
+def add_comment_parent_trees(reddit: Reddit, reddit_comments: list[Comment]):
+    """
+    Batch version of add_comment_parent_tree, adds every missing ancestor of the given comments, see
+    get_missing_parents. The given comments themselves aren't added, add them with add_comments afterwards.
+    """
+
+    ancestors = get_missing_parents(reddit, reddit_comments)
+    if ancestors:
+        add_comments(ancestors)
+
+
+def get_missing_parents(reddit: Reddit, reddit_comments: list[Comment]) -> list[Comment]:
+    """
+    Fetches every ancestor of the given comments that isn't in the database from Reddit, without adding them. Works
+    up the trees a level at a time, checking which parents exist with a single query and fetching the missing ones
+    together rather than one at a time. Comments in the list count as existing for any comment replying to another.
+    """
+
+    present_ids = {base36decode(reddit_comment.id) for reddit_comment in reddit_comments}
+    ancestors = []
+
+    children = reddit_comments
+    while children:
+        parent_ids = {
+            base36decode(child.parent_id[3:])
+            for child in children
+            if child.parent_id.startswith("t1_") and base36decode(child.parent_id[3:]) not in present_ids
+        }
+        if not parent_ids:
+            break
+
+        # Parents are never newer than their replies, so newer partitions are skipped.
+        newest_time = max(datetime.fromtimestamp(child.created_utc, tz=timezone.utc) for child in children)
+        present_comments = _comment_data.get_comments_by_ids(list(parent_ids), end=newest_time)
+        present_ids.update(comment.id for comment in present_comments)
+        missing_fullnames = [
+            f"t1_{base36encode(parent_id)}" for parent_id in parent_ids if parent_id not in present_ids
+        ]
+        if not missing_fullnames:
+            break
+
+        # Fetched 100 at a time by PRAW.
+        children = list(reddit.info(fullnames=missing_fullnames))
+        present_ids.update(base36decode(child.id) for child in children)
+        ancestors.extend(children)
+
+    return ancestors
+
+
+def load_comments(reddit_comments: list[Comment]):
+    """
+    Fetches the authors and posts of the comments that aren't in the database yet from Reddit, so adding the comments
+    afterwards doesn't make any requests, e.g. while a transaction is open.
+    """
+
+    user_service.load_missing_users([reddit_comment.author for reddit_comment in reddit_comments])
+    post_service.load_missing_posts(
+        [reddit_comment.submission for reddit_comment in reddit_comments if isinstance(reddit_comment, Comment)]
+    )
+
+
+def _order_parents_first(reddit_comments: list[Comment]) -> list[Comment]:
+    """Orders comments oldest first, but always after their parent if that's in the list too."""
+
+    remaining = sorted(reddit_comments, key=lambda reddit_comment: reddit_comment.created_utc)
+    unplaced_ids = {reddit_comment.id for reddit_comment in remaining}
+
+    # Replies are newer than their parents, so this only takes more than one pass if they were made in the same second.
+    ordered = []
+    while remaining:
+        waiting = []
+        for reddit_comment in remaining:
+            parent_id = reddit_comment.parent_id[3:] if reddit_comment.parent_id.startswith("t1_") else None
+            if parent_id in unplaced_ids:
+                waiting.append(reddit_comment)
+            else:
+                ordered.append(reddit_comment)
+                unplaced_ids.discard(reddit_comment.id)
+
+        # Can't happen unless Reddit returns a comment replying to one of its own replies, but don't loop forever.
+        if len(waiting) == len(remaining):
+            ordered.extend(waiting)
+            break
+        remaining = waiting
+
+    return ordered
+
+
+def _is_body_removed(reddit_comment: Comment) -> bool:
+    """
+    If a user has deleted their comment or admins took it down we don't want to overwrite the original text.
+    Removals by "anti_evil_ops" or "moderator" are fine since those don't change the body.
+    """
+
+    return getattr(reddit_comment, "removal_reason", None) in ("legal",) or reddit_comment.author is None
+
+
 def _create_comment_model(reddit_comment: Comment) -> CommentModel:
     """
     Creates a model without inserting it into the database.
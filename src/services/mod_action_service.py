@@ -1,14 +1,23 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 from praw.models.mod_action import ModAction
 
+import config_loader
 from constants import mod_constants
 from data.post_data import PostModel
 from data.mod_action_data import ModActionData, ModActionModel
+from utils.bloom_filter import KnownIds
 from utils.reddit import base36decode
 
 _mod_action_data = ModActionData()
+_known_mod_action_ids = KnownIds(
+    "mod action",
+    _mod_action_data.iter_ids_since,
+    timedelta(hours=config_loader.KNOWN_IDS["window_hours"]),
+    config_loader.KNOWN_IDS["error_rate"],
+    config_loader.KNOWN_IDS["stats_interval"],
+)
 
 
 def get_mod_action_by_id(mod_action_id: str) -> Optional[ModActionModel]:
@@ -19,6 +28,47 @@ def get_mod_action_by_id(mod_action_id: str) -> Optional[ModActionModel]:
     return _mod_action_data.get_mod_action_by_id(mod_action_id)
 
 
+def get_recent_mod_action_by_id(mod_action_id: str, created_time: datetime) -> Optional[ModActionModel]:
+    """
+    Same as get_mod_action_by_id, but skips the database entirely if the mod action is recent enough to be tracked
+    by the known mod action ids and isn't one of them. Meant for checking new mod actions from the stream.
+    """
+
+    if not _known_mod_action_ids.may_exist(mod_action_id, created_time):
+        return None
+
+    mod_action = _mod_action_data.get_mod_action_by_id(mod_action_id)
+    if mod_action is None:
+        _known_mod_action_ids.record_false_positive(created_time)
+    return mod_action
+
+
+def is_recent_mod_action_saved(mod_action_id: str, created_time: datetime) -> bool:
+    """
+    Whether a mod action is in the database, trusting the known mod action ids rather than querying if it's recent
+    enough to be tracked by them, so it may rarely be wrongly True. Meant for skipping mod actions the stream yields
+    again.
+    """
+
+    known = _known_mod_action_ids.contains(mod_action_id, created_time)
+    if known is not None:
+        return known
+
+    return _mod_action_data.get_mod_action_by_id(mod_action_id) is not None
+
+
+def rebuild_known_mod_action_ids():
+    """
+    Reloads the known mod action ids from the database before the next check. Safe to call from a signal handler.
+    """
+
+    _known_mod_action_ids.request_rebuild()
+
+
+def get_known_mod_action_id_stats() -> dict:
+    return _known_mod_action_ids.get_stats()
+
+
 def get_most_recent_approve_remove_by_post(post: PostModel) -> Optional[ModActionModel]:
     """
     Gets the most recent approve/remove/spam mod action taken against a post.
@@ -47,11 +97,38 @@ def get_mod_actions_targeting_username(
     return _mod_action_data.get_mod_actions_targeting_username(username, actions, start_date, end_date)
 
 
-def add_mod_action(reddit_mod_action: ModAction) -> ModActionModel:
+def add_mod_action(reddit_mod_action: ModAction) -> Optional[ModActionModel]:
     """
     Parses some basic information for a mod action and adds it to the database.
     Assumes acting mod and target user/post/comment are already created if necessary,
     may raise an error on database integrity (foreign key relationship) if not.
+    Returns None if it was already in the database, e.g. added by another process since the known ids were loaded,
+    so whoever added it has handled it.
+    """
+
+    mod_action = _create_mod_action_model(reddit_mod_action)
+    new_mod_actions = _mod_action_data.insert_many([mod_action], on_conflict="nothing", return_rows=True)
+    _known_mod_action_ids.add(mod_action.id)
+    return new_mod_actions[0] if new_mod_actions else None
+
+
+def add_mod_actions(reddit_mod_actions: list[ModAction]) -> list[ModActionModel]:
+    """
+    Adds many mod actions to the database in a single statement, same as add_mod_action otherwise.
+    Returns only the mod actions that were actually inserted, ones already in the database were handled by whoever
+    added them.
+    """
+
+    mod_actions = [_create_mod_action_model(reddit_mod_action) for reddit_mod_action in reddit_mod_actions]
+    new_mod_actions = _mod_action_data.insert_many(mod_actions, on_conflict="nothing", return_rows=True)
+    for mod_action in mod_actions:
+        _known_mod_action_ids.add(mod_action.id)
+    return new_mod_actions
+
+
+def _create_mod_action_model(reddit_mod_action: ModAction) -> ModActionModel:
+    """
+    Creates a model without inserting it into the database.
     """
 
     mod_action = ModActionModel()
@@ -78,8 +155,7 @@ def add_mod_action(reddit_mod_action: ModAction) -> ModActionModel:
         comment_id = reddit_mod_action.target_fullname.replace("t1_", "")
         mod_action.target_comment_id = base36decode(comment_id)
 
-    new_mod_action = _mod_action_data.insert(mod_action, error_on_conflict=False)
-    return new_mod_action
+    return mod_action
 
 
 def count_mod_actions(
@@ -0,0 +1,35 @@
+import datetime
+
+from data.partition_data import PartitionData
+from utils.logger import logger
+
+_partition_data = PartitionData()
+
+# Tables partitioned by month on created_time.
+PARTITIONED_TABLES = ["comments", "mod_actions"]
+
+
+def create_future_partitions(months_ahead: int = 3) -> list[str]:
+    """
+    Makes sure every partitioned table has partitions from the current month until months_ahead months from now,
+    returns the names of any that were created. Rows for a month without a partition can't be inserted at all.
+    """
+
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    month_index = today.year * 12 + today.month - 1 + months_ahead
+    to_date = datetime.date(month_index // 12, month_index % 12 + 1, 1)
+
+    created_partitions = []
+    for table in PARTITIONED_TABLES:
+        new_partitions = _partition_data.create_monthly_partitions(table, today, to_date)
+        for partition in new_partitions:
+            logger.info(f"Created partition {partition}")
+        created_partitions.extend(new_partitions)
+
+    return created_partitions
+
+
+def get_partitions(table: str) -> list[str]:
+    """Gets the names of the table's partitions, oldest first."""
+
+    return _partition_data.get_partitions(table)
@@ -1,5 +1,5 @@
 from datetime import date, datetime, timezone
-from typing import Union, Optional
+from typing import Iterator, Union, Optional
 
 from praw.models.reddit.submission import Submission
 
@@ -31,6 +31,14 @@ def get_posts_by_username(username: str, start_date: str = None, end_date: str =
     return _post_data.get_posts_by_username(username, start_date, end_date)
 
 
+def iter_posts_by_username(username: str, start_date: str = None, end_date: str = None) -> Iterator[PostModel]:
+    """
+    Same as get_posts_by_username, but streams posts from the database rather than loading them all at once.
+    """
+
+    return _post_data.iter_posts_by_username(username, start_date, end_date)
+
+
 def get_post_count_by_username(username: str, start_date: str = None, end_date: str = None) -> list[PostModel]:
     """
     Gets the number of posts by a user, optionally within a specified time frame.
@@ -62,6 +70,24 @@ def get_flaired_posts_by_username(
     )
 
 
+def search_posts(
+    search_text: str,
+    username: str = None,
+    start_date: str = None,
+    end_date: str = None,
+    min_rank: float = None,
+    order: str = "rank",
+    limit: int = 100,
+) -> list[PostModel]:
+    """
+    Searches post titles and bodies, optionally by a user, within a specified time frame or above a minimum rank.
+    Supports web search syntax, e.g. "exact phrase", "this or that", -excluded.
+    Ordered by rank (best matches first), "new" or "old".
+    """
+
+    return _post_data.search_posts(search_text, username, start_date, end_date, min_rank, order, limit)
+
+
 def count_posts(start_date: date = None, end_date: date = None, exclude_authors: list = None) -> int:
     """
     Gets number of posts made in the given date range.
@@ -78,32 +104,71 @@ def count_post_authors(start_date: date = None, end_date: date = None, exclude_a
 
 def add_post(reddit_post: Submission) -> PostModel:
     """
-    Parses some basic information for a post and adds it to the database.
+    Parses some basic information for a post and adds it to the database, or updates it if it already exists.
     Creates post author if necessary.
     """
 
     post = _create_post_model(reddit_post)
 
     # And insert the author into the database if they don't exist yet.
-    if reddit_post.author is not None and not user_service.get_user(reddit_post.author):
+    if reddit_post.author is not None and not user_service.user_exists(reddit_post.author):
         user_service.add_user(reddit_post.author)
 
-    new_post = _post_data.insert(post, error_on_conflict=False)
+    protected_fields = ["body"] if _is_body_removed(reddit_post) else []
+    new_post = _post_data.upsert(post, protected_fields=protected_fields)
     return new_post
 
 
+def add_missing_posts(reddit_posts: list[Submission]):
+    """
+    Adds every post in the list that isn't in the database yet, checking them all with a single query.
+    """
+
+    for reddit_post in _get_missing_posts(reddit_posts):
+        add_post(reddit_post)
+
+
+def load_missing_posts(reddit_posts: list[Submission]):
+    """
+    Fetches every post in the list that isn't in the database yet from Reddit, along with its author if they aren't
+    either, so adding them afterwards doesn't make any requests, e.g. while a transaction is open.
+    """
+
+    missing_posts = _get_missing_posts(reddit_posts)
+    for reddit_post in missing_posts:
+        reddit.load(reddit_post)
+    user_service.load_missing_users([reddit_post.author for reddit_post in missing_posts])
+
+
+def _get_missing_posts(reddit_posts: list[Submission]) -> list[Submission]:
+    """The posts in the list that aren't in the database, checked with a single query."""
+
+    posts_by_id = {reddit.base36decode(reddit_post.id): reddit_post for reddit_post in reddit_posts}
+    if not posts_by_id:
+        return []
+
+    existing_post_ids = _post_data.get_existing_post_ids(list(posts_by_id))
+    return [reddit_post for post_id, reddit_post in posts_by_id.items() if post_id not in existing_post_ids]
+
+
 def update_post(existing_post: PostModel, reddit_post: Submission) -> PostModel:
     """
     For the provided post, update fields to the current state and save to the database if necessary.
     """
 
+    _apply_post_changes(existing_post, reddit_post)
+    updated_post = _post_data.update(existing_post)
+    return updated_post
+
+
+def _apply_post_changes(existing_post: PostModel, reddit_post: Submission):
+    """Sets every field of the existing post that can change to its current value, without saving it."""
+
     new_post = _create_post_model(reddit_post)
 
     non_update_fields = ["author", "title", "url"]
 
-    # If a user has deleted their post or admins took it down we don't want to overwrite the original text.
-    # Removals by "anti_evil_ops" or "moderator" are fine since those don't change the body.
-    if reddit_post.removed_by_category in ("deleted", "content_takedown") or reddit_post.removal_reason in ("legal",):
+    if _is_body_removed(reddit_post):
         non_update_fields.append("body")
 
     for field in new_post.columns:
@@ -112,9 +177,6 @@ def update_post(existing_post: PostModel, reddit_post: Submission) -> PostModel:
         if hasattr(new_post, field):
             setattr(existing_post, field, getattr(new_post, field))
 
-    updated_post = _post_data.update(existing_post)
-    return updated_post
-
 
 def format_post_embed(post: PostModel):
     """
@@ -177,16 +239,30 @@ def load_post_flairs(subreddit):
     Loads flair colors from the subreddit, used to color Discord embeds.
     """
 
+    # Replaced all at once rather than cleared and filled in, other threads may be formatting posts meanwhile.
     global _flair_colors
-    _flair_colors = {}
+    flair_colors = {}
     flair_list = subreddit.flair.link_templates
     for flair in flair_list:
         color_hex = flair["background_color"].replace("#", "")
-        _flair_colors[flair["id"]] = int(color_hex, base=16)
+        flair_colors[flair["id"]] = int(color_hex, base=16)
+    _flair_colors = flair_colors
     logger.info(f"Loaded post flairs from {subreddit.display_name_prefixed}")
     logger.debug(f"Flairs loaded: {_flair_colors}")
 
 
+def _is_body_removed(reddit_post: Submission) -> bool:
+    """
+    If a user has deleted their post or admins took it down we don't want to overwrite the original text.
+    Removals by "anti_evil_ops" or "moderator" are fine since those don't change the body.
+    """
+
+    # Pushshift objects may not have either attribute.
+    removed_by_category = getattr(reddit_post, "removed_by_category", None)
+    removal_reason = getattr(reddit_post, "removal_reason", None)
+    return removed_by_category in ("deleted", "content_takedown") or removal_reason in ("legal",)
+
+
 def _create_post_model(reddit_post: Submission) -> PostModel:
     """
     Populate a new PostModel based on the Reddit thread.
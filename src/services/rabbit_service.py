@@ -1,6 +1,7 @@
 import json
 import pika
 import praw
+import threading
 from collections import deque
 from json import JSONEncoder
 from praw.models.mod_action import ModAction
@@ -34,10 +35,16 @@ class PRAWJSONEncoder(JSONEncoder):
 
 
 class RabbitService:
+    """
+    Publishes to the configured exchanges over one connection. Safe to share between threads, pika connections aren't
+    so publishing and reconnecting are serialized.
+    """
+
     messages_to_retry: Deque[dict] = deque()
 
     def __init__(self, config_dict: dict):
         self.config = config_dict
+        self._lock = threading.RLock()
         self.connection = None
         self.channel = None
         self.init_connection(False)
@@ -86,10 +93,11 @@ class RabbitService:
             self._publish_message(exchange_name, queue_name, json_body)
 
     def init_connection(self, reconnect: bool = True):
-        logger.info(f"{"Rec" if reconnect else "C"}onnecting to RabbitMQ...")
-        self.connection = pika.BlockingConnection(pika.URLParameters(self.config["connection"]))
-        self.channel = self.connection.channel()
-        self.channel.confirm_delivery()
+        with self._lock:
+            logger.info(f"{"Rec" if reconnect else "C"}onnecting to RabbitMQ...")
+            self.connection = pika.BlockingConnection(pika.URLParameters(self.config["connection"]))
+            self.channel = self.connection.channel()
+            self.channel.confirm_delivery()
 
     def publish_post(self, reddit_post: Submission, post: PostModel, status: str = "new"):
         logger.info(f"Publishing post to RabbitMQ: {reddit_post.id} ({status})")
@@ -110,20 +118,8 @@ class RabbitService:
         self._publish_message(queue["exchange"], queue["queue"], json.dumps(body, cls=PRAWJSONEncoder))
 
     def _publish_message(self, exchange_name: str, queue_name: str, json_body: str):
-        try:
-            self.channel.basic_publish(
-                exchange=exchange_name,
-                routing_key=queue_name,
-                body=json_body,
-                properties=pika.BasicProperties(
-                    delivery_mode=pika.DeliveryMode.Persistent,
-                    content_type="application/json",
-                    headers={self.config["retry_attempt_header"]: 1},
-                ),
-            )
-        except Exception:
+        with self._lock:
             try:
-                self.init_connection(True)
                 self.channel.basic_publish(
                     exchange=exchange_name,
                     routing_key=queue_name,
@@ -134,8 +130,21 @@ class RabbitService:
                         headers={self.config["retry_attempt_header"]: 1},
                     ),
                 )
-                logger.info("Successfully send message after reconnect")
             except Exception:
-                logger.error("Still couldn't connect to RabbitMQ. Saving message to retry memory list")
-                self.messages_to_retry.append((exchange_name, queue_name, json_body))
-                raise
+                try:
+                    self.init_connection(True)
+                    self.channel.basic_publish(
+                        exchange=exchange_name,
+                        routing_key=queue_name,
+                        body=json_body,
+                        properties=pika.BasicProperties(
+                            delivery_mode=pika.DeliveryMode.Persistent,
+                            content_type="application/json",
+                            headers={self.config["retry_attempt_header"]: 1},
+                        ),
+                    )
+                    logger.info("Successfully send message after reconnect")
+                except Exception:
+                    logger.error("Still couldn't connect to RabbitMQ. Saving message to retry memory list")
+                    self.messages_to_retry.append((exchange_name, queue_name, json_body))
+                    raise
@@ -0,0 +1,115 @@
+"""
+Daily rollups of mod action and post/comment counts, so reports read a row per day instead of scanning every row.
+Days are in UTC. Distinct counts (targets of an action, authors) are exact over any range, see the rollup migration.
+"""
+
+from datetime import date, timedelta
+from typing import Optional
+
+import config_loader
+
+from constants import mod_constants
+from data.rollup_data import RollupData
+from data.session import unit_of_work
+from utils.logger import logger
+
+_rollup_data = RollupData()
+
+# Categories mods are rolled up by, see count_mod_actions.
+MOD_CATEGORY_HUMAN = "human"
+MOD_CATEGORY_BOT = "bot"
+MOD_CATEGORY_ADMIN = "admin"
+
+# Categories post/comment authors are rolled up by, see count_posts/count_comments.
+AUTHOR_CATEGORY_HUMAN = "human"
+AUTHOR_CATEGORY_BOT = "bot"
+AUTHOR_CATEGORY_DELETED = "deleted"
+
+
+def update_rollups(since: date = None):
+    """
+    Brings the rollups up to date. The last few days already rolled up are recalculated too, not just the most recent
+    one, since rows keep arriving for them after the fact, e.g. a feed catching up after an outage or comments loaded
+    with their parents. Use since to recalculate from an earlier day, e.g. after loading older data with a script.
+    Everything is rolled up the first time.
+    """
+
+    with unit_of_work():
+        last_mod_action_day, last_activity_day = _rollup_data.get_last_days()
+
+        mod_action_start_day = since or _get_recalculate_start(last_mod_action_day)
+        mod_action_rows = _rollup_data.update_mod_action_daily(
+            mod_action_start_day,
+            admins=mod_constants.ADMINS,
+            bots=mod_constants.BOTS,
+            user_actions=mod_constants.MOD_ACTIONS_USERS,
+            post_actions=mod_constants.MOD_ACTIONS_POSTS,
+            comment_actions=mod_constants.MOD_ACTIONS_COMMENTS,
+        )
+
+        activity_start_day = since or _get_recalculate_start(last_activity_day)
+        activity_rows = _rollup_data.update_activity_daily(activity_start_day, bots=mod_constants.BOTS)
+
+    logger.info(
+        f"Rolled up mod actions since {mod_action_start_day or 'the start'} ({mod_action_rows} rows), "
+        f"posts and comments since {activity_start_day or 'the start'} ({activity_rows} rows)"
+    )
+
+
+def _get_recalculate_start(last_day: Optional[date]) -> Optional[date]:
+    """First day to recalculate given the most recent one rolled up, None to roll up everything."""
+
+    if last_day is None:
+        return None
+
+    return last_day - timedelta(days=max(config_loader.ROLLUPS["recalculate_days"] - 1, 0))
+
+
+def count_mod_actions(
+    action: str,
+    start_date: date,
+    end_date: date,
+    distinct: bool = True,
+    details: str = "",
+    description: str = "",
+    mod_categories: list[str] = None,
+) -> int:
+    """
+    Same as mod_action_service.count_mod_actions over [start_date, end_date) but from the rollups,
+    with mods selected by category (MOD_CATEGORY_*) rather than account. Defaults to all mods if None.
+    """
+
+    if distinct and action not in (
+        mod_constants.MOD_ACTIONS_USERS + mod_constants.MOD_ACTIONS_POSTS + mod_constants.MOD_ACTIONS_COMMENTS
+    ):
+        raise ValueError(f"{action} is not recognized as an action type that can be counted as distinct.")
+
+    return _rollup_data.count_mod_actions(action, start_date, end_date, distinct, details, description, mod_categories)
+
+
+def count_posts(start_date: date, end_date: date, author_categories: list[str] = None) -> int:
+    """Gets number of posts made in [start_date, end_date), optionally only by authors in the categories."""
+
+    return _rollup_data.count_activity("post", start_date, end_date, author_categories=author_categories)
+
+
+def count_post_authors(start_date: date, end_date: date, author_categories: list[str] = None) -> int:
+    """Gets number of distinct authors making posts in [start_date, end_date)."""
+
+    return _rollup_data.count_activity(
+        "post", start_date, end_date, distinct_authors=True, author_categories=author_categories
+    )
+
+
+def count_comments(start_date: date, end_date: date, author_categories: list[str] = None) -> int:
+    """Gets number of comments made in [start_date, end_date), optionally only by authors in the categories."""
+
+    return _rollup_data.count_activity("comment", start_date, end_date, author_categories=author_categories)
+
+
+def count_comment_authors(start_date: date, end_date: date, author_categories: list[str] = None) -> int:
+    """Gets number of distinct authors making comments in [start_date, end_date)."""
+
+    return _rollup_data.count_activity(
+        "comment", start_date, end_date, distinct_authors=True, author_categories=author_categories
+    )
@@ -59,15 +59,9 @@ def update_hourly_traffic(traffic_data: list[list[int]]):
 def add_frontpage_post(reddit_post: Submission, snapshot: SnapshotModel, rank: int) -> SnapshotFrontpageModel:
     """Adds the specified post ranking for the snapshot. Also inserts the post itself if necessary."""
 
-    post_id = reddit_post.id
-    post = post_service.get_post_by_id(post_id)
-
     # Add or update post as necessary.
-    if not post:
-        logger.debug(f"Saving post {post_id}")
-        post = post_service.add_post(reddit_post)
-    else:
-        post = post_service.update_post(post, reddit_post)
+    logger.debug(f"Saving post {reddit_post.id}")
+    post = post_service.add_post(reddit_post)
 
     frontpage_model = SnapshotFrontpageModel()
     frontpage_model.post_id = post.id
@@ -1,13 +1,21 @@
 from datetime import datetime, timezone
+import threading
 from typing import Optional, Union
 
 from praw.models.reddit.redditor import Redditor
 from prawcore.exceptions import NotFound
 
+from data.session import on_commit
 from data.user_data import UserData, UserModel
+from utils import reddit as reddit_utils
+from utils.logger import logger
 
 _user_data = UserData()
 
+# Every username known to be in the database, loaded on first use and added to as users are inserted.
+_known_usernames: Optional[set[str]] = None
+_known_usernames_lock = threading.Lock()
+
 
 def get_user(username: Union[Redditor, str]) -> Optional[UserModel]:
     """Gets a single user from the database, None if they don't exist."""
@@ -18,14 +26,121 @@ def get_user(username: Union[Redditor, str]) -> Optional[UserModel]:
         return _user_data.get_user(username.name)
 
 
+def user_exists(username: Union[Redditor, str]) -> bool:
+    """
+    Whether the user is in the database. Only queries the database for usernames this process hasn't seen yet,
+    i.e. new users or ones added by another process since the known usernames were loaded.
+    """
+
+    if isinstance(username, Redditor):
+        username = username.name
+
+    known_usernames = _get_known_usernames()
+    if username in known_usernames:
+        return True
+
+    if _user_data.get_user(username) is None:
+        return False
+
+    # Could have been inserted by the current unit of work, so same as in _save_user.
+    on_commit(lambda: known_usernames.add(username))
+    return True
+
+
+def _get_known_usernames() -> set[str]:
+    global _known_usernames
+
+    with _known_usernames_lock:
+        if _known_usernames is None:
+            _known_usernames = set(_user_data.iter_usernames())
+            logger.info(f"Loaded {len(_known_usernames)} known usernames")
+
+    return _known_usernames
+
+
+def _save_user(user: UserModel) -> UserModel:
+    new_user = _user_data.upsert(user)
+
+    # Only once it's committed, anything referencing a user that was rolled back would fail to insert.
+    if _known_usernames is not None:
+        on_commit(lambda: _known_usernames.add(new_user.username))
+
+    return new_user
+
+
 def add_user(reddit_user: Union[Redditor, str]) -> UserModel:
-    """Parses some basic information for the user and adds them to the database."""
+    """Parses some basic information for the user and adds them to the database, or updates them if they exist."""
+
+    return _save_user(_create_user_model(reddit_user))
+
+
+def add_missing_users(reddit_users: list[Union[Redditor, str, None]]):
+    """
+    Adds every user in the list who isn't in the database yet, checking them all with a single query and inserting
+    them in a single statement rather than one of each per user. None (a deleted author) is skipped.
+    """
+
+    known_usernames = _get_known_usernames()
+    users_by_name = _get_unknown_users(reddit_users)
+    if not users_by_name:
+        return
+
+    existing_usernames = _user_data.get_existing_usernames(list(users_by_name))
+    new_users = [
+        _create_user_model(reddit_user)
+        for username, reddit_user in users_by_name.items()
+        if username not in existing_usernames
+    ]
+    if new_users:
+        _user_data.insert_many(new_users, on_conflict="nothing")
+
+    # Everyone in the list is in the database now, added to the known usernames once committed same as in _save_user.
+    on_commit(lambda: known_usernames.update(users_by_name))
+
+
+def load_missing_users(reddit_users: list[Union[Redditor, str, None]]):
+    """
+    Fetches every user in the list who isn't in the database yet from Reddit, so adding them afterwards doesn't make
+    any requests, e.g. while a transaction is open. Checks them all with a single query, same as add_missing_users.
+    """
+
+    users_by_name = _get_unknown_users(reddit_users)
+    if not users_by_name:
+        return
+
+    existing_usernames = _user_data.get_existing_usernames(list(users_by_name))
+    for username, reddit_user in users_by_name.items():
+        if username not in existing_usernames and isinstance(reddit_user, Redditor):
+            reddit_utils.load(reddit_user)
+
+
+def _get_unknown_users(reddit_users: list[Union[Redditor, str, None]]) -> dict[str, Union[Redditor, str]]:
+    """The users in the list who aren't known usernames, by username. None (a deleted author) is skipped."""
+
+    known_usernames = _get_known_usernames()
+
+    users_by_name = {}
+    for reddit_user in reddit_users:
+        if reddit_user is None:
+            continue
+
+        username = reddit_user.name if isinstance(reddit_user, Redditor) else reddit_user
+        if username not in known_usernames:
+            users_by_name.setdefault(username, reddit_user)
+
+    return users_by_name
+
+
+def _create_user_model(reddit_user: Union[Redditor, str]) -> UserModel:
+    """
+    Creates a model without inserting it into the database. Fetches the user from Reddit unless already loaded.
+    """
 
     user = UserModel()
     # Worst case we just have their username, insert that anyway.
     if isinstance(reddit_user, str):
         user.username = reddit_user
-        return _user_data.insert(user, error_on_conflict=False)
+        return user
 
     user.username = reddit_user.name
 
@@ -37,15 +152,15 @@ def add_user(reddit_user: Union[Redditor, str]) -> UserModel:
     except NotFound:
         # In this case, the user's been deleted.
         user.deleted = True
-        return _user_data.insert(user, error_on_conflict=False)
+        return user
 
     # If the user's suspended, we can't get any other information about them.
     if user.suspended:
-        return _user_data.insert(user, error_on_conflict=False)
+        return user
 
     user.created_time = datetime.fromtimestamp(reddit_user.created_utc, tz=timezone.utc)
 
-    return _user_data.insert(user, error_on_conflict=False)
+    return user
 
 
 def update_user(existing_user: UserModel, reddit_user: Redditor) -> UserModel:
@@ -54,6 +169,14 @@ def update_user(existing_user: UserModel, reddit_user: Redditor) -> UserModel:
     For the moment, the only things that can change overall are whether the user is deleted or suspended.
     """
 
+    _apply_user_changes(existing_user, reddit_user)
+    updated_user = _user_data.update(existing_user)
+    return updated_user
+
+
+def _apply_user_changes(existing_user: UserModel, reddit_user: Redditor):
+    """Sets whether the existing user is suspended or deleted, without saving it. Fetches the user from Reddit."""
+
     # If the user's been suspended, the flag will be set.
     # If they're deleted, it'll raise an exception.
     # Everyone else won't have the attribute set, so default it to false.
@@ -63,9 +186,6 @@ def update_user(existing_user: UserModel, reddit_user: Redditor) -> UserModel:
         # In this case, the user's been deleted.
         existing_user.deleted = True
 
-    updated_user = _user_data.update(existing_user)
-    return updated_user
-
 
 def get_moderators() -> list[UserModel]:
     """Get the list of currently active moderators."""
@@ -0,0 +1,199 @@
+from datetime import datetime, timedelta, timezone
+from hashlib import blake2b
+import math
+import threading
+import time
+from typing import Any, Callable, Iterable, Optional
+
+from utils.logger import logger
+
+
+class BloomFilter:
+    """
+    Set membership with no false negatives and a small chance of false positives, using a fraction of the memory
+    of a set. Sized for capacity items at the given false positive rate, the rate goes up past that.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(capacity, 1)
+        self.error_rate = error_rate
+        self.bit_count = max(int(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hash_count = max(round(self.bit_count / self.capacity * math.log(2)), 1)
+        self.count = 0
+        self._bits = bytearray((self.bit_count + 7) // 8)
+
+    def _positions(self, item: Any) -> Iterable[int]:
+        # Two halves of a single hash combined to get every position, rather than hashing hash_count times.
+        digest = blake2b(str(item).encode(), digest_size=16).digest()
+        first_hash = int.from_bytes(digest[:8], "little")
+        second_hash = int.from_bytes(digest[8:], "little") | 1
+        return ((first_hash + i * second_hash) % self.bit_count for i in range(self.hash_count))
+
+    def add(self, item: Any):
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: Any) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def estimated_error_rate(self) -> float:
+        """Expected false positive rate for the number of items added so far."""
+
+        return (1 - math.exp(-self.hash_count * self.count / self.bit_count)) ** self.hash_count
+
+
+class KnownIds:
+    """
+    Bloom filter of the ids of rows created in a recent window, to tell when an item definitely isn't in the database
+    yet without querying for it. Built from the database when first used and kept up to date with add.
+
+    Only ids created after the start of the window are in the filter, anything older always counts as possibly known.
+    Ids inserted by other processes since it was built aren't in it either, so "definitely new" has to be confirmed
+    by the insert itself (e.g. ON CONFLICT DO NOTHING returning nothing) before doing anything that can't be undone.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        load_ids: Callable[[datetime], Iterable],
+        window: timedelta,
+        error_rate: float,
+        stats_interval: int = 0,
+    ):
+        """
+        :param name: what the ids are of, for logging
+        :param load_ids: gets all ids created since the given time from the database
+        :param window: how far back to load ids from
+        :param error_rate: target false positive rate
+        :param stats_interval: seconds between logging stats, 0 to disable
+        """
+
+        self.name = name
+        self.window = window
+        self.error_rate = error_rate
+        self.stats_interval = stats_interval
+        self._load_ids = load_ids
+        self._filter = None
+        self._since = None
+        self._rebuild_requested = False
+        self._added_while_loading = None
+        self._lock = threading.Lock()
+        # Reentrant since rebuild is called with it held by _rebuild_if_needed.
+        self._rebuild_lock = threading.RLock()
+        self._stats = {"checks": 0, "definitely_new": 0, "possibly_known": 0, "false_positives": 0, "rebuilds": 0}
+
+    def rebuild(self):
+        """Loads every id in the window from the database into a new filter, sized for double what's there."""
+
+        with self._rebuild_lock:
+            with self._lock:
+                self._added_while_loading = []
+                # Cleared before loading rather than after, so a request made while loading isn't lost.
+                self._rebuild_requested = False
+
+            since = datetime.now(timezone.utc) - self.window
+            ids = list(self._load_ids(since))
+            new_filter = BloomFilter(max(len(ids) * 2, 10000), self.error_rate)
+            for item_id in ids:
+                new_filter.add(item_id)
+
+            with self._lock:
+                # Anything inserted while loading may have been committed too late to be in the results.
+                for item_id in self._added_while_loading:
+                    new_filter.add(item_id)
+                self._added_while_loading = None
+
+                start_logging = self._stats["rebuilds"] == 0 and self.stats_interval > 0
+                self._filter, self._since = new_filter, since
+                self._stats["rebuilds"] += 1
+
+        logger.info(f"Loaded {len(ids)} known {self.name} ids since {since.isoformat()}")
+
+        if start_logging:
+            threading.Thread(target=self._log_stats, name=f"known_{self.name}_stats", daemon=True).start()
+
+    def _rebuild_if_needed(self):
+        if self._filter is not None and not self._rebuild_requested:
+            return
+
+        with self._rebuild_lock:
+            # Every thread that needed it waits for the same rebuild, only the first one to get the lock does it.
+            if self._filter is None or self._rebuild_requested:
+                self.rebuild()
+
+    def request_rebuild(self):
+        """Rebuilds the filter before the next check. Safe to call from a signal handler."""
+
+        self._rebuild_requested = True
+
+    def add(self, item_id: Any):
+        """Adds a newly inserted id. Does nothing until the filter has been built, it'll be loaded then instead."""
+
+        with self._lock:
+            if self._added_while_loading is not None:
+                self._added_while_loading.append(item_id)
+
+            if self._filter is None:
+                return
+
+            self._filter.add(item_id)
+            if len(self._filter) > self._filter.capacity:
+                self._rebuild_requested = True
+
+    def may_exist(self, item_id: Any, created_time: datetime) -> bool:
+        """False if the id is definitely not in the database, otherwise it needs to be checked."""
+
+        self._rebuild_if_needed()
+
+        with self._lock:
+            self._stats["checks"] += 1
+            if created_time < self._since or item_id in self._filter:
+                self._stats["possibly_known"] += 1
+                return True
+
+            self._stats["definitely_new"] += 1
+            return False
+
+    def contains(self, item_id: Any, created_time: datetime) -> Optional[bool]:
+        """
+        Whether the id is in the filter, or None if it's from before the window and has to be checked in the database.
+        Unlike may_exist, True isn't confirmed, so only for when a false positive is harmless.
+        """
+
+        self._rebuild_if_needed()
+
+        with self._lock:
+            if created_time < self._since:
+                return None
+            return item_id in self._filter
+
+    def record_false_positive(self, created_time: datetime):
+        """Counts a possibly known id that turned out not to be in the database."""
+
+        with self._lock:
+            # Ids from before the window were never checked against the filter.
+            if self._since is not None and created_time >= self._since:
+                self._stats["false_positives"] += 1
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            if self._filter is not None:
+                stats["size"] = len(self._filter)
+                stats["capacity"] = self._filter.capacity
+                stats["estimated_error_rate"] = round(self._filter.estimated_error_rate, 6)
+
+        # Out of everything that wasn't in the database, how much still had to be checked.
+        new_count = stats["definitely_new"] + stats["false_positives"]
+        stats["observed_error_rate"] = round(stats["false_positives"] / new_count, 6) if new_count else 0.0
+        return stats
+
+    def _log_stats(self):
+        while True:
+            time.sleep(self.stats_interval)
+            logger.info(f"Known {self.name} id stats: {self.get_stats()}")
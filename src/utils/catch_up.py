@@ -0,0 +1,102 @@
+import time
+from typing import Any, Callable, Iterable, Optional
+
+from utils.checkpoint import StreamCheckpoint, get_position
+from utils.logger import logger
+
+# Items a stream gets on its first request, anything older than that which the feed hasn't processed is a gap.
+STREAM_PAGE_SIZE = 100
+
+
+def find_gap(name: str, listing: Iterable, checkpoint: StreamCheckpoint) -> list:
+    """
+    Pages back through a listing, newest first, until reaching the checkpoint. Returns the items after it oldest first
+    if there are more than a stream's first page covers, otherwise an empty list, leaving them to the stream.
+    Reddit listings only go back about 1000 items, anything older than that is logged as a gap that can't be closed.
+    """
+
+    if checkpoint.saved is None:
+        return []
+
+    items = []
+    reached_checkpoint = False
+    for item in listing:
+        if checkpoint.is_processed(item):
+            reached_checkpoint = True
+            break
+        items.append(item)
+
+    if len(items) < STREAM_PAGE_SIZE:
+        return []
+
+    items.reverse()
+    oldest_time = get_position(items[0])[1]
+    saved_fullname, saved_time = checkpoint.saved
+    if reached_checkpoint:
+        logger.info(f"{name} is {len(items)} items behind since {saved_fullname}, catching up")
+    else:
+        logger.warning(
+            f"{name} is over {len(items)} items behind since {saved_fullname}, more than Reddit lists, catching up on"
+            f" those, the {oldest_time - saved_time} from {saved_time.isoformat()} to {oldest_time.isoformat()}"
+            f" before them are missing"
+        )
+
+    return items
+
+
+def catch_up(
+    name: str,
+    items: list,
+    checkpoint: StreamCheckpoint,
+    ingest: Callable[[list], Optional[list]],
+    batch_size: int,
+    notify: Optional[Callable[[Any], None]] = None,
+):
+    """
+    Processes the items of a gap, oldest first, a batch at a time, logging throughput and how far behind it still is
+    after each batch. Notifications are deferred until everything is saved: ingest returns whatever needs one and
+    notify sends it afterwards, in order. The checkpoint only moves past the gap once they've all been sent, so if
+    catching up fails part way through, it starts over after the restart rather than losing notifications.
+
+    :param name: name of the feed, for logging
+    :param items: gap to catch up on, oldest first, see find_gap
+    :param checkpoint: checkpoint of the feed's stream, advanced past the gap at the end
+    :param ingest: saves a batch of items, returns what to notify about, if anything
+    :param batch_size: items per call to ingest
+    :param notify: sends a deferred notification
+    """
+
+    if not items:
+        return
+
+    newest_time = get_position(items[-1])[1]
+    deferred = []
+    start_time = time.perf_counter()
+    batch_size = max(batch_size, 1)
+    for start in range(0, len(items), batch_size):
+        batch = items[start : start + batch_size]  # noqa: E203
+        deferred.extend(ingest(batch) or [])
+
+        processed_count = start + len(batch)
+        elapsed = max(time.perf_counter() - start_time, 0.001)
+        behind = newest_time - get_position(batch[-1])[1]
+        logger.info(
+            f"{name} catch-up: {processed_count}/{len(items)} items, {processed_count / elapsed:.1f} items/s,"
+            f" {len(items) - processed_count} left covering {behind}"
+        )
+
+    if deferred and notify:
+        logger.info(f"{name} catch-up: sending {len(deferred)} deferred notifications")
+        for notification in deferred:
+            notify(notification)
+
+    for item in items:
+        checkpoint.start(item)
+        checkpoint.finish(item)
+    checkpoint.flush()
+
+    elapsed = max(time.perf_counter() - start_time, 0.001)
+    logger.info(
+        f"{name} caught up on {len(items)} items in {elapsed:.1f}s, {len(items) / elapsed:.1f} items/s,"
+        f" up to {newest_time.isoformat()}"
+    )
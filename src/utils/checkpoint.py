@@ -0,0 +1,124 @@
+from collections import OrderedDict
+from datetime import datetime, timezone
+import threading
+import time
+from typing import Any, Callable, Optional
+
+from praw.models import ModAction
+
+from utils.logger import logger
+from utils.reddit import base36decode
+
+
+def get_position(item: Any) -> tuple[str, datetime]:
+    """The fullname and created time of a post, comment or mod action, mod actions use their id instead."""
+
+    fullname = item.id if isinstance(item, ModAction) else item.fullname
+    return fullname, datetime.fromtimestamp(item.created_utc, tz=timezone.utc)
+
+
+class StreamCheckpoint:
+    """
+    Tracks how far a feed stream has been processed, so a restarted stream can skip what it already processed.
+    Items are started in the order the stream yields them and finished in any order,
+    e.g. by pipeline workers. The checkpoint is the newest item that it and every item started before it have been
+    finished, saved at most every save_interval seconds.
+
+    Items can show up in a stream after newer ones with their original created time, e.g. approved out of the spam
+    filter or the AutoModerator queue, so an item at or before the checkpoint is only skipped if is_saved says it was
+    saved.
+
+    Only for streams that yield items oldest first by their created time, i.e. not the spam feed, where items come in
+    the order they were marked as spam.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        saved: Optional[tuple[str, datetime]],
+        save: Callable[[str, datetime], None],
+        is_saved: Callable[[Any], bool],
+        save_interval: int,
+    ):
+        """
+        :param name: name of the stream, for logging
+        :param saved: fullname and created time of the saved checkpoint to continue from, if there is one
+        :param save: saves a new checkpoint
+        :param is_saved: whether an item at or before the checkpoint was saved, i.e. it wasn't a late one
+        :param save_interval: least seconds between saves, 0 to save after every item
+        """
+
+        self.name = name
+        self.saved = saved
+        self.save_interval = save_interval
+        self._save = save
+        self._is_saved = is_saved
+        self._in_progress: OrderedDict[str, tuple[datetime, bool]] = OrderedDict()
+        self._checkpoint: Optional[tuple[str, datetime]] = None
+        self._last_save_time = 0.0
+        self._lock = threading.Lock()
+
+    def is_processed(self, item: Any) -> bool:
+        """Whether the item was already processed, i.e. it's at or before the last saved checkpoint and was saved."""
+
+        return self._is_before_checkpoint(item) and self._is_saved(item)
+
+    def _is_before_checkpoint(self, item: Any) -> bool:
+        if self.saved is None:
+            return False
+
+        fullname, created_time = get_position(item)
+        saved_fullname, saved_time = self.saved
+        if created_time != saved_time:
+            return created_time < saved_time
+
+        # Post and comment ids increase over time, so those can be told apart within the same second.
+        prefix = fullname[:3]
+        if prefix in ("t1_", "t3_") and saved_fullname.startswith(prefix):
+            return base36decode(fullname[3:]) <= base36decode(saved_fullname[3:])
+
+        return fullname == saved_fullname
+
+    def start(self, item: Any):
+        fullname, created_time = get_position(item)
+        with self._lock:
+            self._in_progress[fullname] = (created_time, False)
+
+    def finish(self, item: Any):
+        fullname, _ = get_position(item)
+        with self._lock:
+            if fullname not in self._in_progress:
+                return
+
+            self._in_progress[fullname] = (self._in_progress[fullname][0], True)
+            while self._in_progress:
+                first_fullname, (created_time, finished) = next(iter(self._in_progress.items()))
+                if not finished:
+                    break
+                self._in_progress.popitem(last=False)
+                self._checkpoint = (first_fullname, created_time)
+
+            if time.monotonic() - self._last_save_time < self.save_interval:
+                return
+
+            self._save_checkpoint()
+
+    def flush(self):
+        """Saves the current checkpoint now if it hasn't been yet."""
+
+        with self._lock:
+            self._save_checkpoint()
+
+    def _save_checkpoint(self):
+        if self._checkpoint is None or self._checkpoint == self.saved:
+            return
+
+        try:
+            self._save(*self._checkpoint)
+        except Exception:
+            # Only means more is processed again after a restart.
+            logger.exception(f"Failed to save {self.name} checkpoint")
+            return
+
+        self.saved = self._checkpoint
+        self._last_save_time = time.monotonic()
@@ -0,0 +1,159 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, Hashable, Optional
+import zlib
+
+from utils.checkpoint import StreamCheckpoint
+from utils.logger import logger
+
+
+class Pipeline:
+    """
+    Hands items from the thread fetching them to a pool of workers processing them, so a slow item doesn't hold up
+    fetching the next ones. Items are partitioned between workers by key, items with the same key are processed in the
+    order they were added. Each worker has a bounded queue, adding an item waits while its worker's queue is full.
+
+    If processing an item raises an exception the pipeline stops and the next add raises it, so the fetching side
+    restarts the same way it would if it had processed the item itself. Use as a context manager, leaving it stops
+    the workers, dropping anything still queued if leaving because of an exception.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        process: Callable[[Any], None],
+        get_key: Callable[[Any], Hashable],
+        workers: int,
+        queue_size: int,
+        stats_interval: int = 0,
+        checkpoint: StreamCheckpoint = None,
+    ):
+        """
+        :param name: what the items are, for logging and thread names
+        :param process: processes a single item, called from a worker thread
+        :param get_key: the key items are partitioned by, e.g. the id of the post they belong to
+        :param workers: number of worker threads
+        :param queue_size: items each worker can have waiting before adding waits
+        :param stats_interval: seconds between logging stats, 0 to disable
+        :param checkpoint: if given, items it has already processed are skipped and it's advanced as items are processed
+        """
+
+        self.name = name
+        self.stats_interval = stats_interval
+        self._process = process
+        self._checkpoint = checkpoint
+        self._get_key = get_key
+        self._queues = [queue.Queue(maxsize=max(queue_size, 1)) for _ in range(max(workers, 1))]
+        self._threads = []
+        self._stopping = threading.Event()
+        self._error: Optional[Exception] = None
+        self._lock = threading.Lock()
+        self._stats = {"added": 0, "processed": 0, "wait_seconds": 0.0, "process_seconds": 0.0}
+        self._max_depths = [0] * len(self._queues)
+
+    def __enter__(self) -> "Pipeline":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop(drain=exc_type is None)
+
+    def start(self):
+        for index, worker_queue in enumerate(self._queues):
+            thread = threading.Thread(
+                target=self._work, args=(worker_queue,), name=f"{self.name}_worker_{index}", daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+        if self.stats_interval > 0:
+            threading.Thread(target=self._log_stats, name=f"{self.name}_pipeline_stats", daemon=True).start()
+
+    def add(self, item: Any):
+        """Queues an item for its worker, waiting while that worker's queue is full."""
+
+        if self._checkpoint:
+            if self._checkpoint.is_processed(item):
+                return
+            self._checkpoint.start(item)
+
+        # Stable across runs unlike hash(), which is randomized for strings.
+        index = zlib.crc32(str(self._get_key(item)).encode()) % len(self._queues)
+        worker_queue = self._queues[index]
+
+        start_time = time.perf_counter()
+        while True:
+            if self._error is not None:
+                raise self._error
+
+            try:
+                worker_queue.put(item, timeout=1)
+                break
+            except queue.Full:
+                continue
+
+        with self._lock:
+            self._stats["added"] += 1
+            self._stats["wait_seconds"] += time.perf_counter() - start_time
+            self._max_depths[index] = max(self._max_depths[index], worker_queue.qsize())
+
+    def stop(self, drain: bool = True):
+        """Stops the workers, after they've processed everything queued if drain is set."""
+
+        if drain:
+            for worker_queue in self._queues:
+                worker_queue.join()
+
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join()
+
+        if self._checkpoint:
+            self._checkpoint.flush()
+
+        dropped_count = sum(worker_queue.qsize() for worker_queue in self._queues)
+        if dropped_count:
+            logger.warning(f"Stopped {self.name} pipeline with {dropped_count} items left unprocessed")
+
+    def _work(self, worker_queue: queue.Queue):
+        while not self._stopping.is_set():
+            try:
+                item = worker_queue.get(timeout=1)
+            except queue.Empty:
+                continue
+
+            try:
+                # Nothing more is processed once one item has failed, the fetching side restarts everything.
+                if self._error is None:
+                    start_time = time.perf_counter()
+                    self._process(item)
+                    if self._checkpoint:
+                        self._checkpoint.finish(item)
+                    with self._lock:
+                        self._stats["processed"] += 1
+                        self._stats["process_seconds"] += time.perf_counter() - start_time
+            except Exception as e:
+                logger.exception(f"Failed to process {self.name} item, stopping the pipeline")
+                self._error = e
+            finally:
+                worker_queue.task_done()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["max_depths"] = list(self._max_depths)
+
+        stats["depths"] = [worker_queue.qsize() for worker_queue in self._queues]
+        stats["depth"] = sum(stats["depths"])
+        stats["avg_process_ms"] = (
+            round(stats["process_seconds"] * 1000 / stats["processed"], 3) if stats["processed"] else 0.0
+        )
+        stats["wait_seconds"] = round(stats["wait_seconds"], 3)
+        stats["process_seconds"] = round(stats["process_seconds"], 3)
+        return stats
+
+    def _log_stats(self):
+        while not self._stopping.is_set():
+            self._stopping.wait(self.stats_interval)
+            logger.info(f"{self.name} pipeline stats: {self.get_stats()}")
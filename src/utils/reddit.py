@@ -2,10 +2,12 @@
 
 import copy
 import re
+import threading
 import typing
 
 import mintotp
 import praw
+from prawcore.exceptions import NotFound
 
 if typing.TYPE_CHECKING:
     from data.base_data import BaseModel
@@ -94,3 +96,45 @@ def get_reddit_instance(config_dict: dict):
 
     reddit_instance = praw.Reddit(**auth_dict)
     return reddit_instance
+
+
+def serialize_requests(reddit_instance: praw.Reddit) -> praw.Reddit:
+    """
+    Makes requests through a reddit instance one at a time so it can be shared between threads, e.g. by the workers
+    processing items it fetched, which lazy load through it. PRAW isn't thread-safe, its rate limiting and token
+    refreshes assume one request at a time.
+    """
+
+    request_lock = threading.Lock()
+    request = reddit_instance.request
+
+    def serialized_request(*args, **kwargs):
+        with request_lock:
+            return request(*args, **kwargs)
+
+    reddit_instance.request = serialized_request
+    return reddit_instance
+
+
+def load(reddit_object):
+    """
+    Fetches a lazily loaded PRAW object, e.g. from reddit.comment(id=...) or a comment's submission, now rather than
+    when one of its missing attributes is first read. E.g. to make the request before a transaction starts instead of
+    while it's open. Does nothing if it's already loaded. Users that were deleted are left as they are.
+    """
+
+    try:
+        # Every kind of object has it once loaded, reading it while it's missing is what makes PRAW fetch it.
+        getattr(reddit_object, "created_utc", None)
+    except NotFound:
+        pass
+
+
+def get_post_id36(mod_action) -> typing.Optional[str]:
+    """Gets the id of the post a mod action's target is in, if any, from its permalink."""
+
+    if not mod_action.target_permalink:
+        return None
+
+    match = POST_ID_REGEX.search(mod_action.target_permalink)
+    return match.group("id") if match else None
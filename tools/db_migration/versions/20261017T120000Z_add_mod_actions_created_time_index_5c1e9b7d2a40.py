@@ -0,0 +1,25 @@
+"""Add index for mod_actions.created_time
+
+Revision ID: 5c1e9b7d2a40
+Revises: 18a156c604fd
+Create Date: 2026-10-17 12:00:00.000000+00:00
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5c1e9b7d2a40"
+down_revision = "18a156c604fd"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("COMMIT;")
+    op.execute("CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_mod_actions_created_time ON mod_actions(created_time);")
+
+
+def downgrade():
+    op.execute("COMMIT;")
+    op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_mod_actions_created_time;")
@@ -0,0 +1,43 @@
+"""Add indexes for mod_actions lookups by post, action and target user
+
+Revision ID: 56055a0045b4
+Revises: 5c1e9b7d2a40
+Create Date: 2026-10-17 13:00:00.000000+00:00
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "56055a0045b4"
+down_revision = "5c1e9b7d2a40"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("COMMIT;")
+    # Latest approve/remove/spam of a post, checked by the mod log feed on every post status change.
+    # Partial since comment actions have target_post_id set as well and far outnumber these.
+    op.execute("""
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_mod_actions_post_status
+    ON mod_actions(target_post_id, created_time)
+    WHERE action IN ('approvelink', 'removelink', 'spamlink');
+    """)
+    # Counts of an action within a time range, used throughout the monthly report.
+    op.execute("""
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_mod_actions_action_created_time
+    ON mod_actions(action, created_time);
+    """)
+    # Actions targeting a user, optionally within a time range.
+    op.execute("""
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_mod_actions_target_user_lower_created_time
+    ON mod_actions(lower(target_user), created_time);
+    """)
+
+
+def downgrade():
+    op.execute("COMMIT;")
+    op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_mod_actions_target_user_lower_created_time;")
+    op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_mod_actions_action_created_time;")
+    op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_mod_actions_post_status;")
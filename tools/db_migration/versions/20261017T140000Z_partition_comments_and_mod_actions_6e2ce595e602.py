@@ -0,0 +1,198 @@
+"""Partition comments and mod_actions by month on created_time
+
+Revision ID: 6e2ce595e602
+Revises: 56055a0045b4
+Create Date: 2026-10-17 14:00:00.000000+00:00
+
+Both tables are copied into new partitioned tables in one transaction, so stop the feeds first and expect it to take
+a while on a large database. Partitions are created from the month of the oldest row to a few months ahead, later
+ones by scripts/partitions.py (also run by the front page cron).
+
+Primary keys become (id, created_time) since unique constraints on a partitioned table must include the partition
+column. Nothing can reference comments(id) with a foreign key after that, so comments.parent_id and
+mod_actions.target_comment_id are checked by triggers instead, raising the same foreign_key_violation as before.
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "6e2ce595e602"
+down_revision = "56055a0045b4"
+branch_labels = None
+depends_on = None
+
+# How far ahead to create partitions during the migration, after that it's up to scripts/partitions.py.
+_MONTHS_AHEAD = 3
+
+_COMMENTS_INDEXES = """
+CREATE INDEX IF NOT EXISTS comments_author_lower_key ON comments (lower(author));
+CREATE INDEX IF NOT EXISTS idx_comments_created_time ON comments(created_time);
+CREATE INDEX IF NOT EXISTS idx_comments_post_id ON comments(post_id);
+"""
+
+_MOD_ACTIONS_INDEXES = """
+CREATE INDEX IF NOT EXISTS mod_actions_mod_lower_key ON mod_actions (lower(mod));
+CREATE INDEX IF NOT EXISTS idx_mod_actions_created_time ON mod_actions(created_time);
+CREATE INDEX IF NOT EXISTS idx_mod_actions_post_status
+ON mod_actions(target_post_id, created_time)
+WHERE action IN ('approvelink', 'removelink', 'spamlink');
+CREATE INDEX IF NOT EXISTS idx_mod_actions_action_created_time ON mod_actions(action, created_time);
+CREATE INDEX IF NOT EXISTS idx_mod_actions_target_user_lower_created_time
+ON mod_actions(lower(target_user), created_time);
+"""
+
+
+def upgrade():
+    # Creates a partition per UTC month between the two dates that doesn't exist yet, returns the new partition names.
+    op.execute("""
+    CREATE OR REPLACE FUNCTION create_monthly_partitions(parent_table text, from_date date, to_date date)
+    RETURNS SETOF text AS $$
+    DECLARE
+        month_start date := date_trunc('month', from_date)::date;
+        partition_name text;
+    BEGIN
+        WHILE month_start <= to_date LOOP
+            partition_name := parent_table || to_char(month_start, '"_y"YYYY"m"MM');
+            IF to_regclass(partition_name) IS NULL THEN
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L);',
+                    partition_name,
+                    parent_table,
+                    month_start::timestamp AT TIME ZONE 'UTC',
+                    (month_start + interval '1 month') AT TIME ZONE 'UTC'
+                );
+                RETURN NEXT partition_name;
+            END IF;
+            month_start := (month_start + interval '1 month')::date;
+        END LOOP;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    for table in ["comments", "mod_actions"]:
+        op.execute(f"""
+        ALTER TABLE {table} RENAME TO {table}_unpartitioned;
+        CREATE TABLE {table} (LIKE {table}_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE (created_time);
+        SELECT create_monthly_partitions(
+            '{table}',
+            (COALESCE((SELECT min(created_time) FROM {table}_unpartitioned), now()) AT TIME ZONE 'UTC')::date,
+            (now() AT TIME ZONE 'UTC' + interval '{_MONTHS_AHEAD} months')::date
+        );
+        INSERT INTO {table} SELECT * FROM {table}_unpartitioned;
+        """)
+
+    # The old mod_actions has a foreign key to the old comments, so it has to go first.
+    op.execute("""
+    DROP TABLE mod_actions_unpartitioned;
+    DROP TABLE comments_unpartitioned;
+    """)
+
+    # Constraints and indexes are only added now that the old ones are gone, so they get the same names as before.
+    op.execute("""
+    ALTER TABLE comments ADD PRIMARY KEY (id, created_time);
+    ALTER TABLE comments ADD UNIQUE (id36, created_time);
+    ALTER TABLE comments ADD FOREIGN KEY (author) REFERENCES users(username);
+    ALTER TABLE comments ADD FOREIGN KEY (post_id) REFERENCES posts(id);
+
+    ALTER TABLE mod_actions ADD PRIMARY KEY (id, created_time);
+    ALTER TABLE mod_actions ADD FOREIGN KEY (mod) REFERENCES users(username);
+    ALTER TABLE mod_actions ADD FOREIGN KEY (target_user) REFERENCES users(username);
+    ALTER TABLE mod_actions ADD FOREIGN KEY (target_post_id) REFERENCES posts(id);
+    """)
+    op.execute(_COMMENTS_INDEXES)
+    op.execute(_MOD_ACTIONS_INDEXES)
+
+    # Stand-ins for the foreign keys to comments(id).
+    op.execute("""
+    CREATE OR REPLACE FUNCTION check_comment_exists(comment_id bigint, created_before timestamptz, source text)
+    RETURNS void AS $$
+    BEGIN
+        -- Comments are always created before anything referencing them, so newer partitions are skipped.
+        PERFORM 1 FROM comments WHERE id = comment_id AND created_time <= created_before FOR KEY SHARE;
+        IF NOT FOUND THEN
+            RAISE foreign_key_violation USING
+                MESSAGE = format('%s references comment %s, which is not in table "comments"', source, comment_id);
+        END IF;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION check_comments_parent_id() RETURNS trigger AS $$
+    BEGIN
+        IF NEW.parent_id IS NOT NULL THEN
+            PERFORM check_comment_exists(NEW.parent_id, NEW.created_time, 'comments.parent_id');
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION check_mod_actions_target_comment_id() RETURNS trigger AS $$
+    BEGIN
+        IF NEW.target_comment_id IS NOT NULL THEN
+            PERFORM check_comment_exists(NEW.target_comment_id, NEW.created_time, 'mod_actions.target_comment_id');
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION check_comment_unreferenced() RETURNS trigger AS $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM comments WHERE parent_id = OLD.id AND created_time >= OLD.created_time)
+            OR EXISTS (SELECT 1 FROM mod_actions WHERE target_comment_id = OLD.id AND created_time >= OLD.created_time)
+        THEN
+            RAISE foreign_key_violation USING
+                MESSAGE = format('comment %s is still referenced by other comments or mod actions', OLD.id);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE TRIGGER comments_parent_id_check
+    AFTER INSERT OR UPDATE OF parent_id ON comments
+    FOR EACH ROW EXECUTE FUNCTION check_comments_parent_id();
+
+    CREATE TRIGGER mod_actions_target_comment_id_check
+    AFTER INSERT OR UPDATE OF target_comment_id ON mod_actions
+    FOR EACH ROW EXECUTE FUNCTION check_mod_actions_target_comment_id();
+
+    CREATE TRIGGER comments_delete_check
+    AFTER DELETE ON comments
+    FOR EACH ROW EXECUTE FUNCTION check_comment_unreferenced();
+    """)
+
+    op.execute("ANALYZE comments; ANALYZE mod_actions;")
+
+
+def downgrade():
+    for table in ["comments", "mod_actions"]:
+        op.execute(f"""
+        ALTER TABLE {table} RENAME TO {table}_partitioned;
+        CREATE TABLE {table} (LIKE {table}_partitioned INCLUDING DEFAULTS);
+        INSERT INTO {table} SELECT * FROM {table}_partitioned;
+        """)
+
+    # Dropping the partitioned tables drops their partitions and triggers too.
+    op.execute("""
+    DROP TABLE mod_actions_partitioned;
+    DROP TABLE comments_partitioned;
+    DROP FUNCTION IF EXISTS check_comment_unreferenced();
+    DROP FUNCTION IF EXISTS check_mod_actions_target_comment_id();
+    DROP FUNCTION IF EXISTS check_comments_parent_id();
+    DROP FUNCTION IF EXISTS check_comment_exists(bigint, timestamptz, text);
+    DROP FUNCTION IF EXISTS create_monthly_partitions(text, date, date);
+    """)
+
+    op.execute("""
+    ALTER TABLE comments ADD PRIMARY KEY (id);
+    ALTER TABLE comments ADD UNIQUE (id36);
+    ALTER TABLE comments ADD FOREIGN KEY (author) REFERENCES users(username);
+    ALTER TABLE comments ADD FOREIGN KEY (post_id) REFERENCES posts(id);
+    ALTER TABLE comments ADD FOREIGN KEY (parent_id) REFERENCES comments(id);
+
+    ALTER TABLE mod_actions ADD PRIMARY KEY (id);
+    ALTER TABLE mod_actions ADD FOREIGN KEY (mod) REFERENCES users(username);
+    ALTER TABLE mod_actions ADD FOREIGN KEY (target_user) REFERENCES users(username);
+    ALTER TABLE mod_actions ADD FOREIGN KEY (target_post_id) REFERENCES posts(id);
+    ALTER TABLE mod_actions ADD FOREIGN KEY (target_comment_id) REFERENCES comments(id);
+    """)
+    op.execute(_COMMENTS_INDEXES)
+    op.execute(_MOD_ACTIONS_INDEXES)
@@ -0,0 +1,47 @@
+"""Add daily rollup tables for mod action and activity counts
+
+Revision ID: f64d6103cbe6
+Revises: 6e2ce595e602
+Create Date: 2026-10-17 15:00:00.000000+00:00
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "f64d6103cbe6"
+down_revision = "6e2ce595e602"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Filled in by services.rollup_service.update_rollups, days are UTC. Distinct targets/authors are kept per row
+    # rather than counted, since distinct counts of separate days or categories can't be added together.
+    op.execute("""
+    CREATE TABLE IF NOT EXISTS mod_action_daily (
+        day date not null,
+        action text not null,
+        mod_category text not null,
+        details text not null default '',
+        description text not null default '',
+        action_count int not null,
+        targets text[] not null default '{}',
+        primary key (day, action, mod_category, details, description)
+    );
+    CREATE TABLE IF NOT EXISTS activity_daily (
+        day date not null,
+        kind text not null,
+        author_category text not null,
+        item_count int not null,
+        authors text[] not null default '{}',
+        primary key (day, kind, author_category)
+    );
+    """)
+
+
+def downgrade():
+    op.execute("""
+    DROP TABLE IF EXISTS activity_daily;
+    DROP TABLE IF EXISTS mod_action_daily;
+    """)
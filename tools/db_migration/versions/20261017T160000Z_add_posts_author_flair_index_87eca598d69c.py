@@ -0,0 +1,29 @@
+"""Add index for posts by author and flair
+
+Revision ID: 87eca598d69c
+Revises: f64d6103cbe6
+Create Date: 2026-10-17 16:00:00.000000+00:00
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "87eca598d69c"
+down_revision = "f64d6103cbe6"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("COMMIT;")
+    # Flair frequency checks, a handful of flairs for one author within a time window.
+    op.execute("""
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_posts_author_flair_lower_created_time
+    ON posts(lower(author), lower(flair_text), created_time);
+    """)
+
+
+def downgrade():
+    op.execute("COMMIT;")
+    op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_posts_author_flair_lower_created_time;")
@@ -0,0 +1,62 @@
+"""Add full-text search indexes on posts and comments
+
+Revision ID: 171e5ecfb19a
+Revises: 87eca598d69c
+Create Date: 2026-10-17 17:00:00.000000+00:00
+
+Expression indexes rather than stored tsvector columns, since nearly every query selects * from these tables and
+would otherwise carry the vectors along. The expressions must stay identical to the ones in PostData and CommentData
+for the indexes to be used.
+
+comments is partitioned and CREATE INDEX CONCURRENTLY doesn't work on a partitioned table, so the index is created on
+the parent only (invalid until complete), then concurrently on each partition and attached. Partitions created after
+this get it automatically.
+"""
+
+from alembic import op
+from sqlalchemy.sql import text
+
+# revision identifiers, used by Alembic.
+revision = "171e5ecfb19a"
+down_revision = "87eca598d69c"
+branch_labels = None
+depends_on = None
+
+# Titles weigh more than bodies when ranking.
+_POSTS_SEARCH_VECTOR = (
+    "setweight(to_tsvector('english', title), 'A') || setweight(to_tsvector('english', coalesce(body, '')), 'B')"
+)
+_COMMENTS_SEARCH_VECTOR = "to_tsvector('english', coalesce(body, ''))"
+
+
+def upgrade():
+    op.execute("COMMIT;")
+    op.execute(f"""
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_posts_search
+    ON posts USING gin (({_POSTS_SEARCH_VECTOR}));
+    """)
+
+    op.execute(f"""
+    CREATE INDEX IF NOT EXISTS idx_comments_search
+    ON ONLY comments USING gin (({_COMMENTS_SEARCH_VECTOR}));
+    """)
+
+    partitions = op.get_bind().execute(text("""
+    SELECT inhrelid::regclass::text FROM pg_inherits
+    WHERE inhparent = 'comments'::regclass
+    ORDER BY 1;
+    """)).fetchall()
+
+    for (partition,) in partitions:
+        op.execute(f"""
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS {partition}_search_idx
+        ON {partition} USING gin (({_COMMENTS_SEARCH_VECTOR}));
+        """)
+        op.execute(f"ALTER INDEX idx_comments_search ATTACH PARTITION {partition}_search_idx;")
+
+
+def downgrade():
+    op.execute("COMMIT;")
+    # Drops the partitions' indexes along with it.
+    op.execute("DROP INDEX IF EXISTS idx_comments_search;")
+    op.execute("DROP INDEX CONCURRENTLY IF EXISTS idx_posts_search;")
@@ -0,0 +1,33 @@
+"""Add stream_checkpoints table
+
+Revision ID: 57eb5ab2f471
+Revises: 171e5ecfb19a
+Create Date: 2026-10-17 19:00:00.000000+00:00
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "57eb5ab2f471"
+down_revision = "171e5ecfb19a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The newest item of each feed stream that it and everything before it have been processed.
+    op.execute("""
+        CREATE TABLE stream_checkpoints (
+            stream TEXT PRIMARY KEY,
+            fullname TEXT NOT NULL,
+            created_time TIMESTAMPTZ NOT NULL,
+            updated_time TIMESTAMPTZ NOT NULL DEFAULT now()
+        );
+        """)
+
+
+def downgrade():
+    op.execute("""
+        DROP TABLE IF EXISTS stream_checkpoints;
+        """)
@@ -0,0 +1,94 @@
+"""Add comment_ids and mod_action_ids tables
+
+Revision ID: 5f72eafda860
+Revises: 57eb5ab2f471
+Create Date: 2026-10-17 20:00:00.000000+00:00
+
+Since partitioning, the primary keys of comments and mod_actions are (id, created_time) and comments' unique key is
+(id36, created_time), so the same id with two different created times would be two rows. These tables hold every id
+with its created_time under a primary key on id alone, kept up to date by triggers, so that's a unique_violation
+again. comments.id36 is always the base 36 form of id, so it's covered too.
+
+They're also how a row is found by id alone without scanning every partition, e.g. CommentData.get_comment_by_id
+looks up the created_time here first.
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5f72eafda860"
+down_revision = "57eb5ab2f471"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+    CREATE TABLE comment_ids (
+        id BIGINT PRIMARY KEY,
+        created_time TIMESTAMPTZ NOT NULL
+    );
+
+    CREATE TABLE mod_action_ids (
+        id UUID PRIMARY KEY,
+        created_time TIMESTAMPTZ NOT NULL
+    );
+    """)
+
+    # Only rows actually inserted fire AFTER INSERT, not ones skipped by ON CONFLICT or updated by an upsert, so an
+    # insert failing here means the id is already there with a different created_time. An UPDATE moving a row to
+    # another partition fires DELETE and INSERT instead.
+    op.execute("""
+    CREATE OR REPLACE FUNCTION track_comment_id() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            DELETE FROM comment_ids WHERE id = OLD.id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO comment_ids (id, created_time) VALUES (NEW.id, NEW.created_time);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION track_mod_action_id() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP IN ('UPDATE', 'DELETE') THEN
+            DELETE FROM mod_action_ids WHERE id = OLD.id;
+        END IF;
+        IF TG_OP IN ('INSERT', 'UPDATE') THEN
+            INSERT INTO mod_action_ids (id, created_time) VALUES (NEW.id, NEW.created_time);
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql;
+    """)
+
+    # Creating the triggers locks out writes until the migration commits, so filling the tables afterwards can't miss
+    # anything. Fails if there already are duplicate ids, those need to be cleaned up first.
+    op.execute("""
+    CREATE TRIGGER comments_id_track
+    AFTER INSERT OR DELETE OR UPDATE OF id, created_time ON comments
+    FOR EACH ROW EXECUTE FUNCTION track_comment_id();
+
+    CREATE TRIGGER mod_actions_id_track
+    AFTER INSERT OR DELETE OR UPDATE OF id, created_time ON mod_actions
+    FOR EACH ROW EXECUTE FUNCTION track_mod_action_id();
+
+    INSERT INTO comment_ids (id, created_time) SELECT id, created_time FROM comments;
+    INSERT INTO mod_action_ids (id, created_time) SELECT id, created_time FROM mod_actions;
+
+    ANALYZE comment_ids;
+    ANALYZE mod_action_ids;
+    """)
+
+
+def downgrade():
+    op.execute("""
+    DROP TRIGGER IF EXISTS mod_actions_id_track ON mod_actions;
+    DROP TRIGGER IF EXISTS comments_id_track ON comments;
+    DROP FUNCTION IF EXISTS track_mod_action_id();
+    DROP FUNCTION IF EXISTS track_comment_id();
+    DROP TABLE IF EXISTS mod_action_ids;
+    DROP TABLE IF EXISTS comment_ids;
+    """)